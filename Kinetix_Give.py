@@ -1,103 +1,48 @@
 import streamlit as st
-from web3 import Web3
-import os
+from contracts import KINETIX_VAULT_ABI, KINETIX_VAULT_EVENT_ABIS, ERC20_ABI, TRANSFER_EVENT_ABI, get_contract
+from simpleth_core import INDEX_FROM_BLOCK, VAULT_ADDRESS, VAULT_STETH_ADDRESS, vault_info
+from app_resources import get_read_engine, get_web3
+from decimal import Decimal
 
 # --- CONFIGURATION ---
-INFURA_URL = "https://sepolia.infura.io/v3/e0fcce634506410b87fc31064eed915a"
-VAULT_ADDRESS = "0xa947017dbf5f7e7e7Aed55eA16886639DD04872A"  # <-- Replace with your deployed KinetixVault address
-STETH_ADDRESS = "0x68502E9ca41eB2a854382d68C07526D6a5a72262"  # <-- Replace with your stETH/mockstETH address
-
-# --- ABIs ---
-KINETIX_VAULT_ABI = [
-    {
-        "inputs": [],
-        "name": "beneficiary",
-        "outputs": [{"internalType": "address", "name": "", "type": "address"}],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [{"internalType": "address", "name": "donor", "type": "address"}],
-        "name": "principalOf",
-        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [],
-        "name": "vaultBalance",
-        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [],
-        "name": "stakingRewards",
-        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [{"internalType": "uint256", "name": "amount", "type": "uint256"}],
-        "name": "deposit",
-        "outputs": [],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "inputs": [{"internalType": "uint256", "name": "amount", "type": "uint256"}],
-        "name": "withdraw",
-        "outputs": [],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "inputs": [],
-        "name": "donateRewards",
-        "outputs": [],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "inputs": [{"internalType": "address", "name": "account", "type": "address"}],
-        "name": "balanceOf",
-        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    }
-]
-
-ERC20_ABI = [
-    {
-        "constant": True,
-        "inputs": [{"name": "_owner", "type": "address"}],
-        "name": "balanceOf",
-        "outputs": [{"name": "balance", "type": "uint256"}],
-        "type": "function"
-    },
-    {
-        "constant": False,
-        "inputs": [
-            {"name": "_spender", "type": "address"},
-            {"name": "_value", "type": "uint256"}
-        ],
-        "name": "approve",
-        "outputs": [{"name": "success", "type": "bool"}],
-        "type": "function"
-    },
-    {
-        "constant": True,
-        "inputs": [],
-        "name": "decimals",
-        "outputs": [{"name": "", "type": "uint8"}],
-        "type": "function"
-    }
-]
-
-# --- WEB3 SETUP ---
-w3 = Web3(Web3.HTTPProvider(INFURA_URL))
-vault = w3.eth.contract(address=Web3.to_checksum_address(VAULT_ADDRESS), abi=KINETIX_VAULT_ABI)
-steth = w3.eth.contract(address=Web3.to_checksum_address(STETH_ADDRESS), abi=ERC20_ABI)
+# The RPC endpoint, the vault and stETH addresses and the block to index from are set in simpleth_core.py
+
+# --- VAULT SERVICES ---
+@st.cache_resource
+def get_event_indexer():
+    # Background indexer shared by every session; history is read from its local SQLite file
+    from event_indexer import EventIndexer
+    indexer = EventIndexer(
+        get_web3(),
+        {VAULT_ADDRESS: KINETIX_VAULT_EVENT_ABIS, VAULT_STETH_ADDRESS: [TRANSFER_EVENT_ABI]},
+        name="kinetix",
+        start_block=INDEX_FROM_BLOCK,
+    )
+    indexer.start()
+    return indexer
+
+@st.cache_resource
+def get_vault_stats():
+    # decimals and beneficiary read once; vault balance and rewards at most once per block, for every session
+    from vault_stats import VaultStats
+    w3 = get_web3()
+    return VaultStats(w3, get_contract(w3, VAULT_ADDRESS, KINETIX_VAULT_ABI), get_contract(w3, VAULT_STETH_ADDRESS, ERC20_ABI))
+
+@st.cache_resource
+def get_donor_analytics():
+    # Every depositor's principal and receipt balance, read in Multicall3 chunks and shared by all sessions
+    from donor_analytics import DonorAnalytics
+    engine = get_read_engine()
+    return DonorAnalytics(
+        engine,
+        engine.contract(VAULT_ADDRESS, KINETIX_VAULT_ABI),
+        engine.contract(VAULT_STETH_ADDRESS, ERC20_ABI),
+        lambda: get_event_indexer().accounts(VAULT_ADDRESS, ["Deposited"]),
+    )
+
+def to_units(wei, decimals):
+    # Exact: wei amounts do not survive float division
+    return Decimal(int(wei)).scaleb(-decimals).normalize()
 
 st.set_page_config(page_title="Kinetix Giving Vault", page_icon="💧")
 st.title("💧 Kinetix Giving Vault")
@@ -110,30 +55,60 @@ donor_address = st.text_input("Your Wallet Address")
 
 if donor_address:
     try:
-        donor = Web3.to_checksum_address(donor_address)
+        donor = get_web3().to_checksum_address(donor_address)
     except Exception:
         st.error("Invalid address format.")
         st.stop()
 
-    # Fetch balances
-    steth_decimals = steth.functions.decimals().call()
-    divisor = 10 ** steth_decimals
+    w3 = get_web3()
+    vault = get_contract(w3, VAULT_ADDRESS, KINETIX_VAULT_ABI)
+    steth = get_contract(w3, VAULT_STETH_ADDRESS, ERC20_ABI)
 
-    steth_balance = steth.functions.balanceOf(donor).call() / divisor
-    kntx_balance = vault.functions.balanceOf(donor).call() / divisor
-    principal = vault.functions.principalOf(donor).call() / divisor
-    vault_balance = vault.functions.vaultBalance().call() / divisor
-    rewards = vault.functions.stakingRewards().call() / divisor
-    beneficiary = vault.functions.beneficiary().call()
+    # Vault-wide stats come from the shared service; the donor's own three reads go out in one JSON-RPC batch
+    info = vault_info(get_vault_stats(), w3, vault, steth, donor)
+    steth_decimals = info["decimals"]
+    vault_balance = info["vault_balance"]
+    rewards = info["staking_rewards"]
+    beneficiary = info["beneficiary"]
+    steth_balance, kntx_balance, principal = info["steth_balance"], info["receipts"], info["principal"]
+
+    steth_balance = to_units(steth_balance, steth_decimals)
+    kntx_balance = to_units(kntx_balance, steth_decimals)
+    principal = to_units(principal, steth_decimals)
+    vault_balance = to_units(vault_balance, steth_decimals)
+    rewards = to_units(rewards, steth_decimals)
 
     st.subheader("Your Balances")
-    st.write(f"stETH in your wallet: **{steth_balance}**")
-    st.write(f"KNTX (receipt tokens): **{kntx_balance}**")
-    st.write(f"Principal (your deposit): **{principal}**")
+    st.write(f"stETH in your wallet: **{steth_balance:f}**")
+    st.write(f"KNTX (receipt tokens): **{kntx_balance:f}**")
+    st.write(f"Principal (your deposit): **{principal:f}**")
+
+    st.subheader("Your Deposit History")
+    try:
+        indexer = get_event_indexer()
+        totals = indexer.totals(donor, VAULT_ADDRESS, ["Deposited", "Withdrawn"])
+        st.write(f"Total deposited: **{to_units(totals['Deposited'], steth_decimals):f}**")
+        st.write(f"Total withdrawn: **{to_units(totals['Withdrawn'], steth_decimals):f}**")
+        history = indexer.history(donor, contract=VAULT_ADDRESS, events=["Deposited", "Withdrawn"])
+        if history:
+            st.dataframe([
+                {
+                    "Block": row["block_number"],
+                    "Event": row["event"],
+                    "Amount (stETH)": f"{to_units(row['amount'], steth_decimals):f}",
+                    "Transaction": row["tx_hash"],
+                }
+                for row in history
+            ])
+        else:
+            st.info("No deposits found yet.")
+        st.caption(f"Indexed up to block {indexer.checkpoint()[0]}")
+    except Exception as e:
+        st.error(f"Error reading deposit history: {e}")
 
     st.subheader("Vault Info")
-    st.write(f"Vault stETH balance: **{vault_balance}**")
-    st.write(f"Staking rewards (available to donate): **{rewards}**")
+    st.write(f"Vault stETH balance: **{vault_balance:f}**")
+    st.write(f"Staking rewards (available to donate): **{rewards:f}**")
     st.write(f"Beneficiary address: `{beneficiary}`")
 
     st.markdown("---")
@@ -164,16 +139,76 @@ if donor_address:
 
     if st.button("Simulate Donate Rewards"):
         if rewards > 0:
-            st.success(f"Simulated donation of {rewards} stETH to beneficiary. (Use your wallet to perform the real transaction.)")
+            st.success(f"Simulated donation of {rewards:f} stETH to beneficiary. (Use your wallet to perform the real transaction.)")
         else:
             st.info("No rewards available to donate.")
 
 else:
     st.info("Enter your wallet address to view your balances and vault info.")
 
+# --- VAULT ANALYTICS ---
+with st.expander("Vault Analytics (all donors)"):
+    st.caption("Every depositor seen by the event indexer, read at one block and shared by all visitors; reloaded at most once a minute, and a failed load is retried after a minute.")
+    # Nothing is built or read until asked for: the first load reads every donor
+    if st.toggle("Load vault analytics", key="analytics_on"):
+        refresh = st.button("Reload Donors")
+        try:
+            progress_bar = st.empty()
+            snapshot = get_donor_analytics().snapshot(
+                refresh=refresh,
+                progress=lambda done, total: progress_bar.progress(done / max(total, 1), text=f"{done}/{total} donors"),
+            )
+            progress_bar.empty()
+            decimals = snapshot.decimals
+            total_principal = snapshot.total("principal")
+            st.write(
+                f"**{len(snapshot)} donors** at block {snapshot.block}: "
+                f"{to_units(total_principal, decimals):f} stETH principal, "
+                f"{to_units(snapshot.total('receipts'), decimals):f} KNTX, "
+                f"{to_units(snapshot.rewards, decimals):f} stETH staking rewards"
+            )
+            if snapshot.failed.any():
+                st.warning(f"{int(snapshot.failed.sum())} donors could not be read and count as zero.")
+
+            if len(snapshot):
+                by = st.radio("Rank by", ["principal", "receipts"], horizontal=True, key="analytics_by")
+                top = st.slider("Donors to show", min_value=5, max_value=100, value=20, key="analytics_top")
+                order = snapshot.order(by)[:top]
+                attributed = snapshot.attribute(snapshot.rewards, by=by)
+                st.markdown("**Leaderboard**")
+                st.dataframe([
+                    {
+                        "Donor": snapshot.donors[i],
+                        "Principal (stETH)": f"{to_units(snapshot.principal[i], decimals):f}",
+                        "KNTX": f"{to_units(snapshot.receipts[i], decimals):f}",
+                        "Share": f"{snapshot.amounts(by)[i] / max(snapshot.total(by), 1):.4%}",
+                        "Attributed rewards (stETH)": f"{to_units(attributed[i], decimals):f}",
+                    }
+                    for i in order
+                ])
+
+                st.markdown("**Distribution**")
+                counts, edges = snapshot.histogram(by)
+                if len(counts):
+                    st.bar_chart(
+                        {"Amount (stETH)": [f"{low:.4g}-{high:.4g}" for low, high in zip(edges[:-1], edges[1:])], "Donors": counts},
+                        x="Amount (stETH)", y="Donors",
+                    )
+
+                st.markdown("**Reward projection**")
+                apr = st.number_input("Assumed staking APR (%)", min_value=0.0, max_value=100.0, value=3.0, step=0.1, key="analytics_apr")
+                days = st.number_input("Days ahead", min_value=1, max_value=3650, value=365, key="analytics_days")
+                projected = snapshot.project(apr / 100, int(days), by=by)
+                st.write(
+                    f"Projected rewards over {int(days)} days: **{to_units(int(projected.sum()), decimals):f} stETH**, "
+                    f"{to_units(int(projected[order[0]]), decimals):f} stETH from the top donor."
+                )
+        except Exception as e:
+            st.error(f"Error loading vault analytics: {e}")
+
 st.markdown("---")
 st.markdown("""
 **Note:**  
 - This app is for viewing and simulation only.  
 - Use MetaMask, Etherscan, or your preferred wallet to interact with the contract for real transactions.
-""")
\ No newline at end of file
+""")
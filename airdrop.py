@@ -0,0 +1,563 @@
+"""Bulk token pre-deposits (airdrops) from the admin key, resumable.
+
+`Airdrop` pays a list of `(recipient, amount)` from one funded account, either
+as individual `transfer`s sent in pipelined nonce order or, when a
+Disperse-style batch contract is configured, as one `disperseToken` call per
+`batch_size` recipients (after a single `approve`).
+
+Every payment is recorded in a SQLite checkpoint file under the run's name.
+A transaction is signed and written to the checkpoint *before* it is sent,
+raw bytes included, so after a crash or a stop a resumed run re-broadcasts the
+exact same signed transaction for anything not yet confirmed, and never signs
+a payment to a recipient at a second nonce: re-running a run can't double-pay.
+A run's plan is fixed once made; a different list of recipients or amounts
+needs a new run name. Only one `run()` at a time sends a given run: it holds
+a lease row in the checkpoint, renewed while it works and expiring
+`LEASE_SECONDS` after a crash, and a second engine resuming the same run
+(another session or process) is refused until then. Signing also claims its
+payments atomically, only while they are still planned. The batch contract's
+`approve` is checkpointed the same way, so a resume waits for it rather than
+approving again.
+
+Nonces are kept contiguous: a transaction still unmined after `replace_after`
+seconds is replaced at the same nonce with fees raised by `FEE_BUMP` (only one
+of the two can be mined), and a nonce the node refused is signed again, before
+anything above it is re-sent, so later transactions are never left waiting on
+a gap.
+
+Gas and fees come from a `FeeOracle` (pass the apps' shared one): gas is
+estimated once per transaction shape and fees are sampled once per block, so
+a run costs a handful of fee RPCs however many transfers it sends. `report()`
+gives the throughput in transactions and recipients per second.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from itertools import groupby
+
+from contracts import ERC20_ABI, get_contract
+from fee_oracle import FeeOracle
+
+AIRDROP_DB_FILE = "airdrop.sqlite3"
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_MAX_IN_FLIGHT = 16
+POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 8.0
+REPLACE_AFTER = 180.0
+LEASE_SECONDS = 300.0  # a crashed run's lease lapses after this; renewed at every receipt poll
+FEE_BUMP = 1.125  # nodes take a same-nonce replacement paying at least 10% more
+FEE_FIELDS = ("gasPrice", "maxFeePerGas", "maxPriorityFeePerGas")
+# Transactions that may still be mined: sent (or only signed, if the send was cut short) or replaced
+LIVE = ("signed", "sent", "replaced")
+
+
+class Airdrop:
+    def __init__(self, w3, token, private_key, run, db_path=AIRDROP_DB_FILE, batch_contract=None,
+                 batch_size=DEFAULT_BATCH_SIZE, max_in_flight=DEFAULT_MAX_IN_FLIGHT, fee_oracle=None,
+                 replace_after=REPLACE_AFTER):
+        """`token` is the token contract (with `transfer`); `batch_contract` is optional."""
+        from eth_account import Account
+
+        self.w3 = w3
+        self.token = token
+        self.account = Account.from_key(private_key)
+        self.run_name = run
+        self.db_path = db_path
+        self.batch_contract = batch_contract
+        self.batch_size = batch_size if batch_contract is not None else 1
+        self.max_in_flight = max_in_flight
+        self.replace_after = replace_after
+        self._local = threading.local()
+        self.fee_oracle = fee_oracle if fee_oracle is not None else FeeOracle(w3)
+        self._chain_id = None
+        self._started = None
+        self._started_at = None
+        self._sent_this_run = 0
+        self._stopped = False
+        self._owner = uuid.uuid4().hex
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS payments (
+                run TEXT NOT NULL,
+                recipient TEXT NOT NULL,
+                amount TEXT NOT NULL,
+                status TEXT NOT NULL,
+                tx_hash TEXT,
+                PRIMARY KEY (run, recipient)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS payments_tx ON payments (tx_hash);
+            CREATE TABLE IF NOT EXISTS transactions (
+                tx_hash TEXT PRIMARY KEY,
+                run TEXT NOT NULL,
+                nonce INTEGER NOT NULL,
+                raw TEXT NOT NULL,
+                status TEXT NOT NULL,
+                block_number INTEGER,
+                sent_at REAL,
+                confirmed_at REAL,
+                params TEXT,
+                kind TEXT NOT NULL DEFAULT 'payment'
+            );
+            CREATE INDEX IF NOT EXISTS transactions_run ON transactions (run, status, nonce);
+            CREATE TABLE IF NOT EXISTS leases (
+                run TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            """
+        )
+        # Checkpoints written before replacements (and checkpointed approvals) existed
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(transactions)")}
+        if "params" not in columns:
+            conn.execute("ALTER TABLE transactions ADD COLUMN params TEXT")
+        if "kind" not in columns:
+            conn.execute("ALTER TABLE transactions ADD COLUMN kind TEXT NOT NULL DEFAULT 'payment'")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            self._local.conn = conn
+        return conn
+
+    # --- PLAN ---
+    def plan(self, payments):
+        """Fix the run's `(recipient, amount)` pairs.
+
+        Planning a run again with the same pairs changes nothing, so a resume
+        can re-plan; any other recipients or amounts raise `ValueError`.
+        """
+        planned = {}
+        for recipient, amount in payments:
+            recipient = self.w3.to_checksum_address(recipient)
+            if planned.setdefault(recipient, int(amount)) != int(amount):
+                raise ValueError(f"{recipient} is listed twice with different amounts")
+        conn = self._conn()
+        stored = {
+            recipient: int(amount) for recipient, amount in conn.execute(
+                "SELECT recipient, amount FROM payments WHERE run = ?", (self.run_name,)
+            )
+        }
+        if stored:
+            if stored != planned:
+                added = len(planned.keys() - stored.keys())
+                dropped = len(stored.keys() - planned.keys())
+                changed = sum(1 for r in planned.keys() & stored.keys() if planned[r] != stored[r])
+                raise ValueError(
+                    f"run {self.run_name!r} was planned for {len(stored)} wallets; this plan adds {added}, "
+                    f"drops {dropped} and changes the amount for {changed}. Use a new run name"
+                )
+            return
+        with conn:
+            conn.executemany(
+                "INSERT INTO payments (run, recipient, amount, status) VALUES (?, ?, ?, 'planned')",
+                [(self.run_name, recipient, str(amount)) for recipient, amount in planned.items()],
+            )
+
+    def counts(self):
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) FROM payments WHERE run = ? GROUP BY status", (self.run_name,)
+        )
+        return dict(rows.fetchall())
+
+    # --- LEASE ---
+    def _acquire(self):
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE run = ?", (self.run_name,)).fetchone()
+            if row is not None and row[0] != self._owner and row[1] > now:
+                raise RuntimeError(
+                    f"run {self.run_name!r} is being sent by another session; "
+                    f"if that one crashed, it can be resumed in {int(row[1] - now) + 1} s"
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (run, owner, expires_at) VALUES (?, ?, ?)",
+                (self.run_name, self._owner, now + LEASE_SECONDS),
+            )
+
+    def _renew(self):
+        conn = self._conn()
+        with conn:
+            renewed = conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE run = ? AND owner = ?",
+                (time.time() + LEASE_SECONDS, self.run_name, self._owner),
+            ).rowcount
+        if not renewed:
+            raise RuntimeError(f"run {self.run_name!r} was taken over by another session after its lease lapsed")
+
+    def _release(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM leases WHERE run = ? AND owner = ?", (self.run_name, self._owner))
+
+    # --- SEND ---
+    def run(self, progress=None, retry_failed=False, time_limit=None):
+        """Send everything not yet paid, wait for the receipts and return `report()`.
+
+        `progress(done, total)` is called as payments are confirmed. After
+        `time_limit` seconds the run stops sending and waiting and returns with
+        `report()["stopped"]` set; running it again carries on from the checkpoint.
+        Raises `RuntimeError` while another engine is sending the same run.
+        """
+        self._acquire()
+        try:
+            return self._run(progress, retry_failed, time_limit)
+        finally:
+            self._release()
+
+    def _run(self, progress, retry_failed, time_limit):
+        conn = self._conn()
+        if retry_failed:
+            # A reverted transaction paid nobody, so its recipients can be paid again
+            with conn:
+                conn.execute(
+                    "UPDATE payments SET status = 'planned', tx_hash = NULL WHERE run = ? AND status = 'failed'",
+                    (self.run_name,),
+                )
+        self._started = time.monotonic()
+        self._started_at = time.time()
+        self._sent_this_run = 0
+        self._stopped = False
+        deadline = self._started + time_limit if time_limit is not None else None
+        self._rebroadcast()
+        if self.batch_contract is not None:
+            self._ensure_allowance()
+        while True:
+            planned = conn.execute(
+                "SELECT recipient, amount FROM payments WHERE run = ? AND status = 'planned' ORDER BY recipient LIMIT ?",
+                (self.run_name, self.max_in_flight * self.batch_size),
+            ).fetchall()
+            if not planned:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                self._stopped = True
+                return self.report()
+            if not self._wait(progress, until_in_flight=self.max_in_flight // 2, deadline=deadline):
+                return self.report()
+            self._send_chunk(planned)
+        self._wait(progress, until_in_flight=0, deadline=deadline)
+        return self.report()
+
+    def _send_chunk(self, planned):
+        fees = self.fee_oracle.fees()
+        nonce = self._next_nonce()
+        for i in range(0, len(planned), self.batch_size):
+            tx_hash = self._sign_and_record(planned[i:i + self.batch_size], nonce, fees)
+            self._broadcast(tx_hash)
+            nonce += 1
+
+    def _transaction(self, group, nonce, fees, gas=None):
+        """The unsigned transaction paying `group`, a list of `(recipient, amount)`, at `nonce`."""
+        params = {"from": self.account.address, "chainId": self.chain_id, "nonce": nonce, **fees}
+        if not group:
+            # Nothing left to pay at this nonce: a 0 ETH transfer to ourselves uses it up
+            return dict(params, to=self.account.address, value=0, gas=21000)
+        recipients = [recipient for recipient, _ in group]
+        amounts = [int(amount) for _, amount in group]
+        if self.batch_contract is not None:
+            fn = self.batch_contract.functions.disperseToken(self.token.address, recipients, amounts)
+            shape = ("batch", len(group))
+        else:
+            fn = self.token.functions.transfer(recipients[0], amounts[0])
+            shape = ("transfer",)
+        if gas is None:
+            gas = self.fee_oracle.estimate_gas(fn, {"from": self.account.address}, shape)
+        return fn.build_transaction(dict(params, gas=gas))
+
+    def _sign_and_record(self, group, nonce, fees, gas=None, replaces=None):
+        tx = self._transaction(group, nonce, fees, gas)
+        signed = self.account.sign_transaction(tx)
+        tx_hash = self.w3.to_hex(signed.hash)
+        params = {key: tx[key] for key in ("gas", *FEE_FIELDS) if key in tx}
+        conn = self._conn()
+        # Recorded before it is sent: from here on these payments only ever go out at this nonce
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if replaces is not None:
+                conn.execute("UPDATE transactions SET status = 'replaced' WHERE tx_hash = ?", (replaces,))
+            conn.execute(
+                "INSERT INTO transactions (tx_hash, run, nonce, raw, status, params) VALUES (?, ?, ?, ?, 'signed', ?)",
+                (tx_hash, self.run_name, nonce, self.w3.to_hex(signed.raw_transaction), json.dumps(params)),
+            )
+            # Each payment is claimed only from the state it was read in: still planned, or signed
+            # in the transaction being replaced
+            claimed = sum(
+                conn.execute(
+                    "UPDATE payments SET status = 'signed', tx_hash = ? WHERE run = ? AND recipient = ? "
+                    "AND (status = 'planned' OR (status = 'signed' AND tx_hash = ?))",
+                    (tx_hash, self.run_name, recipient, replaces),
+                ).rowcount
+                for recipient, _ in group
+            )
+            if claimed != len(group):
+                raise RuntimeError(f"run {self.run_name!r}: {len(group) - claimed} of these payments were already signed elsewhere")
+        return tx_hash
+
+    def _broadcast(self, tx_hash):
+        conn = self._conn()
+        raw = conn.execute("SELECT raw FROM transactions WHERE tx_hash = ?", (tx_hash,)).fetchone()[0]
+        try:
+            self.w3.eth.send_raw_transaction(raw)
+        except Exception as e:
+            message = str(e).lower()
+            # Already in the pool or already mined: the receipt check settles it
+            if not any(hint in message for hint in ("already known", "nonce too low", "known transaction")):
+                if getattr(e, "rpc_response", None) is not None:
+                    # The node answered and refused it, so it can never land
+                    self._reject(tx_hash)
+                raise
+        with conn:
+            conn.execute(
+                "UPDATE transactions SET status = 'sent', sent_at = COALESCE(sent_at, ?) WHERE tx_hash = ?",
+                (time.time(), tx_hash),
+            )
+        self._sent_this_run += 1
+
+    def _reject(self, tx_hash):
+        conn = self._conn()
+        (nonce,) = conn.execute("SELECT nonce FROM transactions WHERE tx_hash = ?", (tx_hash,)).fetchone()
+        previous = conn.execute(
+            "SELECT tx_hash FROM transactions WHERE run = ? AND nonce = ? AND status = 'replaced' ORDER BY rowid DESC LIMIT 1",
+            (self.run_name, nonce),
+        ).fetchone()
+        with conn:
+            conn.execute("UPDATE transactions SET status = 'rejected' WHERE tx_hash = ?", (tx_hash,))
+            if previous is not None:
+                # A refused replacement: the one it was to replace is still live; wait a full
+                # replace_after again before the next attempt
+                conn.execute("UPDATE transactions SET status = 'sent', sent_at = ? WHERE tx_hash = ?", (time.time(), previous[0]))
+                conn.execute("UPDATE payments SET tx_hash = ? WHERE tx_hash = ?", (previous[0], tx_hash))
+            else:
+                conn.execute("UPDATE payments SET status = 'planned', tx_hash = NULL WHERE tx_hash = ?", (tx_hash,))
+
+    def _rebroadcast(self):
+        """Resend, byte for byte, whatever an earlier run signed but did not see mined, in nonce order.
+
+        A nonce the node refused below one still in flight is signed again
+        first, with planned payments, so nothing above it waits on it forever.
+        """
+        conn = self._conn()
+        live = dict(conn.execute(
+            "SELECT nonce, tx_hash FROM transactions WHERE run = ? AND kind = 'payment' AND status IN ('signed', 'sent') "
+            "ORDER BY nonce",
+            (self.run_name,),
+        ).fetchall())
+        if not live:
+            return
+        gaps = self._gaps(below=max(live))
+        for nonce in sorted(live.keys() | gaps):
+            tx_hash = live.get(nonce)
+            if tx_hash is not None:
+                if self._receipt(tx_hash) is not None:
+                    continue
+                try:
+                    self._broadcast(tx_hash)
+                    continue
+                except Exception:
+                    status = conn.execute("SELECT status FROM transactions WHERE tx_hash = ?", (tx_hash,)).fetchone()[0]
+                    if status != "rejected":
+                        raise
+                    if conn.execute(
+                        "SELECT 1 FROM transactions WHERE run = ? AND nonce = ? AND status = 'sent'", (self.run_name, nonce)
+                    ).fetchone():
+                        # A refused replacement: the transaction it was to replace is still in flight
+                        continue
+            planned = conn.execute(
+                "SELECT recipient, amount FROM payments WHERE run = ? AND status = 'planned' ORDER BY recipient LIMIT ?",
+                (self.run_name, self.batch_size),
+            ).fetchall()
+            self._broadcast(self._sign_and_record(planned, nonce, self.fee_oracle.fees()))
+
+    def _gaps(self, below):
+        """Nonces under `below` that the node refused and nothing else has used since."""
+        rows = self._conn().execute(
+            "SELECT DISTINCT nonce FROM transactions r WHERE run = ? AND status = 'rejected' AND nonce < ? "
+            "AND NOT EXISTS (SELECT 1 FROM transactions t WHERE t.run = r.run AND t.nonce = r.nonce AND t.status != 'rejected')",
+            (self.run_name, below),
+        ).fetchall()
+        if not rows:
+            return set()
+        # Below the account's mined count, something outside the run took the nonce
+        mined = self.w3.eth.get_transaction_count(self.account.address, "latest")
+        return {nonce for (nonce,) in rows if nonce >= mined}
+
+    def _replace(self, nonce, tx_hash):
+        """Sign `tx_hash`'s payments again at the same nonce, with every fee raised by `FEE_BUMP`."""
+        conn = self._conn()
+        group = conn.execute(
+            "SELECT recipient, amount FROM payments WHERE tx_hash = ? ORDER BY recipient", (tx_hash,)
+        ).fetchall()
+        (params,) = conn.execute("SELECT params FROM transactions WHERE tx_hash = ?", (tx_hash,)).fetchone()
+        old = json.loads(params) if params else {}
+        fees = {key: max(value, int(old.get(key, 0) * FEE_BUMP) + 1) for key, value in self.fee_oracle.fees().items()}
+        replacement = self._sign_and_record(group, nonce, fees, gas=old.get("gas"), replaces=tx_hash)
+        try:
+            self._broadcast(replacement)
+        except Exception:
+            # Refused (the old one is live again) or not delivered (both stay in play): retried later
+            pass
+
+    def _ensure_allowance(self):
+        """Approve the batch contract for what is left to pay, and wait for it to be mined.
+
+        The approval is checkpointed before it is sent, like a payment, so a
+        run resumed while it is unmined re-sends and waits for that one.
+        """
+        conn = self._conn()
+        live = conn.execute(
+            "SELECT tx_hash FROM transactions WHERE run = ? AND kind = 'approve' AND status IN ('signed', 'sent') "
+            "ORDER BY rowid DESC LIMIT 1",
+            (self.run_name,),
+        ).fetchone()
+        if live is not None:
+            (tx_hash,) = live
+        else:
+            total = sum(
+                int(amount) for (amount,) in conn.execute(
+                    "SELECT amount FROM payments WHERE run = ? AND status = 'planned'", (self.run_name,)
+                )
+            )
+            spender = self.batch_contract.address
+            erc20 = get_contract(self.w3, self.token.address, ERC20_ABI)
+            if total == 0 or erc20.functions.allowance(self.account.address, spender).call() >= total:
+                return
+            nonce = self._next_nonce()
+            tx = erc20.functions.approve(spender, total).build_transaction({
+                "from": self.account.address,
+                "chainId": self.chain_id,
+                "nonce": nonce,
+                **self.fee_oracle.fees(),
+            })
+            signed = self.account.sign_transaction(tx)
+            tx_hash = self.w3.to_hex(signed.hash)
+            params = {key: tx[key] for key in ("gas", *FEE_FIELDS) if key in tx}
+            with conn:
+                conn.execute(
+                    "INSERT INTO transactions (tx_hash, run, nonce, raw, status, params, kind) "
+                    "VALUES (?, ?, ?, ?, 'signed', ?, 'approve')",
+                    (tx_hash, self.run_name, nonce, self.w3.to_hex(signed.raw_transaction), json.dumps(params)),
+                )
+        self._broadcast(tx_hash)
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        status = "confirmed" if receipt["status"] == 1 else "failed"
+        with conn:
+            conn.execute(
+                "UPDATE transactions SET status = ?, block_number = ?, confirmed_at = ? WHERE tx_hash = ?",
+                (status, receipt["blockNumber"], time.time(), tx_hash),
+            )
+        if status != "confirmed":
+            raise RuntimeError("approve for the batch transfer contract reverted")
+
+    # --- RECEIPTS ---
+    def _wait(self, progress, until_in_flight, deadline=None):
+        """Poll receipts until at most `until_in_flight` nonces are unmined; False if `deadline` came first."""
+        interval = POLL_INTERVAL
+        while True:
+            self._renew()
+            in_flight = self._settle()
+            if progress is not None:
+                counts = self.counts()
+                progress(counts.get("confirmed", 0) + counts.get("failed", 0), sum(counts.values()))
+            if in_flight <= until_in_flight:
+                return True
+            if deadline is not None and time.monotonic() + interval > deadline:
+                self._stopped = True
+                return False
+            time.sleep(interval)
+            interval = min(MAX_POLL_INTERVAL, interval * 1.5)
+
+    def _settle(self):
+        """Record receipts in nonce order and replace a stuck transaction; returns how many nonces are unmined."""
+        conn = self._conn()
+        rows = conn.execute(
+            f"SELECT nonce, tx_hash, sent_at FROM transactions WHERE run = ? AND kind = 'payment' AND status IN {LIVE} "
+            "ORDER BY nonce, rowid",
+            (self.run_name,),
+        ).fetchall()
+        nonces = [(nonce, [(tx_hash, sent_at) for _, tx_hash, sent_at in txs]) for nonce, txs in groupby(rows, key=lambda row: row[0])]
+        for i, (nonce, txs) in enumerate(nonces):
+            # Any of a nonce's transactions may be the one mined, the newest most likely
+            for tx_hash, _ in reversed(txs):
+                receipt = self._receipt(tx_hash)
+                if receipt is not None:
+                    break
+            else:
+                # Higher nonces can't be mined before this one
+                tx_hash, sent_at = txs[-1]
+                if sent_at is None or time.time() - sent_at >= self.replace_after:
+                    self._replace(nonce, tx_hash)
+                return len(nonces) - i
+            status = "confirmed" if receipt["status"] == 1 else "failed"
+            with conn:
+                conn.execute(
+                    "UPDATE transactions SET status = ?, block_number = ?, confirmed_at = ? WHERE tx_hash = ?",
+                    (status, receipt["blockNumber"], time.time(), tx_hash),
+                )
+                conn.executemany(
+                    "UPDATE transactions SET status = 'dropped' WHERE tx_hash = ?",
+                    [(other,) for other, _ in txs if other != tx_hash],
+                )
+                conn.executemany(
+                    "UPDATE payments SET status = ?, tx_hash = ? WHERE run = ? AND tx_hash = ?",
+                    [(status, tx_hash, self.run_name, other) for other, _ in txs],
+                )
+        return 0
+
+    def _receipt(self, tx_hash):
+        try:
+            return self.w3.eth.get_transaction_receipt(tx_hash)
+        except Exception as e:
+            if type(e).__name__ == "TransactionNotFound":
+                return None
+            raise
+
+    # --- CHAIN PARAMETERS ---
+    @property
+    def chain_id(self):
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        return self._chain_id
+
+    def _next_nonce(self):
+        row = self._conn().execute(
+            "SELECT MAX(nonce) FROM transactions WHERE run = ? AND status != 'rejected'", (self.run_name,)
+        ).fetchone()
+        pending = self.w3.eth.get_transaction_count(self.account.address, "pending")
+        return max(pending, row[0] + 1) if row[0] is not None else pending
+
+    # --- REPORT ---
+    def report(self):
+        conn = self._conn()
+        counts = self.counts()
+        tx_counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM transactions WHERE run = ? GROUP BY status", (self.run_name,)
+        ).fetchall())
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        # Throughput covers this call to run() only, not earlier sessions of the same run
+        confirmed_tx, confirmed_recipients = conn.execute(
+            "SELECT COUNT(DISTINCT t.tx_hash), COUNT(*) FROM transactions t JOIN payments p ON p.tx_hash = t.tx_hash "
+            "WHERE t.run = ? AND t.status = 'confirmed' AND t.confirmed_at >= ?",
+            (self.run_name, self._started_at or 0),
+        ).fetchone()
+        return {
+            "recipients": sum(counts.values()),
+            "paid": counts.get("confirmed", 0),
+            "failed": counts.get("failed", 0),
+            "outstanding": sum(n for status, n in counts.items() if status not in ("confirmed", "failed")),
+            # One per nonce used: refused ones and the losers of a replacement never landed
+            "transactions": sum(n for status, n in tx_counts.items() if status not in ("rejected", "replaced", "dropped")),
+            "replaced": tx_counts.get("replaced", 0) + tx_counts.get("dropped", 0),
+            "stopped": self._stopped,
+            "sent_this_run": self._sent_this_run,
+            "elapsed_s": round(elapsed, 2),
+            "sent_tx_per_s": round(self._sent_this_run / elapsed, 2) if elapsed else None,
+            "confirmed_tx_per_s": round(confirmed_tx / elapsed, 2) if elapsed else None,
+            "recipients_per_s": round(confirmed_recipients / elapsed, 2) if elapsed else None,
+        }
@@ -0,0 +1,319 @@
+"""JSON HTTP API over `simpleth_core`, for services that are not a browser.
+
+    python api_server.py --port 8080 --workers 4
+
+Built on aiohttp with keep-alive connections. The listening socket is bound
+once and shared by `--workers` forked processes (POSIX only; one process
+elsewhere). Each worker builds its own web3 provider, `BalanceCache`,
+`VaultStats` and wallet store after the fork, so upstream connections are never
+shared across processes. Reads and wallet writes run on the loop's thread pool;
+logins, which each cost a keystore KDF run, get a small pool of their own so a
+burst of them cannot hold up balance lookups.
+
+`/login` is also limited per worker: each client IP gets `LOGIN_ATTEMPTS`
+attempts per `LOGIN_PERIOD` seconds, and at most `LOGIN_QUEUE` logins wait for
+the KDF pool at once; anything over either limit gets 429 with `Retry-After`.
+The client IP is the connection's peer address, so behind a reverse proxy every
+client shares the proxy's budget.
+
+The RPC endpoint and contract addresses are `simpleth_core`'s configuration.
+
+Endpoints (amounts are wei as decimal strings, addresses checksummed):
+
+- `GET /health`
+- `GET /balances/{address}`: stETH in the wallet and in Simpleth
+- `POST /login` `{"address", "access_code"}`: `{"address", "valid"}`
+- `POST /wallets`: `{"address", "access_code"}` of a new wallet; needs
+  `Authorization: Bearer $SIMPLETH_API_TOKEN`, and is disabled without it
+- `GET /vault`, `GET /vault/{donor}`: Kinetix vault stats, and the donor's
+  balances
+- `GET /metrics`: this worker's RPC metrics in Prometheus text format
+
+Errors come back as `{"error": message}` with a 4xx/5xx status: 400 for
+input this module rejects, 502 when a chain read fails, 500 for anything else.
+Only 4xx messages describe the problem; a 502 or 500 gets a generic message
+and the exception is logged here, since provider errors can carry the RPC
+URL, API key included.
+"""
+import argparse
+import asyncio
+import hmac
+import logging
+import math
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from aiohttp import web
+
+import rpc_metrics
+import simpleth_core
+from simpleth_core import INFURA_URL, SIMPLETH_CONTRACT_ADDRESS, STETH_CONTRACT_ADDRESS, VAULT_ADDRESS, VAULT_STETH_ADDRESS
+
+# --- CONFIGURATION ---
+# The RPC endpoint and contract addresses are set in simpleth_core.py
+API_TOKEN = os.environ.get("SIMPLETH_API_TOKEN")
+KEEPALIVE_TIMEOUT = 75.0
+LOGIN_THREADS = 2
+LOGIN_ATTEMPTS = 10  # <-- Per client IP and LOGIN_PERIOD, per worker
+LOGIN_PERIOD = 60.0
+LOGIN_QUEUE = 64
+MAX_TRACKED_CLIENTS = 10000
+
+log = logging.getLogger("api_server")
+
+
+class Backend:
+    """One worker's shared components, the API's counterpart of the apps' `get_*` factories."""
+
+    def __init__(self, rpc_url=INFURA_URL):
+        from web3 import Web3
+
+        from balance_cache import BalanceCache
+        from contracts import ERC20_ABI, KINETIX_VAULT_ABI, SIMPLETH_ABI, STETH_ABI, get_contract
+        from rpc_pool import PooledRPCProvider, rpc_urls
+        from vault_stats import VaultStats
+        from wallet_store import open_wallet_store
+
+        self.w3 = rpc_metrics.install(Web3(PooledRPCProvider(rpc_urls(rpc_url), hedge=True)))
+        self.store = open_wallet_store()
+        self.balance_cache = BalanceCache(self.w3)
+        self.steth = get_contract(self.w3, STETH_CONTRACT_ADDRESS, STETH_ABI)
+        self.simpleth = get_contract(self.w3, SIMPLETH_CONTRACT_ADDRESS, SIMPLETH_ABI)
+        self.vault = self.vault_steth = self.vault_stats = None
+        if VAULT_ADDRESS:
+            self.vault = get_contract(self.w3, VAULT_ADDRESS, KINETIX_VAULT_ABI)
+            self.vault_steth = get_contract(self.w3, VAULT_STETH_ADDRESS, ERC20_ABI)
+            self.vault_stats = VaultStats(self.w3, self.vault, self.vault_steth)
+
+
+class BadRequest(Exception):
+    """Invalid request input; reported as 400."""
+
+
+class UpstreamError(Exception):
+    """A chain read failed; reported as 502."""
+
+
+class LoginLimiter:
+    """Per-client-IP token buckets for `/login`, and the count of logins waiting on the KDF pool."""
+
+    def __init__(self, attempts=LOGIN_ATTEMPTS, period=LOGIN_PERIOD, max_queued=LOGIN_QUEUE,
+                 max_clients=MAX_TRACKED_CLIENTS):
+        self.attempts = attempts
+        self.period = period
+        self.max_queued = max_queued
+        self.max_clients = max_clients
+        self.queued = 0
+        self._buckets = {}  # ip -> (tokens, updated)
+
+    def retry_after(self, ip):
+        """0 if `ip` may attempt a login now, which uses up one attempt; otherwise seconds to wait."""
+        now = time.monotonic()
+        tokens = self._tokens(ip, now)
+        if tokens < 1:
+            return math.ceil((1 - tokens) * self.period / self.attempts)
+        self._buckets[ip] = (tokens - 1, now)
+        if len(self._buckets) > self.max_clients:
+            # A full bucket is the same as no bucket
+            for client in [client for client in self._buckets if self._tokens(client, now) >= self.attempts]:
+                del self._buckets[client]
+        return 0
+
+    def _tokens(self, ip, now):
+        tokens, updated = self._buckets.get(ip, (self.attempts, now))
+        return min(self.attempts, tokens + (now - updated) * self.attempts / self.period)
+
+
+BACKEND = web.AppKey("backend", object)
+LOGIN_POOL = web.AppKey("login_pool", ThreadPoolExecutor)
+LOGIN_LIMITER = web.AppKey("login_limiter", LoginLimiter)
+
+
+def _blocking(fn, *args, executor=None):
+    return asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args))
+
+
+def _wei(value):
+    if isinstance(value, Exception):
+        raise UpstreamError("Upstream read failed") from value
+    return str(value)
+
+
+def _address(value):
+    try:
+        return simpleth_core.checksum(value)
+    except ValueError as e:
+        raise BadRequest(str(e)) from None
+
+
+async def _json_body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise BadRequest("Request body must be JSON") from None
+    if not isinstance(body, dict):
+        raise BadRequest("Request body must be a JSON object")
+    return body
+
+
+@web.middleware
+async def json_errors(request, handler):
+    try:
+        return await handler(request)
+    except web.HTTPException as e:
+        headers = {"Retry-After": e.headers["Retry-After"]} if "Retry-After" in e.headers else None
+        return web.json_response({"error": e.reason}, status=e.status, headers=headers)
+    except BadRequest as e:
+        return web.json_response({"error": str(e)}, status=400)
+    except UpstreamError as e:
+        log.warning("%s %s: %s", request.method, request.path, e, exc_info=e.__cause__)
+        return web.json_response({"error": str(e)}, status=502)
+    except Exception:
+        log.exception("%s %s failed", request.method, request.path)
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+# --- HANDLERS ---
+routes = web.RouteTableDef()
+
+
+@routes.get("/health")
+async def health(request):
+    return web.json_response({"ok": True})
+
+
+@routes.get("/balances/{address}")
+async def balances(request):
+    backend = request.app[BACKEND]
+    address = _address(request.match_info["address"])
+    steth_balance, simpleth_balance = await _blocking(
+        simpleth_core.wallet_balances, backend.balance_cache, backend.steth, backend.simpleth, address
+    )
+    return web.json_response({"address": address, "steth_wallet": _wei(steth_balance), "steth_simpleth": _wei(simpleth_balance)})
+
+
+@routes.post("/login")
+async def login(request):
+    backend = request.app[BACKEND]
+    limiter = request.app[LOGIN_LIMITER]
+    # Checked before anything else, so a refused attempt costs next to nothing
+    wait = limiter.retry_after(request.remote)
+    if wait:
+        raise web.HTTPTooManyRequests(reason="Too many login attempts", headers={"Retry-After": str(wait)})
+    body = await _json_body(request)
+    address = _address(body.get("address"))
+    access_code = body.get("access_code")
+    if not isinstance(access_code, str):
+        raise BadRequest("access_code is required")
+    if limiter.queued >= limiter.max_queued:
+        raise web.HTTPTooManyRequests(reason="Too many logins in progress", headers={"Retry-After": "1"})
+    limiter.queued += 1
+    try:
+        private_key = await _blocking(
+            simpleth_core.verify_login, backend.store, address, access_code, executor=request.app[LOGIN_POOL]
+        )
+    finally:
+        limiter.queued -= 1
+    # The key never leaves the server
+    return web.json_response({"address": address, "valid": private_key is not None})
+
+
+@routes.post("/wallets")
+async def create_wallet(request):
+    if not API_TOKEN:
+        raise web.HTTPForbidden(reason="Wallet creation is disabled: set SIMPLETH_API_TOKEN")
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), API_TOKEN.encode()):
+        raise web.HTTPUnauthorized(reason="Missing or wrong API token")
+    wallet_address, wallet_info = await _blocking(simpleth_core.create_wallet, request.app[BACKEND].store)
+    return web.json_response({"address": wallet_address, "access_code": wallet_info["access_code"]}, status=201)
+
+
+@routes.get("/vault")
+@routes.get("/vault/{donor}")
+async def vault(request):
+    backend = request.app[BACKEND]
+    if backend.vault_stats is None:
+        raise web.HTTPNotFound(reason="No vault configured")
+    donor = request.match_info.get("donor")
+    if donor is not None:
+        donor = _address(donor)
+    info = await _blocking(
+        simpleth_core.vault_info, backend.vault_stats, backend.w3, backend.vault, backend.vault_steth, donor
+    )
+    body = {
+        "block": info["block"],
+        "decimals": info["decimals"],
+        "beneficiary": info["beneficiary"],
+        "vault_balance": _wei(info["vault_balance"]),
+        "staking_rewards": _wei(info["staking_rewards"]),
+    }
+    if donor is not None:
+        body.update(donor=donor, steth_balance=_wei(info["steth_balance"]), receipts=_wei(info["receipts"]), principal=_wei(info["principal"]))
+    return web.json_response(body)
+
+
+@routes.get("/metrics")
+async def metrics(request):
+    return web.Response(text=rpc_metrics.METRICS.prometheus_text(), content_type="text/plain")
+
+
+# --- APP ---
+def make_app(backend=None, login_limiter=None):
+    """The aiohttp app; `backend` defaults to a `Backend()` built when the app starts."""
+    app = web.Application(middlewares=[json_errors])
+    app.add_routes(routes)
+
+    async def lifecycle(app):
+        app[BACKEND] = backend if backend is not None else Backend()
+        app[LOGIN_POOL] = ThreadPoolExecutor(max_workers=LOGIN_THREADS, thread_name_prefix="login")
+        app[LOGIN_LIMITER] = login_limiter if login_limiter is not None else LoginLimiter()
+        yield
+        app[LOGIN_POOL].shutdown(wait=False, cancel_futures=True)
+
+    app.cleanup_ctx.append(lifecycle)
+    return app
+
+
+def _run_worker(sock):
+    web.run_app(make_app(), sock=sock, keepalive_timeout=KEEPALIVE_TIMEOUT, access_log=None, print=None)
+
+
+def serve(host="127.0.0.1", port=8080, workers=1):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+    print(f"Serving on http://{host}:{sock.getsockname()[1]} with {workers} worker(s)")
+    if workers <= 1 or not hasattr(os, "fork"):
+        _run_worker(sock)
+        return
+    import multiprocessing
+
+    # Forked after binding: every worker accepts on the same socket
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_run_worker, args=(sock,), name=f"api-worker-{i}") for i in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s")
+    serve(args.host, args.port, args.workers)
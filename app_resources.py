@@ -0,0 +1,123 @@
+"""Process-wide resources shared by the Streamlit apps, and the admin apps' RPC debug panel.
+
+Each `get_*` factory is an `st.cache_resource`: built on first use, once per
+server process, and shared by every session of every app running in it. The
+heavy imports (web3, numpy, the background services) happen inside the
+factories, so importing this module stays cheap. Settings come from
+`simpleth_core`'s configuration.
+"""
+import streamlit as st
+
+import rpc_metrics
+from contracts import SIMPLETH_ABI, STETH_ABI, TRANSFER_EVENT_ABI, get_contract
+from simpleth_core import INDEX_FROM_BLOCK, INFURA_URL, INFURA_WS_URL, SIMPLETH_CONTRACT_ADDRESS, STETH_CONTRACT_ADDRESS
+
+
+# --- WALLET DB ---
+@st.cache_resource
+def get_wallet_store():
+    # JSON by default; set SIMPLETH_WALLET_STORE=sqlite for the indexed SQLite store
+    from wallet_store import open_wallet_store
+    return open_wallet_store()
+
+@st.cache_resource
+def get_unlocked_keys():
+    # Keys decrypted at login, per session, so the keystore KDF is paid once per login
+    from keystore import UnlockedKeys
+    return UnlockedKeys()
+
+@st.cache_resource
+def get_wallet_index():
+    # Sorted, trigram-indexed addresses shared by every session; built on the first search
+    from wallet_index import WalletIndex
+    return WalletIndex(get_wallet_store())
+
+# --- WEB3 SETUP ---
+@st.cache_resource
+def get_web3():
+    # Built on first chain operation, once per process; web3 is not imported before that.
+    # Set SIMPLETH_RPC_URLS to route across several endpoints.
+    from web3 import Web3
+    from rpc_pool import PooledRPCProvider, rpc_urls
+    w3 = Web3(PooledRPCProvider(rpc_urls(INFURA_URL), hedge=True))
+    rpc_metrics.install(w3)
+    rpc_metrics.serve_from_env()
+    return w3
+
+@st.cache_resource
+def get_read_engine():
+    # One event loop and keep-alive session for concurrent reads, shared by all sessions.
+    # Same endpoints as get_web3 (SIMPLETH_RPC_URLS), with the same failover and retries.
+    from async_reader import AsyncReadEngine
+    from rpc_pool import rpc_urls
+    return AsyncReadEngine(rpc_urls(INFURA_URL))
+
+@st.cache_resource
+def get_balance_cache():
+    # Shared by every session on this server: one read per wallet per block
+    from balance_cache import BalanceCache
+    return BalanceCache(get_web3())
+
+@st.cache_resource
+def get_fee_oracle():
+    # Fees sampled once per block and same-shape gas estimates memoized, for every session's transactions
+    from fee_oracle import FeeOracle
+    return FeeOracle(get_web3(), head=get_balance_cache().latest_block)
+
+@st.cache_resource
+def get_block_watcher():
+    # Follows the chain head and pushes balances of logged-in wallets into their sessions
+    from block_watcher import BlockWatcher
+    return BlockWatcher(get_balance_cache(), ws_url=INFURA_WS_URL)
+
+@st.cache_resource
+def get_transfer_service():
+    # Signs withdrawals locally and tracks their receipts in the background, shared by every session
+    from withdrawals import TransferService
+    return TransferService(get_web3(), fee_oracle=get_fee_oracle(), balance_cache=get_balance_cache())
+
+# --- BACKGROUND INDEXES ---
+@st.cache_resource
+def get_event_indexer():
+    # Background indexer shared by every session; history is read from its local SQLite file
+    from event_indexer import EventIndexer
+    indexer = EventIndexer(
+        get_web3(),
+        {STETH_CONTRACT_ADDRESS: [TRANSFER_EVENT_ABI], SIMPLETH_CONTRACT_ADDRESS: [TRANSFER_EVENT_ABI]},
+        name="simpleth",
+        start_block=INDEX_FROM_BLOCK,
+    )
+    indexer.start()
+    return indexer
+
+@st.cache_resource
+def get_balance_history():
+    # Background sampler shared by every session; charts read its precomputed rollups, not the chain
+    from balance_history import BalanceHistory
+    w3 = get_web3()
+    history = BalanceHistory(
+        w3,
+        {"stETH": get_contract(w3, STETH_CONTRACT_ADDRESS, STETH_ABI), "Simpleth": get_contract(w3, SIMPLETH_CONTRACT_ADDRESS, SIMPLETH_ABI)},
+        start_block=INDEX_FROM_BLOCK,
+    )
+    history.start()
+    return history
+
+# --- RPC DEBUG PANEL ---
+def show_rpc_debug_panel():
+    """This rerun's RPC calls and the process-wide metrics, when SIMPLETH_RPC_DEBUG is set."""
+    if not rpc_metrics.debug_enabled():
+        return
+    with st.expander("RPC Performance (debug)"):
+        calls = rpc_metrics.rerun_records()
+        st.markdown(f"**This rerun:** {len(calls)} RPC round trips, {sum(c['latency_ms'] for c in calls):.1f} ms in total")
+        if calls:
+            st.dataframe(calls)
+        st.markdown("**Since server start:**")
+        st.dataframe(rpc_metrics.METRICS.summary())
+        st.download_button(
+            "Download Prometheus Metrics",
+            rpc_metrics.METRICS.prometheus_text(),
+            file_name="rpc_metrics.prom",
+            mime="text/plain",
+        )
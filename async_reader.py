@@ -0,0 +1,108 @@
+"""asyncio read engine on AsyncWeb3.
+
+`AsyncReadEngine` owns one event loop running on a daemon thread, one
+`AsyncWeb3(AsyncPooledRPCProvider)` over the configured endpoints (so reads get
+the same failover and retries as the sync provider) and one shared keep-alive
+aiohttp session. The Streamlit script thread hands it coroutines with `run`
+(wait for the result) or `submit` (get a `concurrent.futures.Future`), and
+every eth_call goes through a semaphore so at most `concurrency` requests are
+in flight at once.
+
+    engine = AsyncReadEngine(rpc_urls(INFURA_URL))
+    steth = engine.contract(STETH_ADDRESS, STETH_ABI)
+    balance, decimals = engine.gather_calls([
+        (steth, "balanceOf", [holder]),
+        (steth, "decimals", []),
+    ])
+"""
+import asyncio
+import threading
+
+import aiohttp
+from web3 import AsyncWeb3, Web3
+
+import rpc_metrics
+from balance_reader import MULTICALL3_ABI, MULTICALL3_ADDRESS, decode_return_data
+from rpc_pool import AsyncPooledRPCProvider
+
+DEFAULT_CONCURRENCY = 8
+
+
+class AsyncReadEngine:
+    def __init__(self, urls, concurrency=DEFAULT_CONCURRENCY):
+        """`urls` is one endpoint URL or a list of them, e.g. `rpc_pool.rpc_urls(INFURA_URL)`."""
+        self.concurrency = concurrency
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="async-read-engine", daemon=True).start()
+        self.w3 = rpc_metrics.install(AsyncWeb3(AsyncPooledRPCProvider(urls, pool_size=concurrency)))
+        self._contracts = {}
+        self._semaphore = None
+        self._session = None
+        self.run(self._setup())
+
+    async def _setup(self):
+        # The session (and its connection pool) must be created on the engine's loop
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.concurrency))
+        await self.w3.provider.cache_async_session(self._session)
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def close(self):
+        self.run(self._session.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def contract(self, address, abi):
+        key = (address, id(abi))
+        if key not in self._contracts:
+            self._contracts[key] = self.w3.eth.contract(address=Web3.to_checksum_address(address), abi=abi)
+        return self._contracts[key]
+
+    async def call(self, contract, fn_name, args=(), block_identifier="latest"):
+        async with self._semaphore:
+            return await getattr(contract.functions, fn_name)(*args).call(block_identifier=block_identifier)
+
+    async def gather(self, calls, block_identifier="latest"):
+        """Run `(contract, function_name, args)` calls concurrently; failures come back as exceptions."""
+        return await asyncio.gather(
+            *(self.call(contract, fn_name, args, block_identifier) for contract, fn_name, args in calls),
+            return_exceptions=True,
+        )
+
+    def gather_calls(self, calls, block_identifier="latest"):
+        return self.run(self.gather(calls, block_identifier))
+
+    async def read_many(self, calls, multicall_address=MULTICALL3_ADDRESS, block_identifier="latest"):
+        """Async counterpart of `balance_reader.read_many`: one aggregate3 eth_call."""
+        if not calls:
+            return []
+        fns = [getattr(contract.functions, fn_name)(*args) for contract, fn_name, args in calls]
+        multicall = self.contract(multicall_address, MULTICALL3_ABI)
+        try:
+            async with self._semaphore:
+                results = await multicall.functions.aggregate3(
+                    [(fn.address, True, fn._encode_transaction_data()) for fn in fns]
+                ).call(block_identifier=block_identifier)
+        except Exception:
+            return await self.gather(calls, block_identifier)
+
+        values = []
+        retry = []
+        for i, (fn, (success, return_data)) in enumerate(zip(fns, results)):
+            values.append(None)
+            if success:
+                try:
+                    values[i] = decode_return_data(self.w3, fn, return_data)
+                    continue
+                except Exception:
+                    pass
+            retry.append(i)
+        if retry:
+            retried = await self.gather([calls[i] for i in retry], block_identifier)
+            for i, value in zip(retry, retried):
+                values[i] = value
+        return values
@@ -0,0 +1,95 @@
+"""Process-wide balanceOf cache keyed by (token, holder, block_number).
+
+One `BalanceCache` is shared by every Streamlit session (see `get_balance_cache`
+in the apps, built on `st.cache_resource`). Entries are only valid for the block
+they were read at, so the cache is dropped as soon as the chain head moves and
+otherwise each wallet costs one upstream read per block no matter how many
+sessions or reruns ask for it.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from balance_reader import read_many
+
+
+class BalanceCache:
+    def __init__(self, w3, maxsize=10000, head_check_interval=2.0):
+        self.w3 = w3
+        self.maxsize = maxsize
+        # eth_blockNumber is issued at most once per interval, whatever the traffic
+        self.head_check_interval = head_check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._head = None
+        self._head_checked_at = 0.0
+
+    def latest_block(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._head is not None and now - self._head_checked_at < self.head_check_interval:
+                return self._head
+        head = self.w3.eth.block_number
+        with self._lock:
+            self._set_head(head)
+            self._head_checked_at = now
+            return self._head
+
+    def observe_head(self, head):
+        """Record a chain head learned elsewhere, e.g. from a newHeads subscription."""
+        with self._lock:
+            self._set_head(head)
+            self._head_checked_at = time.monotonic()
+
+    def _set_head(self, head):
+        # Only move forward, so endpoints lagging a block behind don't flush the cache
+        if self._head is None or head > self._head:
+            # New block: everything cached so far is stale
+            self._entries.clear()
+            self._head = head
+
+    def get_balances(self, contracts, holder):
+        """Return `balanceOf(holder)` for each contract, in order.
+
+        Misses are fetched together in one Multicall3 read pinned to the current
+        block. Failed reads come back as exceptions and are not cached.
+        """
+        return self.get_many(contracts, [holder])[holder]
+
+    def get_many(self, contracts, holders):
+        """Like `get_balances` for several holders at once: `{holder: [balance, ...]}`."""
+        block = self.latest_block()
+        results = {holder: [None] * len(contracts) for holder in holders}
+        missing = []
+        with self._lock:
+            for holder in holders:
+                for i, contract in enumerate(contracts):
+                    key = (contract.address, holder, block)
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                        results[holder][i] = self._entries[key]
+                    else:
+                        missing.append((holder, i))
+        if not missing:
+            return results
+
+        fetched = read_many(
+            self.w3,
+            [(contracts[i], "balanceOf", [holder]) for holder, i in missing],
+            block_identifier=block,
+        )
+        with self._lock:
+            for (holder, i), value in zip(missing, fetched):
+                results[holder][i] = value
+                if isinstance(value, Exception) or block != self._head:
+                    continue
+                key = (contracts[i].address, holder, block)
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
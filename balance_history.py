@@ -0,0 +1,383 @@
+"""Balance history: sampled `balanceOf` series with precomputed rollups.
+
+`BalanceHistory` samples the balances of tracked wallets at historical blocks
+on a background thread and keeps them in a local SQLite file, so the
+dashboards can chart a trend without an archive call per point:
+
+- samples are taken on a fixed block grid (every `RAW_STEP` blocks), shared by
+  every tracked wallet: one Multicall3 eth_call per grid block covers all of
+  them and every token, and the eth_calls of up to `HEADER_BATCH` blocks go
+  out in one JSON-RPC batch, as do their block headers for the timestamps;
+- a newly tracked wallet is backfilled `backfill_days` into the past on a grid
+  that is coarser the older the blocks, since only the rollups keep old
+  samples anyway;
+- a wallet is sampled while it is in use: one not tracked for `expire_days`
+  (or `untrack`ed) is skipped, its samples kept, and backfilled again like a
+  new one when it is tracked once more;
+- each series is stored columnar, as one blob per (wallet, token, level):
+  block numbers, unix timestamps and the wei amount as its high and low
+  64-bit words, exact below 2**128 wei;
+- three levels are kept (see `LEVELS`): the raw samples of the last two days,
+  the last sample of each hour for 90 days and of each day for good. Rollups
+  are rebuilt from the new samples as they arrive, so a chart reads only the
+  one level whose resolution fits its range.
+
+stETH rebases without Transfer events, which is why balances are sampled
+rather than derived from the transfer index.
+"""
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from balance_reader import read_many_at
+
+HISTORY_DB_FILE = "balance_history.sqlite3"
+BLOCK_TIME = 12  # seconds per slot, to turn ages into block counts
+RAW_STEP = 50  # blocks between samples, about 10 minutes
+DEFAULT_BACKFILL_DAYS = 30
+DEFAULT_EXPIRE_DAYS = 14
+TOUCH_INTERVAL = 3600  # seconds between writes of a tracked wallet's last_seen
+DEFAULT_CONFIRMATIONS = 12
+DEFAULT_MAX_POINTS = 500
+HEADER_BATCH = 100
+MAX_CALLS = 500  # balanceOf reads per Multicall3 eth_call
+BATCH_CALLS = 5000  # balanceOf reads per JSON-RPC batch of eth_calls
+# (bucket seconds, retention seconds): 0 is the raw samples, None keeps everything
+LEVELS = ((0, 2 * 86400), (3600, 90 * 86400), (86400, None))
+LEVEL_NAMES = {0: f"every {RAW_STEP} blocks", 3600: "hourly", 86400: "daily"}
+MASK64 = (1 << 64) - 1
+
+
+class Series:
+    """One balance series as columns: block, timestamp (unix seconds) and wei as (hi, lo) uint64 words."""
+
+    __slots__ = ("blocks", "timestamps", "hi", "lo")
+
+    def __init__(self, blocks, timestamps, hi, lo):
+        self.blocks = blocks
+        self.timestamps = timestamps
+        self.hi = hi
+        self.lo = lo
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.uint64), np.zeros(0, np.uint64))
+
+    @classmethod
+    def from_samples(cls, blocks, timestamps, amounts):
+        """From Python ints; raises OverflowError at 2**128 wei or more."""
+        amounts = np.array(amounts, dtype=object)
+        return cls(
+            np.array(blocks, dtype=np.int64),
+            np.array(timestamps, dtype=np.int64),
+            (amounts >> 64).astype(np.uint64),
+            (amounts & MASK64).astype(np.uint64),
+        )
+
+    @classmethod
+    def from_bytes(cls, data):
+        columns = np.frombuffer(data, dtype=np.uint64).reshape(4, -1)
+        return cls(columns[0].view(np.int64), columns[1].view(np.int64), columns[2], columns[3])
+
+    def to_bytes(self):
+        return np.concatenate([self.blocks.view(np.uint64), self.timestamps.view(np.uint64), self.hi, self.lo]).tobytes()
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def take(self, index):
+        return Series(self.blocks[index], self.timestamps[index], self.hi[index], self.lo[index])
+
+    def wei(self):
+        """Exact amounts as an object array of Python ints."""
+        return (self.hi.astype(object) << 64) | self.lo.astype(object)
+
+    def tokens(self, decimals=18):
+        """Amounts in whole tokens as float64, for charts."""
+        return (self.hi.astype(np.float64) * 2.0**64 + self.lo.astype(np.float64)) / 10.0**decimals
+
+    def merge(self, other):
+        """Both series in block order; where both have a block, `other`'s sample wins."""
+        merged = Series(*(np.concatenate([a, b]) for a, b in zip(self._columns(), other._columns())))
+        merged = merged.take(np.argsort(merged.blocks, kind="stable"))
+        return merged.take(_last_of_runs(merged.blocks))
+
+    def rollup(self, seconds):
+        """The last sample of each `seconds`-long bucket."""
+        if not seconds or not len(self):
+            return self
+        return self.take(_last_of_runs(self.timestamps // seconds))
+
+    def since(self, timestamp):
+        return self.take(slice(np.searchsorted(self.timestamps, timestamp), None))
+
+    def _columns(self):
+        return self.blocks, self.timestamps, self.hi, self.lo
+
+
+def _last_of_runs(keys):
+    # Indices of the last element of each run of equal, sorted keys
+    return np.flatnonzero(np.append(keys[1:] != keys[:-1], True))
+
+
+def _grid(start, stop, step):
+    return range(-(-start // step) * step, stop + 1, step)
+
+
+class BalanceHistory:
+    def __init__(self, w3, tokens, db_path=HISTORY_DB_FILE, backfill_days=DEFAULT_BACKFILL_DAYS,
+                 confirmations=DEFAULT_CONFIRMATIONS, start_block=0, expire_days=DEFAULT_EXPIRE_DAYS):
+        """`tokens` maps a label (e.g. "stETH") to the contract whose `balanceOf` is sampled."""
+        self.w3 = w3
+        self.tokens = dict(tokens)
+        self.db_path = db_path
+        self.backfill_blocks = backfill_days * 86400 // BLOCK_TIME
+        self.confirmations = confirmations
+        self.start_block = start_block
+        self.expire_seconds = expire_days * 86400
+        self._local = threading.local()
+        self._tracked = {}  # holder -> when its last_seen was last written
+        self._tracked_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.last_error = None
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS holders (
+                holder TEXT PRIMARY KEY,
+                sampled_to INTEGER,
+                last_seen INTEGER
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS series (
+                holder TEXT NOT NULL,
+                token TEXT NOT NULL,
+                level INTEGER NOT NULL,
+                trimmed_before INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (holder, token, level)
+            ) WITHOUT ROWID;
+            """
+        )
+        # Files from before expiry: their holders count as unseen until tracked again
+        if "last_seen" not in {row[1] for row in conn.execute("PRAGMA table_info(holders)")}:
+            conn.execute("ALTER TABLE holders ADD COLUMN last_seen INTEGER")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            self._local.conn = conn
+        return conn
+
+    # --- TRACKING ---
+    def track(self, holder):
+        """Sample `holder`'s balances for the next `expire_days`; cheap to call on every rerun."""
+        now = int(time.time())
+        with self._tracked_lock:
+            if now - self._tracked.get(holder, -TOUCH_INTERVAL) < TOUCH_INTERVAL:
+                return
+            self._tracked[holder] = now
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT last_seen FROM holders WHERE holder = ?", (holder,)).fetchone()
+            conn.execute(
+                "INSERT INTO holders (holder, sampled_to, last_seen) VALUES (?, NULL, ?) "
+                "ON CONFLICT (holder) DO UPDATE SET last_seen = excluded.last_seen",
+                (holder, now),
+            )
+        if row is None or row[0] is None or now - row[0] >= self.expire_seconds:
+            # New or returning: backfill it now rather than at the next poll
+            self._wake.set()
+
+    def untrack(self, holder):
+        """Stop sampling `holder` until it is tracked again; its samples are kept."""
+        with self._tracked_lock:
+            self._tracked.pop(holder, None)
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE holders SET last_seen = NULL WHERE holder = ?", (holder,))
+
+    # --- SAMPLING ---
+    def _plan(self, start, target):
+        """Grid blocks in [start, target], coarser where the finer levels will have dropped them."""
+        tiers = []
+        newer_than = target + 1
+        for bucket, retention in LEVELS:
+            step = bucket // BLOCK_TIME or RAW_STEP
+            tier_start = start if retention is None else max(start, target - retention // BLOCK_TIME + 1)
+            tiers.append(_grid(tier_start, newer_than - 1, step))
+            newer_than = min(newer_than, tier_start)
+        return sorted(set().union(*tiers))
+
+    def _timestamps(self, blocks):
+        from web3.exceptions import Web3TypeError
+
+        timestamps = []
+        for start in range(0, len(blocks), HEADER_BATCH):
+            chunk = blocks[start:start + HEADER_BATCH]
+            try:
+                batch = self.w3.batch_requests()
+            except Web3TypeError:
+                timestamps.extend(self.w3.eth.get_block(block)["timestamp"] for block in chunk)
+                continue
+            with batch:
+                for block in chunk:
+                    batch.add(self.w3.eth.get_block(block))
+                timestamps.extend(header["timestamp"] for header in batch.execute())
+        return timestamps
+
+    def sync(self, max_blocks=HEADER_BATCH):
+        """Sample tracked wallets up to the confirmed head; returns the number of samples stored.
+
+        Works through the plan `max_blocks` grid blocks at a time, storing each
+        chunk before reading the next, so an interrupted backfill resumes where
+        it stopped.
+        """
+        target = self.w3.eth.block_number - self.confirmations
+        conn = self._conn()
+        backfill_from = max(self.start_block, target - self.backfill_blocks)
+        # Expired and untracked wallets are skipped; a returning one resumes no further back than a new one
+        starts = {
+            holder: max(sampled_to + 1, backfill_from) if sampled_to is not None else backfill_from
+            for holder, sampled_to in conn.execute(
+                "SELECT holder, sampled_to FROM holders WHERE last_seen >= ?", (int(time.time()) - self.expire_seconds,)
+            )
+        }
+        plan = {}
+        for holder, start in starts.items():
+            for block in self._plan(start, target):
+                plan.setdefault(block, []).append(holder)
+        blocks = sorted(plan)
+        stored = 0
+        for start in range(0, len(blocks), max_blocks):
+            if self._stop.is_set():
+                return stored
+            chunk = blocks[start:start + max_blocks]
+            timestamps = dict(zip(chunk, self._timestamps(chunk)))
+            # (block, calls, keys) per Multicall3 eth_call, sent BATCH_CALLS reads per JSON-RPC batch
+            requests = []
+            for block in chunk:
+                calls = [(contract, "balanceOf", [holder]) for holder in plan[block] for contract in self.tokens.values()]
+                keys = [(holder, label) for holder in plan[block] for label in self.tokens]
+                for offset in range(0, len(calls), MAX_CALLS):
+                    requests.append((block, calls[offset:offset + MAX_CALLS], keys[offset:offset + MAX_CALLS]))
+            samples = {}
+            while requests:
+                size = 0
+                for count, (_, calls, _) in enumerate(requests):
+                    size += len(calls)
+                    if size > BATCH_CALLS and count:
+                        break
+                else:
+                    count = len(requests)
+                batch, requests = requests[:count], requests[count:]
+                results = read_many_at(self.w3, [(block, calls) for block, calls, _ in batch])
+                for (block, _, keys), values in zip(batch, results):
+                    for key, value in zip(keys, values):
+                        if isinstance(value, Exception):
+                            # e.g. a node without archive state: skip the sample, keep going
+                            self.last_error = value
+                            continue
+                        series = samples.setdefault(key, ([], [], []))
+                        series[0].append(block)
+                        series[1].append(timestamps[block])
+                        series[2].append(value)
+            sampled_to = chunk[-1] if start + max_blocks < len(blocks) else target
+            stored += self._store(samples, [holder for holder, first in starts.items() if first <= sampled_to], sampled_to)
+        if not blocks:
+            self._store({}, list(starts), target)
+        return stored
+
+    def _store(self, samples, holders, sampled_to):
+        conn = self._conn()
+        with conn:
+            for (holder, label), (blocks, timestamps, amounts) in samples.items():
+                new = Series.from_samples(blocks, timestamps, amounts)
+                for bucket, retention in LEVELS:
+                    series, trimmed_before = self._load(holder, label, bucket)
+                    series = series.merge(new).rollup(bucket)
+                    if retention is not None:
+                        cutoff = int(series.timestamps[-1]) - retention
+                        if series.timestamps[0] < cutoff:
+                            series = series.since(cutoff)
+                            trimmed_before = max(trimmed_before, cutoff)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO series (holder, token, level, trimmed_before, data) VALUES (?, ?, ?, ?, ?)",
+                        (holder, label, bucket, trimmed_before, series.to_bytes()),
+                    )
+            conn.executemany(
+                "UPDATE holders SET sampled_to = ? WHERE holder = ? AND (sampled_to IS NULL OR sampled_to < ?)",
+                [(sampled_to, holder, sampled_to) for holder in holders],
+            )
+        return sum(len(blocks) for blocks, _, _ in samples.values())
+
+    # --- BACKGROUND ---
+    def start(self, poll_interval=60.0):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                # Cleared first: sync records failed reads here without raising
+                self.last_error = None
+                try:
+                    self.sync()
+                except Exception as e:
+                    self.last_error = e
+                self._wake.wait(poll_interval)
+                self._wake.clear()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="balance-history", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    # --- QUERIES ---
+    def _load(self, holder, label, bucket):
+        row = self._conn().execute(
+            "SELECT data, trimmed_before FROM series WHERE holder = ? AND token = ? AND level = ?", (holder, label, bucket)
+        ).fetchone()
+        if row is None:
+            return Series.empty(), 0
+        return Series.from_bytes(row[0]), row[1]
+
+    def series(self, holder, label, since=None, max_points=DEFAULT_MAX_POINTS):
+        """`(bucket seconds, Series)` from the finest level that still covers `since` in at most `max_points` points.
+
+        `since` is a unix timestamp; None means everything kept. Falls back to
+        the daily level, whatever its size.
+        """
+        for bucket, _ in LEVELS:
+            series, trimmed_before = self._load(holder, label, bucket)
+            if trimmed_before > (since or 0):
+                continue
+            if since is not None:
+                series = series.since(since)
+            if len(series) <= max_points or bucket == LEVELS[-1][0]:
+                return bucket, series
+        return LEVELS[-1][0], Series.empty()
+
+    def chart(self, holder, since=None, max_points=DEFAULT_MAX_POINTS):
+        """`(bucket seconds, rows)` for `st.line_chart(rows, x="Time", y="Balance", color="Token")`.
+
+        Each token is read at the finest level that fits; `bucket` is the
+        coarsest of them (0 for raw samples).
+        """
+        rows = []
+        coarsest = 0
+        for label in self.tokens:
+            bucket, series = self.series(holder, label, since, max_points)
+            coarsest = max(coarsest, bucket)
+            for timestamp, balance in zip(series.timestamps.tolist(), series.tokens().tolist()):
+                rows.append({"Time": datetime.fromtimestamp(timestamp, timezone.utc), "Token": label, "Balance": balance})
+        return coarsest, rows
@@ -0,0 +1,123 @@
+"""Batched view-call reads through Multicall3.
+
+Every `(contract, function, args)` triple handed to `read_many` goes out in a
+single `aggregate3` eth_call. Sub-calls that revert are retried one by one so
+a single bad item never hides the rest of the batch. `read_many_at` does the
+same at several historical blocks, with all their eth_calls in one JSON-RPC
+batch.
+"""
+from web3 import Web3
+from web3._utils.abi import map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+
+from contracts import output_types
+
+# Multicall3 is deployed at the same address on mainnet, Sepolia and most testnets
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]"
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]"
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function"
+    }
+]
+
+
+def read_many(w3, calls, multicall_address=MULTICALL3_ADDRESS, block_identifier="latest"):
+    """Run `calls` as one eth_call and return their results in order.
+
+    `calls` is a list of `(contract, function_name, args)`. An item that still
+    fails after its individual retry is returned as the raised exception, so
+    callers can report each read on its own.
+    """
+    if not calls:
+        return []
+    fns = [getattr(contract.functions, fn_name)(*args) for contract, fn_name, args in calls]
+    multicall = w3.eth.contract(address=Web3.to_checksum_address(multicall_address), abi=MULTICALL3_ABI)
+    try:
+        results = multicall.functions.aggregate3(
+            [(fn.address, True, fn._encode_transaction_data()) for fn in fns]
+        ).call(block_identifier=block_identifier)
+    except Exception:
+        # No Multicall3 on this chain, or the node rejected the batch
+        return [_call_one(fn, block_identifier) for fn in fns]
+    return _decode_results(w3, fns, results, block_identifier)
+
+
+def read_many_at(w3, requests, multicall_address=MULTICALL3_ADDRESS):
+    """`read_many` for each `(block_identifier, calls)` in `requests`; returns their value lists in order.
+
+    The aggregate3 eth_calls of all requests go out in one JSON-RPC batch. A
+    batch fails as a whole if any call in it errors (e.g. the node has no state
+    for one of the blocks), and then each request falls back to its own
+    `read_many`.
+    """
+    if not requests:
+        return []
+    multicall = w3.eth.contract(address=Web3.to_checksum_address(multicall_address), abi=MULTICALL3_ABI)
+    fns = [[getattr(contract.functions, fn_name)(*args) for contract, fn_name, args in calls] for _, calls in requests]
+    try:
+        with w3.batch_requests() as batch:
+            for (block_identifier, _), request_fns in zip(requests, fns):
+                batch.add(multicall.functions.aggregate3(
+                    [(fn.address, True, fn._encode_transaction_data()) for fn in request_fns]
+                ).call(block_identifier=block_identifier))
+            responses = batch.execute()
+    except Exception:
+        # No batching on this provider, or one of the calls failed
+        return [read_many(w3, calls, multicall_address, block_identifier) for block_identifier, calls in requests]
+    return [
+        _decode_results(w3, request_fns, results, block_identifier)
+        for (block_identifier, _), request_fns, results in zip(requests, fns, responses)
+    ]
+
+
+def _decode_results(w3, fns, results, block_identifier):
+    values = []
+    for fn, (success, return_data) in zip(fns, results):
+        if success:
+            try:
+                values.append(decode_return_data(w3, fn, return_data))
+                continue
+            except Exception:
+                pass
+        values.append(_call_one(fn, block_identifier))
+    return values
+
+
+def decode_return_data(w3, fn, return_data):
+    types = output_types(fn.abi)
+    decoded = w3.codec.decode(types, return_data)
+    decoded = map_abi_data(BASE_RETURN_NORMALIZERS, types, decoded)
+    return decoded[0] if len(decoded) == 1 else list(decoded)
+
+
+def _call_one(fn, block_identifier):
+    try:
+        return fn.call(block_identifier=block_identifier)
+    except Exception as e:
+        return e
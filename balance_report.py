@@ -0,0 +1,80 @@
+"""Balance report over every wallet in the wallet DB.
+
+Addresses are read in chunks; each chunk is one Multicall3 eth_call covering
+both the stETH wallet balance and the Simpleth balance of every address in it.
+Chunks run concurrently on an `AsyncReadEngine`, whose semaphore bounds how many
+are in flight. All reads are pinned to the block the report started at.
+
+`BalanceReport.cursor` is the number of (sorted) addresses already fetched, so
+a report that stops part way, on an RPC error or a closed browser tab, resumes
+from there on the next `run`.
+"""
+DEFAULT_CHUNK_SIZE = 250
+
+
+class BalanceReport:
+    def __init__(self, addresses, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.addresses = sorted(addresses)
+        self.chunk_size = chunk_size
+        self.rows = []
+        self.cursor = 0
+        self.block = None
+
+    @property
+    def total(self):
+        return len(self.addresses)
+
+    @property
+    def done(self):
+        return self.cursor >= self.total
+
+    def run(self, engine, steth_contract, simpleth_contract, max_chunks=None, progress=None):
+        """Fetch the remaining chunks; `progress(done, total)` runs after each one.
+
+        The contracts must come from `engine.contract`. `progress` is called on
+        the caller's thread, so it may update Streamlit widgets.
+        """
+        if self.block is None:
+            self.block = engine.run(engine.w3.eth.get_block_number())
+        starts = list(range(self.cursor, self.total, self.chunk_size))
+        if max_chunks is not None:
+            starts = starts[:max_chunks]
+
+        async def fetch(start):
+            chunk = self.addresses[start:start + self.chunk_size]
+            calls = []
+            for address in chunk:
+                calls.append((steth_contract, "balanceOf", [address]))
+                calls.append((simpleth_contract, "balanceOf", [address]))
+            return chunk, await engine.read_many(calls, block_identifier=self.block)
+
+        futures = [engine.submit(fetch(start)) for start in starts]
+        try:
+            # Collect in submission order so the cursor only ever covers a
+            # contiguous prefix of the address list
+            for future in futures:
+                chunk, values = future.result()
+                for i, address in enumerate(chunk):
+                    self.rows.append({
+                        "address": address,
+                        "steth_wallet": _wei_or_none(values[2 * i]),
+                        "steth_simpleth": _wei_or_none(values[2 * i + 1]),
+                    })
+                self.cursor += len(chunk)
+                if progress is not None:
+                    progress(self.cursor, self.total)
+        finally:
+            for future in futures:
+                future.cancel()
+        return self.rows
+
+    def page(self, page, page_size=50):
+        start = page * page_size
+        return self.rows[start:start + page_size]
+
+    def page_count(self, page_size=50):
+        return max(1, -(-len(self.rows) // page_size))
+
+
+def _wei_or_none(value):
+    return None if isinstance(value, Exception) else value
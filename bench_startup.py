@@ -0,0 +1,80 @@
+"""Import-time budget check for the Streamlit apps.
+
+For each app, runs the app's top-level imports in a fresh interpreter under
+`python -X importtime`, after `import streamlit` so Streamlit's own cost is not
+counted, and prints the slowest modules. Exits with status 1 when an app's
+imports take longer than STARTUP_BUDGET_MS or pull in one of DEFERRED_MODULES,
+which should only be loaded on the first chain operation.
+
+    python bench_startup.py                  # all apps
+    python bench_startup.py simpleth.py -n 5 # one app, best of 5 runs
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+APPS = ["simpleth.py", "simplethAU.py", "simpleth_user.py", "Kinetix_Give.py"]
+STARTUP_BUDGET_MS = 100
+DEFERRED_MODULES = ("web3", "eth_account", "eth_abi", "eth_utils", "aiohttp")
+MARKER = "--- app imports ---"
+
+
+def top_level_imports(path):
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def measure(path):
+    """Return `(total_us, [(cumulative_us, module), ...])` for one cold import run."""
+    code = "\n".join(["import streamlit", f"import sys; sys.stderr.write({MARKER!r} + '\\n')"] + top_level_imports(path))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(path)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{path}: imports failed\n{result.stderr}")
+    lines = result.stderr.split(MARKER + "\n", 1)[1].splitlines()
+    modules = []
+    total = 0
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        cumulative = int(cumulative)
+        modules.append((cumulative, name.rstrip()))
+        if not name.startswith("  "):  # only top-level imports add to the total
+            total += cumulative
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("apps", nargs="*", default=APPS)
+    parser.add_argument("-n", "--runs", type=int, default=3, help="take the best of N runs")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=8, help="number of slowest modules to show")
+    args = parser.parse_args()
+
+    failed = False
+    for app in args.apps:
+        total, modules = min((measure(app) for _ in range(args.runs)), key=lambda run: run[0])
+        names = {name.strip() for _, name in modules}
+        deferred = sorted(name for name in names if name.split(".")[0] in DEFERRED_MODULES)
+        over = total / 1000 > args.budget_ms
+        status = "FAIL" if over or deferred else "ok"
+        failed = failed or status == "FAIL"
+        print(f"{app}: {total / 1000:.1f} ms (budget {args.budget_ms:.0f} ms) {status}")
+        for cumulative, name in sorted(modules, reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name.strip()}")
+        if deferred:
+            print(f"  imported at startup but should be deferred: {', '.join(deferred[:5])}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
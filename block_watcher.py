@@ -0,0 +1,111 @@
+"""New-block watcher that pushes fresh balances into logged-in sessions.
+
+One `BlockWatcher` per process follows the chain head, over a WebSocket
+`newHeads` subscription when `ws_url` is set and by polling `eth_blockNumber`
+otherwise (or while the socket is down). On every new block it re-reads the
+balances of the wallets that sessions are currently watching, all through the
+shared `BalanceCache` in one Multicall3 read, and writes them into each
+session's state dict. The dashboards then only have to re-render that dict.
+
+Sessions re-register with `watch` on every render; a session that has not done
+so for `ttl` seconds (closed tab, idle browser) is dropped, so idle sessions
+cost no RPC at all, and with no watchers left the poller stops asking for
+block numbers too.
+"""
+import asyncio
+import threading
+import time
+
+DEFAULT_POLL_INTERVAL = 4.0
+DEFAULT_TTL = 120.0
+RECONNECT_INTERVAL = 60.0
+
+
+class BlockWatcher:
+    def __init__(self, balance_cache, ws_url=None, poll_interval=DEFAULT_POLL_INTERVAL, ttl=DEFAULT_TTL):
+        self.balance_cache = balance_cache
+        self.ws_url = ws_url
+        self.poll_interval = poll_interval
+        self.ttl = ttl
+        self.head = None
+        self.mode = None
+        self.last_error = None
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, key, holder, contracts, state):
+        """Keep `state` (a dict) updated with `holder`'s balances on every new block."""
+        with self._lock:
+            self._subscriptions[key] = {
+                "holder": holder,
+                "contracts": list(contracts),
+                "state": state,
+                "seen": time.monotonic(),
+            }
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="block-watcher", daemon=True)
+                self._thread.start()
+
+    def unwatch(self, key):
+        with self._lock:
+            self._subscriptions.pop(key, None)
+
+    def _active(self):
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            for key in [key for key, sub in self._subscriptions.items() if sub["seen"] < cutoff]:
+                del self._subscriptions[key]
+            return list(self._subscriptions.values())
+
+    def on_head(self, head):
+        if self.head is not None and head <= self.head:
+            return
+        self.head = head
+        self.balance_cache.observe_head(head)
+        groups = {}
+        for sub in self._active():
+            group = groups.setdefault(tuple(c.address for c in sub["contracts"]), (sub["contracts"], []))
+            group[1].append(sub)
+        for contracts, subs in groups.values():
+            try:
+                balances = self.balance_cache.get_many(contracts, list({sub["holder"] for sub in subs}))
+            except Exception as e:
+                self.last_error = e
+                continue
+            for sub in subs:
+                sub["state"].update(holder=sub["holder"], balances=balances[sub["holder"]], block=head)
+
+    # --- HEAD SOURCES ---
+    def _run(self):
+        while True:
+            if self.ws_url:
+                self.mode = "websocket"
+                try:
+                    asyncio.run(self._subscribe())
+                except Exception as e:
+                    self.last_error = e
+                # Socket dropped: poll for a while, then try to resubscribe
+                self.mode = "polling"
+                self._poll(RECONNECT_INTERVAL)
+            else:
+                self.mode = "polling"
+                self._poll(None)
+
+    async def _subscribe(self):
+        from web3 import AsyncWeb3, WebSocketProvider
+
+        async with AsyncWeb3(WebSocketProvider(self.ws_url)) as w3:
+            await w3.eth.subscribe("newHeads")
+            async for message in w3.socket.process_subscriptions():
+                self.on_head(message["result"]["number"])
+
+    def _poll(self, duration):
+        end = None if duration is None else time.monotonic() + duration
+        while end is None or time.monotonic() < end:
+            if self._active():
+                try:
+                    self.on_head(self.balance_cache.w3.eth.block_number)
+                except Exception as e:
+                    self.last_error = e
+            time.sleep(self.poll_interval)
@@ -0,0 +1,258 @@
+"""Shared contract ABIs and prebuilt contract objects.
+
+Every app imports its ABIs from here and gets contract objects through
+`get_contract`, which builds each `(w3, address, abi)` contract once per process
+instead of re-parsing the ABI and re-checksumming the address on every rerun.
+Return-value decoders for every function in these ABIs are prepared once, on
+first use; see `output_types`.
+
+Importing this module is cheap: web3 is only imported when the first contract
+is built, so the apps can render before paying for it.
+"""
+import threading
+
+# --- ABIs ---
+# stETH/mockStETH
+STETH_ABI = [
+    {
+        "inputs": [{"internalType": "address", "name": "account", "type": "address"}],
+        "name": "balanceOf",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "recipient", "type": "address"},
+            {"internalType": "uint256", "name": "amount", "type": "uint256"}
+        ],
+        "name": "transfer",
+        "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "sender", "type": "address"},
+            {"internalType": "address", "name": "recipient", "type": "address"},
+            {"internalType": "uint256", "name": "amount", "type": "uint256"}
+        ],
+        "name": "transferFrom",
+        "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    }
+]
+
+# Simpleth exposes the same interface
+SIMPLETH_ABI = STETH_ABI
+
+KINETIX_VAULT_ABI = [
+    {
+        "inputs": [],
+        "name": "beneficiary",
+        "outputs": [{"internalType": "address", "name": "", "type": "address"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [{"internalType": "address", "name": "donor", "type": "address"}],
+        "name": "principalOf",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [],
+        "name": "vaultBalance",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [],
+        "name": "stakingRewards",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [{"internalType": "uint256", "name": "amount", "type": "uint256"}],
+        "name": "deposit",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    },
+    {
+        "inputs": [{"internalType": "uint256", "name": "amount", "type": "uint256"}],
+        "name": "withdraw",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    },
+    {
+        "inputs": [],
+        "name": "donateRewards",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    },
+    {
+        "inputs": [{"internalType": "address", "name": "account", "type": "address"}],
+        "name": "balanceOf",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    }
+]
+
+ERC20_ABI = [
+    {
+        "constant": True,
+        "inputs": [{"name": "_owner", "type": "address"}],
+        "name": "balanceOf",
+        "outputs": [{"name": "balance", "type": "uint256"}],
+        "type": "function"
+    },
+    {
+        "constant": False,
+        "inputs": [
+            {"name": "_spender", "type": "address"},
+            {"name": "_value", "type": "uint256"}
+        ],
+        "name": "approve",
+        "outputs": [{"name": "success", "type": "bool"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "decimals",
+        "outputs": [{"name": "", "type": "uint8"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [
+            {"name": "_owner", "type": "address"},
+            {"name": "_spender", "type": "address"}
+        ],
+        "name": "allowance",
+        "outputs": [{"name": "remaining", "type": "uint256"}],
+        "type": "function"
+    }
+]
+
+# Disperse-style batch transfer: pulls the total with transferFrom, so approve it first
+BATCH_TRANSFER_ABI = [
+    {
+        "inputs": [
+            {"internalType": "contract IERC20", "name": "token", "type": "address"},
+            {"internalType": "address[]", "name": "recipients", "type": "address[]"},
+            {"internalType": "uint256[]", "name": "values", "type": "uint256[]"}
+        ],
+        "name": "disperseToken",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    }
+]
+
+
+# --- EVENTS ---
+TRANSFER_EVENT_ABI = {
+    "anonymous": False,
+    "inputs": [
+        {"indexed": True, "internalType": "address", "name": "from", "type": "address"},
+        {"indexed": True, "internalType": "address", "name": "to", "type": "address"},
+        {"indexed": False, "internalType": "uint256", "name": "value", "type": "uint256"}
+    ],
+    "name": "Transfer",
+    "type": "event"
+}
+
+# <-- Match these to the events emitted by your deployed KinetixVault
+KINETIX_VAULT_EVENT_ABIS = [
+    TRANSFER_EVENT_ABI,
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "address", "name": "donor", "type": "address"},
+            {"indexed": False, "internalType": "uint256", "name": "amount", "type": "uint256"}
+        ],
+        "name": "Deposited",
+        "type": "event"
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "address", "name": "donor", "type": "address"},
+            {"indexed": False, "internalType": "uint256", "name": "amount", "type": "uint256"}
+        ],
+        "name": "Withdrawn",
+        "type": "event"
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "internalType": "address", "name": "beneficiary", "type": "address"},
+            {"indexed": False, "internalType": "uint256", "name": "amount", "type": "uint256"}
+        ],
+        "name": "RewardsDonated",
+        "type": "event"
+    }
+]
+
+
+# --- DECODERS ---
+_output_types = None
+
+
+def output_types(fn_abi):
+    """ABI output types for a function; precomputed for the ABIs in this module."""
+    global _output_types
+    from eth_utils import get_abi_output_types
+    if _output_types is None:
+        _output_types = {
+            id(item): get_abi_output_types(item)
+            for abi in (STETH_ABI, KINETIX_VAULT_ABI, ERC20_ABI)
+            for item in abi
+            if item["type"] == "function"
+        }
+    types = _output_types.get(id(fn_abi))
+    return types if types is not None else get_abi_output_types(fn_abi)
+
+
+_selector_names = None
+
+
+def function_name(selector):
+    """Name of the registry function with this 4-byte selector (`"0x70a08231"` -> `"balanceOf"`)."""
+    global _selector_names
+    if _selector_names is None:
+        from eth_utils import function_abi_to_4byte_selector
+        from balance_reader import MULTICALL3_ABI
+        _selector_names = {
+            "0x" + function_abi_to_4byte_selector(item).hex(): item["name"]
+            for abi in (STETH_ABI, KINETIX_VAULT_ABI, ERC20_ABI, BATCH_TRANSFER_ABI, MULTICALL3_ABI)
+            for item in abi
+            if item["type"] == "function"
+        }
+    return _selector_names.get(selector.lower())
+
+
+# --- CONTRACTS ---
+_contracts = {}
+_contracts_lock = threading.Lock()
+
+
+def get_contract(w3, address, abi):
+    # Keyed on identity: the cached contract holds `w3`, so its id stays unique
+    key = (id(w3), address, id(abi))
+    contract = _contracts.get(key)
+    if contract is None:
+        from web3 import Web3
+        contract = w3.eth.contract(address=Web3.to_checksum_address(address), abi=abi)
+        with _contracts_lock:
+            contract = _contracts.setdefault(key, contract)
+    return contract
@@ -0,0 +1,208 @@
+"""Vault-wide donor analytics on NumPy arrays.
+
+`load_snapshot` reads every donor's `principalOf` and receipt-token
+`balanceOf` (plus the vault's `stakingRewards` and `vaultBalance`) in
+Multicall3 chunks on an `AsyncReadEngine`, all pinned to one block, and
+`DonorSnapshot` answers the analytics views from arrays:
+
+- exact wei amounts are object arrays of Python ints, since uint256 does not
+  fit a NumPy integer; totals and reward attribution stay exact integer
+  arithmetic, done element-wise by NumPy;
+- ordering uses each amount's high and low 64-bit words (`np.lexsort`), which
+  is exact for anything below 2**128 wei;
+- float64 token amounts are derived once, for histograms and charts only.
+
+`DonorAnalytics` holds the latest snapshot for every session and reloads it at
+most every `max_age` seconds, so reruns render from memory instead of reading
+each donor again. A failed load is kept for `retry_after` seconds and raised
+again from memory, so an unreachable node is not asked on every rerun either.
+"""
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 250
+DEFAULT_MAX_AGE = 60.0
+DEFAULT_RETRY_AFTER = 60.0
+MASK64 = (1 << 64) - 1
+AMOUNTS = ("principal", "receipts")
+
+
+class DonorSnapshot:
+    def __init__(self, block, donors, principal, receipts, rewards, vault_balance, decimals):
+        self.block = block
+        self.donors = np.array(donors, dtype=object)
+        self.failed = np.array([isinstance(v, Exception) or isinstance(r, Exception) for v, r in zip(principal, receipts)], dtype=bool)
+        self.principal = np.array([0 if isinstance(v, Exception) else v for v in principal], dtype=object)
+        self.receipts = np.array([0 if isinstance(v, Exception) else v for v in receipts], dtype=object)
+        self.rewards = rewards
+        self.vault_balance = vault_balance
+        self.decimals = decimals
+        self.loaded_at = time.time()
+        self._words = {}
+        self._tokens = {}
+
+    def __len__(self):
+        return len(self.donors)
+
+    def amounts(self, by):
+        if by not in AMOUNTS:
+            raise ValueError(f"Unknown amount: {by}")
+        return getattr(self, by)
+
+    def words(self, by):
+        """`(hi, lo)` uint64 words of each amount; raises OverflowError at 2**128 wei or more."""
+        if by not in self._words:
+            values = self.amounts(by)
+            self._words[by] = ((values >> 64).astype(np.uint64), (values & MASK64).astype(np.uint64))
+        return self._words[by]
+
+    def tokens(self, by):
+        """Amounts in whole tokens as float64: for display and binning, not for sums."""
+        if by not in self._tokens:
+            hi, lo = self.words(by)
+            self._tokens[by] = (hi.astype(np.float64) * 2.0**64 + lo.astype(np.float64)) / 10.0**self.decimals
+        return self._tokens[by]
+
+    def total(self, by):
+        """Exact wei total."""
+        return int(self.amounts(by).sum()) if len(self) else 0
+
+    def order(self, by):
+        """Donor indices from largest to smallest amount, exactly."""
+        hi, lo = self.words(by)
+        return np.lexsort((lo, hi))[::-1]
+
+    def leaderboard(self, by="principal", top=20):
+        """The `top` donors by `by`, as `(address, principal wei, receipts wei, share of total)` rows."""
+        total = self.total(by)
+        rows = []
+        for i in self.order(by)[:top]:
+            amount = self.amounts(by)[i]
+            rows.append({
+                "address": self.donors[i],
+                "principal": int(self.principal[i]),
+                "receipts": int(self.receipts[i]),
+                "share": amount / total if total else 0.0,
+            })
+        return rows
+
+    def histogram(self, by="principal", bins=20, log=True):
+        """Donor counts per amount bin, over donors holding more than zero; returns `(counts, edges)` in tokens."""
+        values = self.tokens(by)
+        values = values[values > 0]
+        if not len(values):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        if log and values.min() < values.max():
+            edges = np.geomspace(values.min(), values.max(), bins + 1)
+        else:
+            edges = bins
+        return np.histogram(values, bins=edges)
+
+    def attribute(self, amount, by="principal"):
+        """Split `amount` wei pro rata to each donor's `by`, exactly: the parts sum to `amount`.
+
+        Each donor gets the floor of their share; the wei left over go one each
+        to the largest remainders.
+        """
+        basis = self.amounts(by)
+        total = self.total(by)
+        if not total:
+            return np.zeros(len(self), dtype=object)
+        scaled = basis * amount
+        parts = scaled // total
+        left_over = amount - int(parts.sum())
+        if left_over:
+            remainders = scaled - parts * total
+            parts[np.argsort(remainders, kind="stable")[::-1][:left_over]] += 1
+        return parts
+
+    def project(self, apr, days, by="principal"):
+        """Rewards each donor's `by` would earn over `days` at `apr` (a fraction, 0.03 for 3%), in wei.
+
+        The rate is applied in parts per billion so the projection stays integer.
+        """
+        rate_ppb = round(apr * 10**9)
+        return self.amounts(by) * rate_ppb * days // (365 * 10**9)
+
+
+def load_snapshot(engine, vault, steth, donors, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Read every donor's principal and receipt balance at the current block.
+
+    `vault` and `steth` must come from `engine.contract`. Chunks of
+    `chunk_size` donors go out concurrently, one Multicall3 eth_call each;
+    `progress(done, total)` runs on the caller's thread after each chunk.
+    """
+    donors = sorted(set(donors))
+    block = engine.run(engine.w3.eth.get_block_number())
+    header = engine.run(engine.read_many(
+        [(steth, "decimals", []), (vault, "stakingRewards", []), (vault, "vaultBalance", [])],
+        block_identifier=block,
+    ))
+    for value in header:
+        if isinstance(value, Exception):
+            raise value
+    decimals, rewards, vault_balance = header
+
+    async def fetch(chunk):
+        calls = []
+        for donor in chunk:
+            calls.append((vault, "principalOf", [donor]))
+            calls.append((vault, "balanceOf", [donor]))
+        return await engine.read_many(calls, block_identifier=block)
+
+    futures = [engine.submit(fetch(donors[start:start + chunk_size])) for start in range(0, len(donors), chunk_size)]
+    values = []
+    try:
+        for future in futures:
+            values.extend(future.result())
+            if progress is not None:
+                progress(len(values) // 2, len(donors))
+    finally:
+        for future in futures:
+            future.cancel()
+    return DonorSnapshot(block, donors, values[0::2], values[1::2], rewards, vault_balance, decimals)
+
+
+class DonorAnalytics:
+    def __init__(self, engine, vault, steth, donors, max_age=DEFAULT_MAX_AGE, chunk_size=DEFAULT_CHUNK_SIZE,
+                 retry_after=DEFAULT_RETRY_AFTER):
+        """`donors` is a callable returning the addresses to include, e.g. the indexer's depositors."""
+        self.engine = engine
+        self.vault = vault
+        self.steth = steth
+        self.donors = donors
+        self.max_age = max_age
+        self.chunk_size = chunk_size
+        self.retry_after = retry_after
+        self._snapshot = None
+        self._failure = None  # (exception, failed at)
+        self._lock = threading.Lock()
+
+    def snapshot(self, refresh=False, progress=None):
+        """The latest snapshot, reloaded if it is older than `max_age` seconds or `refresh` is set.
+
+        Within `retry_after` seconds of a failed load, raises that failure
+        again instead of reloading, unless `refresh` is set.
+        """
+        snapshot, failure = self._snapshot, self._failure
+        if snapshot is not None and not refresh and time.time() - snapshot.loaded_at < self.max_age:
+            return snapshot
+        if failure is not None and not refresh and time.time() - failure[1] < self.retry_after:
+            raise failure[0]
+        # One session reloads; the others wait and then use its snapshot, or its failure
+        with self._lock:
+            if self._snapshot is not snapshot and self._snapshot is not None:
+                return self._snapshot
+            if self._failure is not failure and self._failure is not None:
+                raise self._failure[0]
+            try:
+                self._snapshot = load_snapshot(
+                    self.engine, self.vault, self.steth, self.donors(), chunk_size=self.chunk_size, progress=progress
+                )
+            except Exception as e:
+                self._failure = (e, time.time())
+                raise
+            self._failure = None
+            return self._snapshot
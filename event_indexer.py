@@ -0,0 +1,260 @@
+"""Incremental event-log indexer backed by SQLite.
+
+`EventIndexer` pulls logs for a set of contracts into a local SQLite file so the
+dashboards can show history and totals without scanning the chain:
+
+- all contracts are fetched together with one `eth_getLogs` per block range;
+  the range grows while the node keeps up and is halved whenever it answers
+  "too many results" (or any other block-range error). A rate-limit error
+  retries the same range after a pause that doubles each time;
+- each range is stored in the same transaction as the checkpoint that covers
+  it, so a restart resumes exactly where the last run stopped;
+- only blocks at least `confirmations` deep are indexed, and the checkpoint's
+  block hash is re-checked on every pass: if the chain reorganised below it,
+  the index rewinds by `confirmations` blocks and re-fetches.
+
+Amounts are stored as decimal strings because uint256 does not fit in SQLite's
+INTEGER.
+"""
+import json
+import sqlite3
+import threading
+
+from eth_utils import event_abi_to_log_topic, to_hex
+from web3 import Web3
+from web3._utils.events import get_event_data
+
+EVENTS_DB_FILE = "events.sqlite3"
+DEFAULT_CONFIRMATIONS = 12
+DEFAULT_CHUNK_SIZE = 2000
+MIN_CHUNK_SIZE = 1
+MAX_CHUNK_SIZE = 50000
+
+RATE_LIMIT_BACKOFF = 1.0  # seconds before retrying a rate-limited range, doubled each time
+MAX_RATE_LIMIT_RETRIES = 5
+
+# Substrings of node errors that mean "ask for a smaller block range"
+RANGE_ERROR_HINTS = (
+    "block range", "range is too", "range too", "max range", "limited to a", "returned more than",
+    "too many results", "response size",
+)
+# ...and "slow down"; checked first, since some nodes reuse -32005 for both
+RATE_LIMIT_HINTS = ("rate limit", "too many requests", "request count exceeded", "429", "-32029", "capacity")
+
+
+class EventIndexer:
+    def __init__(self, w3, sources, name, start_block=0, db_path=EVENTS_DB_FILE,
+                 confirmations=DEFAULT_CONFIRMATIONS, chunk_size=DEFAULT_CHUNK_SIZE):
+        """`sources` maps a contract address to the list of event ABIs to index for it."""
+        self.w3 = w3
+        self.name = name
+        self.start_block = start_block
+        self.db_path = db_path
+        self.confirmations = confirmations
+        self.chunk_size = chunk_size
+        self.addresses = [Web3.to_checksum_address(address) for address in sources]
+        # topic0 -> event ABI, per contract
+        self.events = {
+            (Web3.to_checksum_address(address), to_hex(event_abi_to_log_topic(abi))): abi
+            for address, abis in sources.items()
+            for abi in abis
+        }
+        self.topics = sorted({topic for _, topic in self.events})
+        self._local = threading.local()
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_error = None
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS logs (
+                tx_hash TEXT NOT NULL,
+                log_index INTEGER NOT NULL,
+                block_number INTEGER NOT NULL,
+                contract TEXT NOT NULL,
+                event TEXT NOT NULL,
+                account TEXT,
+                counterparty TEXT,
+                amount TEXT,
+                args TEXT NOT NULL,
+                PRIMARY KEY (tx_hash, log_index)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS logs_account ON logs (account, contract, event);
+            CREATE INDEX IF NOT EXISTS logs_counterparty ON logs (counterparty, contract, event);
+            CREATE INDEX IF NOT EXISTS logs_block ON logs (block_number);
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                name TEXT PRIMARY KEY,
+                block_number INTEGER NOT NULL,
+                block_hash TEXT NOT NULL
+            );
+            """
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            self._local.conn = conn
+        return conn
+
+    # --- CHECKPOINT ---
+    def checkpoint(self):
+        row = self._conn().execute(
+            "SELECT block_number, block_hash FROM checkpoints WHERE name = ?", (self.name,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (self.start_block - 1, None)
+
+    def _check_reorg(self):
+        block_number, block_hash = self.checkpoint()
+        if block_hash is None:
+            return
+        if to_hex(self.w3.eth.get_block(block_number)["hash"]) == block_hash:
+            return
+        # The checkpoint block is no longer canonical: drop everything after a safe point
+        rewind_to = max(self.start_block - 1, block_number - self.confirmations)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                f"DELETE FROM logs WHERE block_number > ? AND contract IN ({','.join('?' * len(self.addresses))})",
+                (rewind_to, *self.addresses),
+            )
+            if rewind_to < self.start_block:
+                conn.execute("DELETE FROM checkpoints WHERE name = ?", (self.name,))
+            else:
+                rewind_hash = to_hex(self.w3.eth.get_block(rewind_to)["hash"])
+                conn.execute(
+                    "UPDATE checkpoints SET block_number = ?, block_hash = ? WHERE name = ?",
+                    (rewind_to, rewind_hash, self.name),
+                )
+
+    # --- SYNC ---
+    def sync(self, max_ranges=None):
+        """Index confirmed blocks past the checkpoint; returns the new checkpoint block."""
+        self._check_reorg()
+        target = self.w3.eth.block_number - self.confirmations
+        from_block = self.checkpoint()[0] + 1
+        ranges = 0
+        rate_limited = 0
+        while from_block <= target and not self._stop.is_set():
+            if max_ranges is not None and ranges >= max_ranges:
+                break
+            to_block = min(target, from_block + self.chunk_size - 1)
+            try:
+                logs = self.w3.eth.get_logs({
+                    "address": self.addresses,
+                    "fromBlock": from_block,
+                    "toBlock": to_block,
+                    "topics": [self.topics],
+                })
+            except Exception as e:
+                message = str(e).lower()
+                if any(hint in message for hint in RATE_LIMIT_HINTS):
+                    if rate_limited >= MAX_RATE_LIMIT_RETRIES:
+                        raise
+                    # The node is busy, not refusing the range: same range, after a pause
+                    self._stop.wait(RATE_LIMIT_BACKOFF * 2 ** rate_limited)
+                    rate_limited += 1
+                    continue
+                if self.chunk_size > MIN_CHUNK_SIZE and any(hint in message for hint in RANGE_ERROR_HINTS):
+                    self.chunk_size = max(MIN_CHUNK_SIZE, self.chunk_size // 2)
+                    continue
+                raise
+            rate_limited = 0
+            self._store(logs, to_block)
+            ranges += 1
+            from_block = to_block + 1
+            self.chunk_size = min(MAX_CHUNK_SIZE, self.chunk_size + self.chunk_size // 4 + 1)
+        return self.checkpoint()[0]
+
+    def _store(self, logs, to_block):
+        rows = []
+        for log in logs:
+            address = Web3.to_checksum_address(log["address"])
+            abi = self.events.get((address, to_hex(log["topics"][0])))
+            if abi is None:
+                continue
+            event = get_event_data(self.w3.codec, abi, log)
+            args = dict(event["args"])
+            addresses = [value for value in args.values() if isinstance(value, str) and Web3.is_address(value)]
+            amounts = [value for value in args.values() if isinstance(value, int)]
+            rows.append((
+                to_hex(log["transactionHash"]),
+                log["logIndex"],
+                log["blockNumber"],
+                address,
+                abi["name"],
+                addresses[0] if addresses else None,
+                addresses[1] if len(addresses) > 1 else None,
+                str(amounts[0]) if amounts else None,
+                json.dumps(args, default=str),
+            ))
+        block_hash = to_hex(self.w3.eth.get_block(to_block)["hash"])
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (name, block_number, block_hash) VALUES (?, ?, ?)",
+                (self.name, to_block, block_hash),
+            )
+
+    # --- BACKGROUND ---
+    def start(self, poll_interval=15.0):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.sync()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = e
+                self._stop.wait(poll_interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name=f"event-indexer-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # --- QUERIES ---
+    def history(self, account, contract=None, events=None, limit=100):
+        """Logs where `account` is the first or second address argument, newest first."""
+        sql = "SELECT block_number, tx_hash, contract, event, account, counterparty, amount FROM logs WHERE (account = ? OR counterparty = ?)"
+        params = [account, account]
+        if contract is not None:
+            sql += " AND contract = ?"
+            params.append(Web3.to_checksum_address(contract))
+        if events:
+            sql += f" AND event IN ({','.join('?' * len(events))})"
+            params.extend(events)
+        sql += " ORDER BY block_number DESC, log_index DESC LIMIT ?"
+        params.append(limit)
+        columns = ("block_number", "tx_hash", "contract", "event", "account", "counterparty", "amount")
+        return [
+            dict(zip(columns, row[:-1] + (int(row[-1]) if row[-1] is not None else None,)))
+            for row in self._conn().execute(sql, params)
+        ]
+
+    def accounts(self, contract, events):
+        """Every distinct first address argument of `contract`'s `events` logs, e.g. all depositors."""
+        rows = self._conn().execute(
+            f"SELECT DISTINCT account FROM logs WHERE contract = ? AND event IN ({','.join('?' * len(events))}) AND account IS NOT NULL",
+            (Web3.to_checksum_address(contract), *events),
+        )
+        return [row[0] for row in rows]
+
+    def totals(self, account, contract, events):
+        """Exact wei totals per event name for logs whose first address argument is `account`."""
+        totals = {event: 0 for event in events}
+        rows = self._conn().execute(
+            f"SELECT event, amount FROM logs WHERE account = ? AND contract = ? AND event IN ({','.join('?' * len(events))})",
+            (account, Web3.to_checksum_address(contract), *events),
+        )
+        for event, amount in rows:
+            if amount is not None:
+                totals[event] += int(amount)
+        return totals
@@ -0,0 +1,117 @@
+"""Per-block fee and gas estimates, shared by every session.
+
+`FeeOracle.fees()` samples `eth_feeHistory` once per block (falling back to
+`eth_gasPrice` on nodes without EIP-1559) and hands every caller the same
+EIP-1559 fee fields until the head moves: the base fee expected for the next
+block doubled, so the transaction survives a few full blocks, plus the
+median of recent tips at `percentile`.
+
+`FeeOracle.estimate_gas(fn, params, shape)` runs `eth_estimateGas` and
+multiplies it by a safety margin. Only calls that name a `shape` are memoized,
+per `(contract, function selector, shape)`, for `gas_ttl_blocks` blocks: the
+caller vouches that every call of that shape costs about the same. A token
+transfer does not qualify on its own, since one to an empty balance writes a
+fresh storage slot and costs half as much again as one to an existing holder,
+far beyond the margin; withdrawals are estimated one by one.
+
+With both, a burst of 500 same-shape transfers costs one head check, one fee
+history and one gas estimate instead of two RPCs per transfer.
+
+The head comes from `head`, a callable returning the latest block number;
+the apps pass `BalanceCache.latest_block`, which is already throttled and kept
+current by the block watcher. Without it the oracle polls `eth_blockNumber` at
+most every `head_check_interval` seconds.
+"""
+import statistics
+import threading
+import time
+
+DEFAULT_PERCENTILE = 50
+DEFAULT_HISTORY_BLOCKS = 5
+DEFAULT_GAS_MARGIN = 1.2
+DEFAULT_GAS_TTL_BLOCKS = 100
+MIN_PRIORITY_FEE = 10**8  # 0.1 gwei
+
+
+class FeeOracle:
+    def __init__(self, w3, head=None, percentile=DEFAULT_PERCENTILE, history_blocks=DEFAULT_HISTORY_BLOCKS,
+                 gas_margin=DEFAULT_GAS_MARGIN, gas_ttl_blocks=DEFAULT_GAS_TTL_BLOCKS, head_check_interval=2.0):
+        self.w3 = w3
+        self.percentile = percentile
+        self.history_blocks = history_blocks
+        self.gas_margin = gas_margin
+        self.gas_ttl_blocks = gas_ttl_blocks
+        self.head_check_interval = head_check_interval
+        self._head_source = head
+        self._head = None
+        self._head_checked_at = 0.0
+        self._fees = None
+        self._fees_block = None
+        self._gas = {}
+        self._lock = threading.Lock()
+        self._fees_lock = threading.Lock()
+
+    def latest_block(self):
+        if self._head_source is not None:
+            return self._head_source()
+        now = time.monotonic()
+        with self._lock:
+            if self._head is not None and now - self._head_checked_at < self.head_check_interval:
+                return self._head
+        head = self.w3.eth.block_number
+        with self._lock:
+            self._head = max(head, self._head or 0)
+            self._head_checked_at = now
+            return self._head
+
+    # --- FEES ---
+    def fees(self):
+        """Fee fields for a transaction sent now: `maxFeePerGas`/`maxPriorityFeePerGas`, or `gasPrice`."""
+        block = self.latest_block()
+        if self._fees_block == block:
+            return dict(self._fees)
+        # One caller samples the new block; the others wait for its result
+        with self._fees_lock:
+            if self._fees_block != block:
+                self._fees = self._sample()
+                self._fees_block = block
+            return dict(self._fees)
+
+    def _sample(self):
+        try:
+            history = self.w3.eth.fee_history(self.history_blocks, "latest", [self.percentile])
+        except Exception:
+            history = None
+        if not history or not history.get("baseFeePerGas") or history["baseFeePerGas"][-1] is None:
+            # Pre-London chain, or a node without eth_feeHistory
+            return {"gasPrice": self.w3.eth.gas_price}
+        next_base_fee = history["baseFeePerGas"][-1]
+        tips = [reward[0] for reward in history.get("reward") or [] if reward]
+        tip = max(MIN_PRIORITY_FEE, int(statistics.median(tips)) if tips else 0)
+        return {"maxFeePerGas": 2 * next_base_fee + tip, "maxPriorityFeePerGas": tip}
+
+    # --- GAS ---
+    def estimate_gas(self, fn, params, shape=None):
+        """`fn.estimate_gas(params)` with the margin applied; memoized per contract function and `shape`.
+
+        `shape` names what the cost depends on, e.g. the number of recipients
+        of a batch transfer. Without one, nothing is memoized.
+        """
+        if shape is None:
+            return int(fn.estimate_gas(params) * self.gas_margin)
+        data = fn._encode_transaction_data()
+        key = (fn.address, data[:10], shape)
+        block = self.latest_block()
+        with self._lock:
+            cached = self._gas.get(key)
+        if cached is not None and block - cached[1] < self.gas_ttl_blocks:
+            return cached[0]
+        gas = int(fn.estimate_gas(params) * self.gas_margin)
+        with self._lock:
+            self._gas[key] = (gas, block)
+        return gas
+
+    def clear(self):
+        with self._lock:
+            self._gas.clear()
+            self._fees_block = None
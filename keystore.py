@@ -0,0 +1,163 @@
+"""Encrypted wallet records and a session-scoped cache of unlocked keys.
+
+New wallets are stored as `{"keystore": ...}`: the private key as an Ethereum
+keystore v3 JSON (`Account.encrypt`) with the wallet's access code as its
+password. The access code itself is not stored; a login is checked by
+decrypting the keystore. Records in the old `{"private_key", "access_code"}`
+form still work, and `python keystore.py` encrypts them in place.
+
+The KDF is set with `SIMPLETH_KEYSTORE_KDF` (`scrypt` or `pbkdf2`) and its cost
+with `SIMPLETH_KEYSTORE_ITERATIONS` (scrypt's `n` or pbkdf2's `c`; eth_account's
+defaults, 2**18 and 10**6, when unset). With the scrypt default one decryption
+takes the better part of a second, so the apps pay it once per login:
+`UnlockedKeys` keeps the decrypted key for the session that logged in, for at
+most `ttl` seconds since it was last used and for at most `max_entries`
+sessions (least recently used first out), and overwrites it on logout, expiry
+or eviction.
+
+Bulk-provisioned wallets are encrypted with `BULK_KEYSTORE_ITERATIONS`
+(`SIMPLETH_BULK_KEYSTORE_ITERATIONS`, 2**14 by default: about 50 ms and 16 MB
+per scrypt key instead of about 1 s and 256 MB). Their access codes are random
+64-bit tokens rather than chosen passwords, so the lighter stretching still
+leaves a guess far out of reach, and provisioning 100,000 of them stays in
+minutes.
+"""
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+KEYSTORE_KDF = os.environ.get("SIMPLETH_KEYSTORE_KDF", "scrypt")
+KEYSTORE_ITERATIONS = int(os.environ["SIMPLETH_KEYSTORE_ITERATIONS"]) if os.environ.get("SIMPLETH_KEYSTORE_ITERATIONS") else None
+BULK_KEYSTORE_ITERATIONS = int(os.environ.get("SIMPLETH_BULK_KEYSTORE_ITERATIONS") or 2**14)
+UNLOCKED_KEY_TTL = 15 * 60
+MAX_UNLOCKED_KEYS = 1000
+MIGRATE_BATCH_SIZE = 1000
+
+
+def is_encrypted(record):
+    return "keystore" in record
+
+
+def encrypt_record(wallet_info, kdf=KEYSTORE_KDF, iterations=KEYSTORE_ITERATIONS):
+    """The stored form of a new wallet's `{"private_key", "access_code"}`."""
+    from eth_account import Account
+
+    return {"keystore": Account.encrypt(wallet_info["private_key"], wallet_info["access_code"], kdf=kdf, iterations=iterations)}
+
+
+def unlock(record, access_code):
+    """The wallet's private key as bytes, or None if `access_code` is wrong."""
+    if not is_encrypted(record):
+        if not hmac.compare_digest(access_code.encode(), record["access_code"].encode()):
+            return None
+        return bytes.fromhex(record["private_key"].removeprefix("0x"))
+    from eth_account import Account
+
+    try:
+        return bytes(Account.decrypt(record["keystore"], access_code))
+    except ValueError:  # MAC mismatch: wrong password
+        return None
+
+
+class UnlockedKeys:
+    def __init__(self, ttl=UNLOCKED_KEY_TTL, max_entries=MAX_UNLOCKED_KEYS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._keys = OrderedDict()  # (session, address) -> [key bytearray, last used]
+        self._lock = threading.Lock()
+
+    def unlock(self, session, address, record, access_code):
+        """Decrypt `record` with `access_code` and keep the key for `session`; False if the code is wrong."""
+        key = unlock(record, access_code)
+        if key is None:
+            return False
+        self.put(session, address, key)
+        return True
+
+    def put(self, session, address, private_key):
+        if isinstance(private_key, str):
+            private_key = bytes.fromhex(private_key.removeprefix("0x"))
+        with self._lock:
+            self._drop((session, address))
+            self._keys[(session, address)] = [bytearray(private_key), time.monotonic()]
+            self._expire()
+            while len(self._keys) > self.max_entries:
+                self._drop(next(iter(self._keys)))
+
+    def get(self, session, address):
+        """The unlocked key, or None once it has expired, been evicted or locked."""
+        with self._lock:
+            self._expire()
+            entry = self._keys.get((session, address))
+            if entry is None:
+                return None
+            entry[1] = time.monotonic()
+            self._keys.move_to_end((session, address))
+            return bytes(entry[0])
+
+    def lock(self, session):
+        """Forget every key unlocked by `session` (logout)."""
+        with self._lock:
+            for key in [key for key in self._keys if key[0] == session]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._keys):
+                self._drop(key)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _expire(self):
+        # Least recently used first, so the expired entries are at the front
+        now = time.monotonic()
+        while self._keys:
+            key, (_, used) = next(iter(self._keys.items()))
+            if now - used < self.ttl:
+                break
+            self._drop(key)
+
+    def _drop(self, key):
+        entry = self._keys.pop(key, None)
+        if entry is not None:
+            # Overwrite our copy; the bytes handed out by get() are the caller's to drop
+            entry[0][:] = bytes(len(entry[0]))
+
+
+# --- MIGRATION ---
+def _encrypt_item(item, kdf, iterations):
+    address, record = item
+    return address, encrypt_record(record, kdf=kdf, iterations=iterations)
+
+
+def encrypt_store(store, kdf=KEYSTORE_KDF, iterations=KEYSTORE_ITERATIONS, workers=None, progress=None):
+    """Encrypt every plaintext record in `store` in place; returns how many were encrypted.
+
+    The KDF is CPU-bound, so records are encrypted across a process pool and
+    written back `MIGRATE_BATCH_SIZE` at a time; an interrupted migration picks
+    up the remaining plaintext records when run again.
+    """
+    # Only the migration needs it, and it pulls in multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    legacy = [(address, record) for address, record in store.load_all().items() if not is_encrypted(record)]
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(legacy), MIGRATE_BATCH_SIZE):
+            batch = legacy[start:start + MIGRATE_BATCH_SIZE]
+            store.put_many(list(pool.map(partial(_encrypt_item, kdf=kdf, iterations=iterations), batch, chunksize=16)))
+            done += len(batch)
+            if progress is not None:
+                progress(done, len(legacy))
+    return done
+
+
+if __name__ == "__main__":
+    from wallet_store import open_wallet_store
+
+    count = encrypt_store(open_wallet_store())
+    print(f"Encrypted {count} wallets with {KEYSTORE_KDF}")
@@ -0,0 +1,420 @@
+"""End-to-end load test: N concurrent sessions against a local stub RPC node.
+
+Admin sessions create wallets; user sessions log in, view their balances and
+simulate a withdrawal (fees, gas estimate and a signed transfer that is not
+broadcast), `--iterations` times each, all at once. Two drivers:
+
+- `core` (default): each session is a thread calling `simpleth_core` with one
+  set of shared components (web3 provider, `BalanceCache`, `FeeOracle`,
+  wallet store, `UnlockedKeys`), as one app process holds them. Measures the
+  server-side work without Streamlit.
+- `apptest`: each session is a `streamlit.testing.v1.AppTest` of simpleth.py
+  (admins) or simpleth_user.py (users) in this process, so sessions share
+  `st.cache_resource` as they do on one Streamlit server, and every step
+  includes the script rerun. User sessions log in and render the dashboard;
+  the withdrawal is left out, as the app's sends for real.
+
+The node is a `LocalChain` with `--latency` ms added to every HTTP round trip
+and a new block every `--block-time` seconds. The report gives, per step,
+throughput and p50/p95/p99 latency; upstream JSON-RPC calls by method and HTTP
+round trips; and wallet-DB contention: write latency and how many writers were
+already in flight when each write started.
+
+User wallets are provisioned the way `simpleth_core.create_wallet` stores
+them, encrypted with the production keystore KDF, so logins pay its real cost
+(that is usually what collapses first). `--kdf-iterations` lowers it, for those
+wallets and the ones admin sessions create alike.
+
+    python load_test.py --users 50 --admins 5 --iterations 5 --latency 50
+    python load_test.py --driver apptest --users 10 --admins 2 --latency 50 --json results.json
+
+Requires `eth-tester[py-evm]`.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_USERS = 20
+DEFAULT_ADMINS = 2
+DEFAULT_ITERATIONS = 5
+DEFAULT_LATENCY_MS = 50.0
+DEFAULT_BLOCK_TIME = 2.0
+PROVISION_WORKERS = 8  # scrypt at its default cost takes 256 MB per key being derived
+WITHDRAW_AMOUNT = 10**15
+
+
+class Recorder:
+    """Latencies and errors per step, from any thread."""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, step, seconds, error=None):
+        with self._lock:
+            self.samples.setdefault(step, []).append(seconds)
+            if error is not None:
+                self.errors.setdefault(step, []).append(error)
+
+    def time(self, step, fn, *args):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self.record(step, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+            return None
+        self.record(step, time.perf_counter() - start)
+        return result
+
+    def summary(self, elapsed):
+        rows = {}
+        for step, samples in self.samples.items():
+            ordered = sorted(samples)
+            rows[step] = {
+                "count": len(ordered),
+                "errors": len(self.errors.get(step, [])),
+                "ops_per_s": round(len(ordered) / elapsed, 2),
+                "p50_ms": round(1000 * percentile(ordered, 50), 2),
+                "p95_ms": round(1000 * percentile(ordered, 95), 2),
+                "p99_ms": round(1000 * percentile(ordered, 99), 2),
+                "max_ms": round(1000 * ordered[-1], 2),
+            }
+        return rows
+
+
+def percentile(ordered, p):
+    # Nearest rank on an already sorted list
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+class TimedStore:
+    """Wallet store proxy recording read/write latency and writers already in flight."""
+
+    def __init__(self, store, recorder):
+        self.store = store
+        self.recorder = recorder
+        self.in_flight = 0
+        self.queued = []
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def __len__(self):
+        return len(self.store)
+
+    def get(self, address):
+        start = time.perf_counter()
+        try:
+            return self.store.get(address)
+        finally:
+            self.recorder.record("wallet_db.get", time.perf_counter() - start)
+
+    def put(self, address, info):
+        self.put_many([(address, info)])
+
+    def put_many(self, items):
+        with self._lock:
+            self.queued.append(self.in_flight)
+            self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            self.store.put_many(items)
+        finally:
+            self.recorder.record("wallet_db.put", time.perf_counter() - start)
+            with self._lock:
+                self.in_flight -= 1
+
+
+def run_sessions(sessions):
+    """Start every session at once and wait for all of them; returns the wall time."""
+    barrier = threading.Barrier(len(sessions) + 1)
+
+    def start(session):
+        barrier.wait()
+        session()
+
+    threads = [threading.Thread(target=start, args=(session,), daemon=True) for session in sessions]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def _user_wallet(_):
+    # As simpleth_core.create_wallet stores it, with the keystore's (production) iterations
+    from keystore import encrypt_record
+    from provisioning import create_wallet
+
+    address, wallet_info = create_wallet()
+    return address, encrypt_record(wallet_info), wallet_info["access_code"]
+
+
+# --- DRIVERS ---
+def drive_core(args, chain, users, recorder, store):
+    from eth_account import Account
+    from web3 import Web3
+
+    import rpc_metrics
+    import simpleth_core
+    from balance_cache import BalanceCache
+    from contracts import SIMPLETH_ABI, STETH_ABI, get_contract
+    from fee_oracle import FeeOracle
+    from keystore import UnlockedKeys
+    from rpc_pool import PooledRPCProvider
+
+    w3 = rpc_metrics.install(Web3(PooledRPCProvider([chain.url])))
+    balance_cache = BalanceCache(w3)
+    fee_oracle = FeeOracle(w3, head=balance_cache.latest_block)
+    unlocked_keys = UnlockedKeys()
+    steth = get_contract(w3, chain.steth, STETH_ABI)
+    simpleth = get_contract(w3, chain.simpleth, SIMPLETH_ABI)
+    chain_id = w3.eth.chain_id
+    recipient = Web3.to_checksum_address("0x%040x" % 0xBEEF)
+
+    def simulate_withdrawal(private_key):
+        # What TransferService.submit does before it sends: fees, gas, build and sign
+        account = Account.from_key(private_key)
+        fn = steth.functions.transfer(recipient, WITHDRAW_AMOUNT)
+        params = {"from": account.address, "chainId": chain_id, "nonce": 0}
+        params.update(fee_oracle.fees(), gas=fee_oracle.estimate_gas(fn, {"from": account.address}))
+        return account.sign_transaction(fn.build_transaction(params))
+
+    def user_session(index, address, access_code):
+        session = f"user-{index}"
+
+        def login():
+            private_key = simpleth_core.verify_login(store, address, access_code)
+            if private_key is None:
+                raise ValueError("access code rejected")
+            unlocked_keys.put(session, address, private_key)
+
+        def balances():
+            for value in simpleth_core.wallet_balances(balance_cache, steth, simpleth, address):
+                if isinstance(value, Exception):
+                    raise value
+
+        def run():
+            for _ in range(args.iterations):
+                recorder.time("login", login)
+                recorder.time("balance_view", balances)
+                private_key = unlocked_keys.get(session, address)
+                if private_key is not None:
+                    recorder.time("withdraw_simulation", simulate_withdrawal, private_key)
+                unlocked_keys.lock(session)
+        return run
+
+    def admin_session():
+        for _ in range(args.iterations):
+            recorder.time("create_wallet", simpleth_core.create_wallet, store)
+
+    sessions = [user_session(i, address, code) for i, (address, code) in enumerate(users)]
+    sessions += [admin_session] * args.admins
+    return run_sessions(sessions)
+
+
+def _share_runtime():
+    """Let concurrent AppTests share what sessions on one server share: the Runtime and script cache.
+
+    Each `AppTest.run` installs its own mock Runtime and clears it when done,
+    which would pull it out from under runs still going on other threads, so
+    `Runtime.instance()` falls back to the last one it saw instead. Each run
+    also compiles the script afresh, where a server compiles it once.
+    """
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+    original = Runtime.__dict__["instance"].__func__
+    seen = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            seen[:] = [cls._instance]
+        if seen:
+            return seen[0]
+        return original(cls)
+
+    Runtime.instance = classmethod(instance)
+
+
+def drive_apptest(args, chain, users, recorder, store):
+    from streamlit.testing.v1 import AppTest
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    user_app = os.path.join(here, "simpleth_user.py")
+    admin_app = os.path.join(here, "simpleth.py")
+
+    def failed(at):
+        if at.exception:
+            return at.exception[0].value
+        if at.error:
+            return at.error[0].value
+        return None
+
+    def timed_run(step, at, action=None):
+        start = time.perf_counter()
+        try:
+            if action is not None:
+                action()
+            at.run()
+            error = failed(at)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        recorder.record(step, time.perf_counter() - start, error)
+
+    def user_session(address, access_code):
+        def run():
+            for _ in range(args.iterations):
+                at = AppTest.from_file(user_app, default_timeout=args.timeout)
+                timed_run("page_load", at)
+                at.text_input[0].set_value(address)
+                at.text_input[1].set_value(access_code)
+                timed_run("login", at, lambda: at.button[0].click())
+                timed_run("balance_view", at)
+        return run
+
+    def admin_session():
+        for _ in range(args.iterations):
+            at = AppTest.from_file(admin_app, default_timeout=args.timeout)
+            timed_run("page_load", at)
+            create = next(button for button in at.button if button.label == "Create Wallet")
+            timed_run("create_wallet", at, create.click)
+
+    _share_runtime()
+    # Untimed: imports and compiles the apps, and gives _share_runtime a Runtime to fall back to
+    for app in (user_app, admin_app):
+        AppTest.from_file(app, default_timeout=args.timeout).run()
+
+    sessions = [user_session(address, code) for address, code in users]
+    sessions += [admin_session] * args.admins
+    return run_sessions(sessions)
+
+
+# --- MAIN ---
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--driver", choices=["core", "apptest"], default="core")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS, help="concurrent user sessions")
+    parser.add_argument("--admins", type=int, default=DEFAULT_ADMINS, help="concurrent admin sessions")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="flows per session")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY_MS, help="ms added to every RPC round trip")
+    parser.add_argument("--block-time", type=float, default=DEFAULT_BLOCK_TIME, help="seconds between blocks")
+    parser.add_argument("--store", choices=["json", "sqlite"], default="json", help="wallet DB backend")
+    parser.add_argument("--kdf-iterations", type=int, help="keystore KDF cost (default: the production setting)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="apptest: seconds allowed per script run")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    # Read when keystore is imported, in this process and the provisioning workers
+    if args.kdf_iterations:
+        os.environ["SIMPLETH_KEYSTORE_ITERATIONS"] = str(args.kdf_iterations)
+    os.environ["SIMPLETH_WALLET_STORE"] = args.store
+
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    workdir = tempfile.mkdtemp(prefix="simpleth-load-")
+    os.chdir(workdir)  # wallet DB and event index of this run
+
+    import rpc_metrics
+    import wallet_store
+    from local_chain import LocalChain
+
+    recorder = Recorder()
+    store = TimedStore(wallet_store.open_wallet_store(), recorder)
+    mocks = ()
+    if args.driver == "apptest":
+        # The apps build their own store and read their configured addresses:
+        # hand them the timed store, and put mock contracts at those addresses
+        import simpleth_core
+
+        wallet_store.open_wallet_store = lambda *a, **kw: store
+        mocks = (simpleth_core.STETH_CONTRACT_ADDRESS, simpleth_core.SIMPLETH_CONTRACT_ADDRESS)
+
+    print(f"Provisioning {args.users} user wallets in {workdir} ...")
+    with ProcessPoolExecutor(max_workers=min(PROVISION_WORKERS, os.cpu_count() or 1)) as pool:
+        wallets = list(pool.map(_user_wallet, range(args.users)))
+    store.store.put_many((address, record) for address, record, _ in wallets)
+    users = [(address, access_code) for address, _, access_code in wallets]
+    recorder.samples.clear()
+
+    chain = LocalChain(mocks=mocks, latency=args.latency / 1000)
+    chain.fund(address for address, _ in users)
+    os.environ["SIMPLETH_RPC_URLS"] = chain.url
+    stop = threading.Event()
+
+    def produce_blocks():
+        while not stop.wait(args.block_time):
+            chain.mine()
+
+    threading.Thread(target=produce_blocks, name="blocks", daemon=True).start()
+    rpc_before = {key: series["count"] for key, series in rpc_metrics.METRICS.snapshot().items()}
+    round_trips_before = chain.round_trips
+    print(f"Running {args.users} user and {args.admins} admin sessions x {args.iterations} ({args.driver} driver) ...")
+    try:
+        drive = drive_core if args.driver == "core" else drive_apptest
+        elapsed = drive(args, chain, users, recorder, store)
+    finally:
+        stop.set()
+        chain.close()
+
+    rpc_calls = {}
+    for (method, function), series in rpc_metrics.METRICS.snapshot().items():
+        count = series["count"] - rpc_before.get((method, function), 0)
+        if count:
+            name = f"{method}:{function}" if function else method
+            rpc_calls[name] = rpc_calls.get(name, 0) + count
+    queued = store.queued
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "elapsed_s": round(elapsed, 3),
+        "steps": recorder.summary(elapsed),
+        "rpc": {
+            "calls": dict(sorted(rpc_calls.items(), key=lambda item: -item[1])),
+            "total": sum(rpc_calls.values()),
+            "http_round_trips": chain.round_trips - round_trips_before,
+        },
+        "wallet_db": {
+            "backend": args.store,
+            "writes": len(queued),
+            "mean_writers_ahead": round(sum(queued) / len(queued), 2) if queued else 0.0,
+            "max_writers_ahead": max(queued, default=0),
+        },
+        "errors": {step: errors[:5] for step, errors in recorder.errors.items()},
+    }
+
+    print(f"\n{args.users} users + {args.admins} admins, {args.latency:g} ms RPC latency, {report['elapsed_s']} s")
+    print(f"{'step':<22} {'count':>6} {'errors':>6} {'ops/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for step, row in report["steps"].items():
+        print(f"{step:<22} {row['count']:>6} {row['errors']:>6} {row['ops_per_s']:>8} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}")
+    print(f"\nRPC: {report['rpc']['total']} calls in {report['rpc']['http_round_trips']} HTTP round trips")
+    for name, count in report["rpc"]["calls"].items():
+        print(f"  {name:<40} {count:>6}")
+    wallet_db = report["wallet_db"]
+    print(f"Wallet DB ({args.store}): {wallet_db['writes']} writes, "
+          f"{wallet_db['mean_writers_ahead']} writers ahead on average, {wallet_db['max_writers_ahead']} at most")
+    for step, errors in report["errors"].items():
+        print(f"errors in {step}: {errors[0]}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
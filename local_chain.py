@@ -0,0 +1,306 @@
+"""In-process test chain for benchmarks and load tests.
+
+`LocalChain` starts an eth-tester (py-evm) chain with the mock contracts the
+apps talk to already in its genesis state, and serves it over a local HTTP
+JSON-RPC endpoint, so the real providers (`PooledRPCProvider`, `AsyncHTTPProvider`)
+and JSON-RPC batching are exercised exactly as against Infura:
+
+- `MockView` contracts stand in for mock stETH, Simpleth and KinetixVault:
+  every view call returns the 32-byte value stored under the keccak of its
+  calldata, so any getter (`balanceOf(holder)`, `decimals()`,
+  `vaultBalance()`, ...) can be given a value with `set`/`set_many`;
+- a minimal Multicall3 sits at the canonical address, so `balance_reader`
+  takes the same single-eth_call path it takes on Sepolia. It implements
+  `aggregate3` only, and treats every call as `allowFailure`.
+
+No solc is needed: the contracts are assembled below from their opcodes.
+`mocks` puts extra `MockView` copies at other addresses (e.g. an app's
+configured contract addresses), `deploy` adds any other runtime code (such as
+`REVERT_CODE`, `ERC20_CODE` for a token whose `transfer` really moves
+balances, or `EMITTER_CODE` for a contract that logs whatever it is sent)
+after start, and `latency` adds that many seconds to every HTTP round trip,
+outside the chain lock, to stand in for a remote node.
+
+    chain = LocalChain()
+    steth = chain.w3.eth.contract(chain.steth, abi=STETH_ABI)
+    chain.set(steth.functions.balanceOf(holder), 5 * 10**18)
+    w3 = Web3(PooledRPCProvider([chain.url]))
+
+Requires `eth-tester[py-evm]`, which is not an app dependency.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_utils import keccak, to_canonical_address, to_checksum_address
+from web3 import Web3
+
+from balance_reader import MULTICALL3_ADDRESS
+
+STETH_MOCK_ADDRESS = "0x0000000000000000000000000000000000005737"
+SIMPLETH_MOCK_ADDRESS = "0x0000000000000000000000000000000000005e7b"
+KINETIX_VAULT_MOCK_ADDRESS = "0x000000000000000000000000000000000000c1e7"
+SET_SELECTOR = "0xffffffff"  # MockView's setter: set(bytes32 key, uint256 value)
+
+OPCODES = {
+    "STOP": 0x00, "ADD": 0x01, "MUL": 0x02, "SUB": 0x03, "DIV": 0x04,
+    "LT": 0x10, "EQ": 0x14, "ISZERO": 0x15, "SHR": 0x1C, "KECCAK256": 0x20,
+    "CALLER": 0x33, "CALLDATALOAD": 0x35, "CALLDATASIZE": 0x36, "CALLDATACOPY": 0x37, "CODECOPY": 0x39,
+    "RETURNDATASIZE": 0x3D, "RETURNDATACOPY": 0x3E,
+    "POP": 0x50, "MLOAD": 0x51, "MSTORE": 0x52, "SLOAD": 0x54, "SSTORE": 0x55,
+    "JUMP": 0x56, "JUMPI": 0x57, "GAS": 0x5A, "JUMPDEST": 0x5B,
+    "DUP1": 0x80, "DUP2": 0x81, "DUP3": 0x82, "SWAP1": 0x90, "LOG3": 0xA3,
+    "CALL": 0xF1, "RETURN": 0xF3, "REVERT": 0xFD,
+}
+
+
+def assemble(program):
+    """Opcode names, ints (pushed), `":label"` (jump target) and `"@label"` (push its offset)."""
+    def size(item):
+        if isinstance(item, int):
+            return 1 + max(1, (item.bit_length() + 7) // 8)
+        if item.startswith("@"):
+            return 3
+        return 1
+
+    labels = {}
+    offset = 0
+    for item in program:
+        if isinstance(item, str) and item.startswith(":"):
+            labels[item[1:]] = offset
+        offset += size(item)
+    code = bytearray()
+    for item in program:
+        if isinstance(item, int):
+            n = size(item) - 1
+            code += bytes([0x5F + n]) + item.to_bytes(n, "big")
+        elif item.startswith("@"):
+            code += b"\x61" + labels[item[1:]].to_bytes(2, "big")
+        elif item.startswith(":"):
+            code.append(OPCODES["JUMPDEST"])
+        else:
+            code.append(OPCODES[item])
+    return bytes(code)
+
+
+MOCK_VIEW_CODE = assemble([
+    0, "CALLDATALOAD", 0xE0, "SHR", 0xFFFFFFFF, "EQ", "@set", "JUMPI",
+    # return sload(keccak256(calldata))
+    "CALLDATASIZE", 0, 0, "CALLDATACOPY",
+    "CALLDATASIZE", 0, "KECCAK256", "SLOAD", 0, "MSTORE",
+    32, 0, "RETURN",
+    ":set", 36, "CALLDATALOAD", 4, "CALLDATALOAD", "SSTORE", "STOP",
+])
+
+# MockView plus a real `transfer(to, amount)`: balances live in the slots
+# `balanceOf(holder)` reads, so `set` seeds them and a transfer to an empty one
+# pays for a fresh storage slot, as on a real token
+_BALANCE_OF = 0x70A08231
+ERC20_CODE = assemble([
+    0, "CALLDATALOAD", 0xE0, "SHR",
+    "DUP1", 0xFFFFFFFF, "EQ", "@set", "JUMPI",
+    "DUP1", 0xA9059CBB, "EQ", "@transfer", "JUMPI",
+    "POP",
+    "CALLDATASIZE", 0, 0, "CALLDATACOPY",
+    "CALLDATASIZE", 0, "KECCAK256", "SLOAD", 0, "MSTORE",
+    32, 0, "RETURN",
+    ":set", 36, "CALLDATALOAD", 4, "CALLDATALOAD", "SSTORE", "STOP",
+    ":transfer",
+    # the sender's slot: keccak256(balanceOf(caller)); revert below the amount
+    _BALANCE_OF << 224, 0, "MSTORE", "CALLER", 4, "MSTORE",
+    36, 0, "KECCAK256", "DUP1", "SLOAD", 36, "CALLDATALOAD",
+    "DUP1", "DUP3", "LT", "@fail", "JUMPI",
+    "SWAP1", "SUB", "SWAP1", "SSTORE",
+    # the recipient's slot: keccak256(balanceOf(to))
+    4, "CALLDATALOAD", 4, "MSTORE",
+    36, 0, "KECCAK256", "DUP1", "SLOAD", 36, "CALLDATALOAD", "ADD", "SWAP1", "SSTORE",
+    1, 0, "MSTORE", 32, 0, "RETURN",
+    ":fail", 0, 0, "REVERT",
+])
+
+# Emits one log per call: the calldata's first three words are its topics, the rest its data
+EMITTER_CODE = assemble([
+    96, "CALLDATASIZE", "SUB", 96, 0, "CALLDATACOPY",
+    64, "CALLDATALOAD", 32, "CALLDATALOAD", 0, "CALLDATALOAD", 96, "CALLDATASIZE", "SUB", 0, "LOG3", "STOP",
+])
+
+# Reverts every call, with no reason
+REVERT_CODE = assemble([0, 0, "REVERT"])
+
+# Memory: 0x00 i, 0x20 n, 0x40 start of the calls' heads, 0x60 output tail,
+# 0x80 current call tuple; the ABI-encoded (bool, bytes)[] result from 0x100
+_I, _N, _HEADS, _TAIL, _TUPLE, _OUT = 0x00, 0x20, 0x40, 0x60, 0x80, 0x100
+MULTICALL3_CODE = assemble([
+    4, "CALLDATALOAD", 4, "ADD",
+    "DUP1", "CALLDATALOAD", _N, "MSTORE",
+    32, "ADD", _HEADS, "MSTORE",
+    0x20, _OUT, "MSTORE",
+    _N, "MLOAD", _OUT + 32, "MSTORE",
+    _N, "MLOAD", 32, "MUL", _OUT + 64, "ADD", _TAIL, "MSTORE",
+    0, _I, "MSTORE",
+    ":loop",
+    _N, "MLOAD", _I, "MLOAD", "LT", "ISZERO", "@end", "JUMPI",
+    # tuple = heads + heads[i]; calldata = tuple + tuple.offset
+    _HEADS, "MLOAD", "DUP1", _I, "MLOAD", 32, "MUL", "ADD", "CALLDATALOAD", "ADD", _TUPLE, "MSTORE",
+    _TUPLE, "MLOAD", "DUP1", 64, "ADD", "CALLDATALOAD", "ADD",
+    # copy the call's calldata to tail + 96 and call the target with it
+    "DUP1", "CALLDATALOAD", "SWAP1", 32, "ADD", "DUP2", "SWAP1",
+    _TAIL, "MLOAD", 96, "ADD", "CALLDATACOPY",
+    0, 0, "DUP3", _TAIL, "MLOAD", 96, "ADD", 0, _TUPLE, "MLOAD", "CALLDATALOAD", "GAS", "CALL",
+    "SWAP1", "POP",
+    # result element at tail: success, 0x40, returndata length, returndata (zero-padded)
+    _TAIL, "MLOAD", "MSTORE",
+    0x40, _TAIL, "MLOAD", 32, "ADD", "MSTORE",
+    "RETURNDATASIZE", _TAIL, "MLOAD", 64, "ADD", "MSTORE",
+    "RETURNDATASIZE", 0, _TAIL, "MLOAD", 96, "ADD", "RETURNDATACOPY",
+    0, "RETURNDATASIZE", _TAIL, "MLOAD", 96, "ADD", "ADD", "MSTORE",
+    _OUT + 64, _TAIL, "MLOAD", "SUB", _I, "MLOAD", 32, "MUL", _OUT + 64, "ADD", "MSTORE",
+    32, 31, "RETURNDATASIZE", "ADD", "DIV", 32, "MUL", 96, "ADD", _TAIL, "MLOAD", "ADD", _TAIL, "MSTORE",
+    _I, "MLOAD", 1, "ADD", _I, "MSTORE",
+    "@loop", "JUMP",
+    ":end",
+    _OUT, _TAIL, "MLOAD", "SUB", _OUT, "RETURN",
+])
+
+
+def storage_key(calldata):
+    """MockView storage slot holding the return value for `calldata` (hex or bytes)."""
+    if isinstance(calldata, str):
+        calldata = bytes.fromhex(calldata.removeprefix("0x"))
+    return int.from_bytes(keccak(calldata), "big")
+
+
+def _calldata(fn):
+    return fn._encode_transaction_data()
+
+
+def _value(value):
+    if isinstance(value, str):  # an address
+        return int(value, 16)
+    return int(value)
+
+
+class LocalChain:
+    def __init__(self, values=None, accounts=10, serve=True, mocks=(), latency=0.0):
+        """`values` is a list of `(contract_function, value)` to seed into genesis."""
+        from eth_tester import EthereumTester, PyEVMBackend
+
+        storage = {}
+        for fn, value in values or []:
+            storage.setdefault(fn.address, {})[storage_key(_calldata(fn))] = _value(value)
+        genesis = dict(PyEVMBackend.generate_genesis_state(num_accounts=accounts))
+        for address in (STETH_MOCK_ADDRESS, SIMPLETH_MOCK_ADDRESS, KINETIX_VAULT_MOCK_ADDRESS, *mocks):
+            genesis[to_canonical_address(address)] = {
+                "balance": 0, "nonce": 1, "code": MOCK_VIEW_CODE,
+                "storage": storage.get(to_checksum_address(address), {}),
+            }
+        genesis[to_canonical_address(MULTICALL3_ADDRESS)] = {
+            "balance": 0, "nonce": 1, "code": MULTICALL3_CODE, "storage": {},
+        }
+        self.tester = EthereumTester(PyEVMBackend(genesis_state=genesis))
+        self.w3 = Web3(Web3.EthereumTesterProvider(self.tester), middleware=[])
+        self.steth = to_checksum_address(STETH_MOCK_ADDRESS)
+        self.simpleth = to_checksum_address(SIMPLETH_MOCK_ADDRESS)
+        self.vault = to_checksum_address(KINETIX_VAULT_MOCK_ADDRESS)
+        self._request = self.w3.provider.request_func(self.w3, self.w3.middleware_onion)
+        self._lock = threading.Lock()
+        self.latency = latency
+        self.requests = 0
+        self.round_trips = 0
+        self.server = self.url = None
+        if serve:
+            self.serve()
+
+    # --- STATE ---
+    def set(self, fn, value):
+        """Make `fn.call()` return `value` from the next block on."""
+        self.set_many([(fn, value)])
+
+    def set_many(self, values):
+        """One setter transaction, and so one block, per value."""
+        sender = self.tester.get_accounts()[0]
+        with self._lock:
+            for fn, value in values:
+                self.tester.send_transaction({
+                    "from": sender,
+                    "to": fn.address,
+                    "gas": 100000,
+                    "data": SET_SELECTOR + storage_key(_calldata(fn)).to_bytes(32, "big").hex()
+                            + _value(value).to_bytes(32, "big").hex(),
+                })
+
+    def fund(self, addresses, value=10**18):
+        """Send `value` wei of ETH to each address, for gas; one block each."""
+        sender = self.tester.get_accounts()[0]
+        with self._lock:
+            for address in addresses:
+                self.tester.send_transaction({"from": sender, "to": to_checksum_address(address), "value": value, "gas": 21000})
+
+    def deploy(self, code):
+        """Deploy a contract whose runtime code is `code`; returns its address."""
+        # Init code: copy the runtime code that follows it into memory and return it
+        init = assemble([len(code), "DUP1", 0xFF, 0, "CODECOPY", 0, "RETURN"])
+        init = assemble([len(code), "DUP1", len(init), 0, "CODECOPY", 0, "RETURN"])
+        sender = self.tester.get_accounts()[0]
+        with self._lock:
+            tx_hash = self.tester.send_transaction({"from": sender, "data": "0x" + (init + code).hex(), "gas": 200000})
+            return to_checksum_address(self.tester.get_transaction_receipt(tx_hash)["contract_address"])
+
+    def mine(self, blocks=1):
+        with self._lock:
+            self.tester.mine_blocks(blocks)
+
+    # --- JSON-RPC ---
+    def handle(self, message):
+        """Answer one JSON-RPC request dict, or a batch list of them."""
+        if isinstance(message, list):
+            return [self.handle(item) for item in message]
+        with self._lock:
+            self.requests += 1
+            try:
+                response = dict(self._request(message["method"], message.get("params", [])))
+            except Exception as e:
+                # What a node does with e.g. a bad nonce: a JSON-RPC error, not a dropped connection
+                response = {"jsonrpc": "2.0", "error": {"code": -32000, "message": str(e)}}
+        response["id"] = message.get("id")
+        return response
+
+    def serve(self, host="127.0.0.1", port=0):
+        chain = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                message = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if chain.latency:
+                    time.sleep(chain.latency)
+                with chain._lock:
+                    chain.round_trips += 1
+                body = json.dumps(chain.handle(message), default=_json_default).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="local-chain", daemon=True).start()
+        self.url = f"http://{host}:{self.server.server_port}"
+        return self.url
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
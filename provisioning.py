@@ -0,0 +1,91 @@
+"""Bulk wallet provisioning.
+
+`provision_wallets` generates accounts and access codes across a process pool
+(key generation is CPU-bound secp256k1/keccak work), writes them to the wallet
+store one batch at a time and streams `address,access_code` rows to a CSV file
+as each batch lands, so neither the store nor the CSV ever waits on the full
+cohort being held in memory. The command line (`python provisioning.py N
+out.csv`) streams to a file and suits any size; the admin pages keep their
+CSV in memory for the download, so they cap a batch at `BULK_CREATE_LIMIT`. Records are encrypted (`keystore.encrypt_record`)
+in the workers too, since the keystore KDF costs far more than the key itself,
+with the lighter `BULK_KEYSTORE_ITERATIONS` meant for generated access codes.
+"""
+import csv
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+from keystore import BULK_KEYSTORE_ITERATIONS, encrypt_record
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def create_wallet():
+    """A new account's address and plaintext `{"private_key", "access_code"}`; store `encrypt_record` of it."""
+    # Imported here so the apps can import this module without loading eth_account
+    from eth_account import Account
+    from web3 import Web3
+
+    acct = Account.create()
+    wallet_address = Web3.to_checksum_address(acct.address)
+    return wallet_address, {
+        "private_key": acct.key.hex(),
+        "access_code": secrets.token_urlsafe(8)
+    }
+
+
+def _create_batch(count):
+    batch = []
+    for _ in range(count):
+        wallet_address, wallet_info = create_wallet()
+        batch.append((wallet_address, encrypt_record(wallet_info, iterations=BULK_KEYSTORE_ITERATIONS), wallet_info["access_code"]))
+    return batch
+
+
+def _batch_sizes(count, batch_size):
+    full, rest = divmod(count, batch_size)
+    return [batch_size] * full + ([rest] if rest else [])
+
+
+def generate_wallets(count, workers=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield lists of `(address, encrypted record, access code)`, `batch_size` wallets at a time."""
+    sizes = _batch_sizes(count, batch_size)
+    if workers == 1 or len(sizes) <= 1:
+        for size in sizes:
+            yield _create_batch(size)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_create_batch, sizes)
+
+
+def provision_wallets(store, count, csv_file=None, workers=None, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Create `count` wallets in `store` and return how many were written.
+
+    `csv_file` is any text file object; it receives a header and one
+    `address,access_code` row per wallet. `progress(done, total)` is called
+    after every batch.
+    """
+    writer = None
+    if csv_file is not None:
+        writer = csv.writer(csv_file)
+        writer.writerow(["address", "access_code"])
+    done = 0
+    for batch in generate_wallets(count, workers=workers, batch_size=batch_size):
+        store.put_many((address, record) for address, record, _ in batch)
+        if writer is not None:
+            writer.writerows((address, access_code) for address, _, access_code in batch)
+        done += len(batch)
+        if progress is not None:
+            progress(done, count)
+    return done
+
+
+if __name__ == "__main__":
+    import sys
+
+    from wallet_store import open_wallet_store
+
+    count = int(sys.argv[1])
+    csv_path = sys.argv[2] if len(sys.argv) > 2 else "provisioned_wallets.csv"
+    with open(csv_path, "w", newline="") as f:
+        written = provision_wallets(open_wallet_store(), count, csv_file=f)
+    print(f"Provisioned {written} wallets, access codes written to {csv_path}")
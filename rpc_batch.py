@@ -0,0 +1,48 @@
+"""Collect contract view calls and send them as one JSON-RPC batch POST.
+
+    with RPCBatch(w3) as batch:
+        batch.add(steth.functions.decimals())
+        batch.add(vault.functions.vaultBalance())
+    decimals, vault_balance = batch.results
+
+`HTTPProvider` turns the batch into a single HTTP request, so N reads cost one
+round trip instead of N. Providers without batch support fall back to plain
+sequential calls.
+"""
+
+
+class RPCBatch:
+    def __init__(self, w3):
+        self.w3 = w3
+        self.calls = []
+        self.results = None
+
+    def add(self, fn):
+        self.calls.append(fn)
+        return len(self.calls) - 1
+
+    def execute(self):
+        from web3.exceptions import Web3TypeError
+
+        if not self.calls:
+            self.results = []
+            return self.results
+        try:
+            batch = self.w3.batch_requests()
+        except Web3TypeError:
+            # e.g. EthereumTesterProvider: no batching, run the calls one by one
+            self.results = [fn.call() for fn in self.calls]
+            return self.results
+        with batch:
+            for fn in self.calls:
+                batch.add(fn)
+            self.results = list(batch.execute())
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.execute()
+        return False
@@ -0,0 +1,338 @@
+"""RPC instrumentation: per-request records, histograms and Prometheus export.
+
+`install(w3)` adds a web3 middleware (sync or async) that records, for every
+JSON-RPC round trip, the method, the contract function for `eth_call`s (looked
+up from the selector in the contract registry), latency, request and response
+size, and the exception class when it fails.
+
+Records feed two places:
+
+- `METRICS`, the process-wide aggregate: call counts, error counts, byte totals
+  and a latency histogram per `(method, function)`; `prometheus_text()` renders
+  it in the Prometheus text format, and `serve_metrics(port)` exposes it on
+  `/metrics`. A batch is one round trip, recorded under method "batch"; each
+  call inside it is also counted as `batched` under its own
+  `(method, function)`, so batched reads still show up per contract function;
+- the current rerun's list of records, started with `start_rerun()` at the top
+  of a Streamlit script and read back with `rerun_records()` for the debug panel.
+  It is thread-local, so each session's script thread only sees its own calls;
+  background threads (block watcher, indexer, async engine) only count towards
+  `METRICS`.
+
+Set SIMPLETH_RPC_DEBUG=1 to show the admin apps' debug panel and
+SIMPLETH_METRICS_PORT to serve `/metrics` (on 127.0.0.1, or on
+SIMPLETH_METRICS_HOST).
+
+This module does not import web3 at import time.
+"""
+import json
+import os
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RPCMetrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, function, latency, request_bytes, response_bytes, error):
+        with self._lock:
+            series = self._get(method, function)
+            series["count"] += 1
+            series["latency_sum"] += latency
+            for i, bound in enumerate(self.buckets):
+                if latency <= bound:
+                    series["buckets"][i] += 1
+                    break
+            series["request_bytes"] += request_bytes
+            series["response_bytes"] += response_bytes
+            if error:
+                series["errors"][error] = series["errors"].get(error, 0) + 1
+
+    def record_batched(self, calls):
+        """Count each `(method, function)` in `calls` as sent inside a batch round trip."""
+        with self._lock:
+            for method, function in calls:
+                self._get(method, function)["batched"] += 1
+
+    def _get(self, method, function):
+        key = (method, function or "")
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {
+                "count": 0,
+                "batched": 0,
+                "latency_sum": 0.0,
+                "buckets": [0] * len(self.buckets),
+                "request_bytes": 0,
+                "response_bytes": 0,
+                "errors": {},
+            }
+        return series
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(series, buckets=list(series["buckets"]), errors=dict(series["errors"]))
+                    for key, series in self._series.items()}
+
+    def summary(self):
+        """One row per `(method, function)` with count, mean and p95 latency and errors."""
+        rows = []
+        for (method, function), series in sorted(self.snapshot().items()):
+            count = series["count"]
+            rows.append({
+                "method": method,
+                "function": function,
+                "calls": count,
+                "batched": series["batched"],
+                "mean_ms": round(1000 * series["latency_sum"] / count, 1) if count else None,
+                "p95_ms": _bucket_quantile(self.buckets, series["buckets"], count, 0.95) if count else None,
+                "errors": sum(series["errors"].values()),
+                "response_kb": round(series["response_bytes"] / 1024, 1),
+            })
+        return rows
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP simpleth_rpc_requests_total JSON-RPC round trips.",
+            "# TYPE simpleth_rpc_requests_total counter",
+        ]
+        snapshot = sorted(self.snapshot().items())
+        for (method, function), series in snapshot:
+            lines.append(f"simpleth_rpc_requests_total{_labels(method, function)} {series['count']}")
+        lines += [
+            "# HELP simpleth_rpc_batched_calls_total Calls sent inside a JSON-RPC batch.",
+            "# TYPE simpleth_rpc_batched_calls_total counter",
+        ]
+        for (method, function), series in snapshot:
+            if series["batched"]:
+                lines.append(f"simpleth_rpc_batched_calls_total{_labels(method, function)} {series['batched']}")
+        lines += [
+            "# HELP simpleth_rpc_errors_total Failed JSON-RPC round trips by exception class.",
+            "# TYPE simpleth_rpc_errors_total counter",
+        ]
+        for (method, function), series in snapshot:
+            for error, count in sorted(series["errors"].items()):
+                lines.append(f"simpleth_rpc_errors_total{_labels(method, function, error=error)} {count}")
+        for name, field in (("request", "request_bytes"), ("response", "response_bytes")):
+            lines += [
+                f"# HELP simpleth_rpc_{name}_bytes_total JSON-RPC {name} payload bytes.",
+                f"# TYPE simpleth_rpc_{name}_bytes_total counter",
+            ]
+            for (method, function), series in snapshot:
+                lines.append(f"simpleth_rpc_{name}_bytes_total{_labels(method, function)} {series[field]}")
+        lines += [
+            "# HELP simpleth_rpc_latency_seconds JSON-RPC round-trip latency.",
+            "# TYPE simpleth_rpc_latency_seconds histogram",
+        ]
+        for (method, function), series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                cumulative += count
+                lines.append(f"simpleth_rpc_latency_seconds_bucket{_labels(method, function, le=bound)} {cumulative}")
+            lines.append(f"simpleth_rpc_latency_seconds_bucket{_labels(method, function, le='+Inf')} {series['count']}")
+            lines.append(f"simpleth_rpc_latency_seconds_sum{_labels(method, function)} {series['latency_sum']:.6f}")
+            lines.append(f"simpleth_rpc_latency_seconds_count{_labels(method, function)} {series['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = RPCMetrics()
+_rerun = threading.local()
+_server = None
+_server_lock = threading.Lock()
+
+
+def debug_enabled():
+    return os.environ.get("SIMPLETH_RPC_DEBUG") == "1"
+
+
+def start_rerun():
+    """Start collecting this thread's RPC records afresh (call at the top of the script)."""
+    _rerun.records = []
+    _rerun.started = time.monotonic()
+
+
+def rerun_records():
+    return list(getattr(_rerun, "records", []))
+
+
+def record(method, params, response, latency, error=None):
+    if method == "batch":
+        # params is the batch's [(method, params), ...]; the record names what was in it
+        calls = [(inner, _function(inner, inner_params) or "") for inner, inner_params in params]
+        METRICS.record_batched(calls)
+        function, description = None, _describe(calls)
+    else:
+        function = description = _function(method, params)
+    request_bytes = _size(params)
+    response_bytes = _size(response) if response is not None else 0
+    error_name = type(error).__name__ if error is not None else None
+    METRICS.record(method, function, latency, request_bytes, response_bytes, error_name)
+    records = getattr(_rerun, "records", None)
+    if records is not None:
+        records.append({
+            "method": method,
+            "function": description or "",
+            "latency_ms": round(1000 * latency, 1),
+            "request_bytes": request_bytes,
+            "response_bytes": response_bytes,
+            "error": error_name or "",
+        })
+
+
+def _function(method, params):
+    # The contract function an eth_call invokes, looked up from its selector
+    if method != "eth_call" or not params:
+        return None
+    data = params[0].get("data") or params[0].get("input") if isinstance(params[0], dict) else None
+    if not data:
+        return None
+    from contracts import function_name
+    selector = data[:10] if isinstance(data, str) else "0x" + bytes(data[:4]).hex()
+    return function_name(selector) or selector
+
+
+def _describe(calls):
+    # e.g. "balanceOf x3, eth_getBlockByNumber"
+    counts = {}
+    for method, function in calls:
+        name = function or method
+        counts[name] = counts.get(name, 0) + 1
+    return ", ".join(name if n == 1 else f"{name} x{n}" for name, n in counts.items())
+
+
+def install(w3, name="rpc_metrics"):
+    """Add the instrumentation middleware to `w3` (Web3 or AsyncWeb3) once."""
+    if name in w3.middleware_onion.keys():
+        return w3
+    w3.middleware_onion.add(_middleware_class(), name)
+    return w3
+
+
+def _middleware_class():
+    from web3.middleware import Web3Middleware
+
+    class RPCInstrumentation(Web3Middleware):
+        def wrap_make_request(self, make_request):
+            def middleware(method, params):
+                if _answered_locally(self._w3, method):
+                    return make_request(method, params)
+                start = time.monotonic()
+                try:
+                    response = make_request(method, params)
+                except Exception as e:
+                    record(method, params, None, time.monotonic() - start, e)
+                    raise
+                record(method, params, response, time.monotonic() - start, _response_error(response))
+                return response
+            return middleware
+
+        def wrap_make_batch_request(self, make_batch_request):
+            def middleware(requests_info):
+                start = time.monotonic()
+                try:
+                    response = make_batch_request(requests_info)
+                except Exception as e:
+                    record("batch", requests_info, None, time.monotonic() - start, e)
+                    raise
+                record("batch", requests_info, response, time.monotonic() - start)
+                return response
+            return middleware
+
+        async def async_wrap_make_request(self, make_request):
+            async def middleware(method, params):
+                if _answered_locally(self._w3, method):
+                    return await make_request(method, params)
+                start = time.monotonic()
+                try:
+                    response = await make_request(method, params)
+                except Exception as e:
+                    record(method, params, None, time.monotonic() - start, e)
+                    raise
+                record(method, params, response, time.monotonic() - start, _response_error(response))
+                return response
+            return middleware
+
+    return RPCInstrumentation
+
+
+def _answered_locally(w3, method):
+    # e.g. PooledRPCProvider's cached eth_chainId: not a round trip, so not recorded
+    answers_locally = getattr(w3.provider, "answers_locally", None)
+    return answers_locally is not None and answers_locally(method)
+
+
+class RPCErrorResponse(Exception):
+    pass
+
+
+def _response_error(response):
+    return RPCErrorResponse() if isinstance(response, dict) and response.get("error") else None
+
+
+def _size(value):
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _labels(method, function, **extra):
+    labels = {"method": method, "function": function, **{k: str(v) for k, v in extra.items()}}
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _bucket_quantile(buckets, counts, total, q):
+    # Upper bound of the bucket holding the q-th request, in ms
+    target = q * total
+    cumulative = 0
+    for bound, count in zip(buckets, counts):
+        cumulative += count
+        if cumulative >= target:
+            return round(1000 * bound, 1)
+    return None
+
+
+def serve_metrics(port, metrics=METRICS, host="127.0.0.1"):
+    """Serve `metrics` on http://<host>:<port>/metrics from a daemon thread.
+
+    Localhost only by default; pass host="0.0.0.0" to let a remote Prometheus scrape it.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="rpc-metrics", daemon=True).start()
+    return server
+
+
+def serve_from_env():
+    """Start the `/metrics` server once per process if SIMPLETH_METRICS_PORT is set."""
+    global _server
+    port = os.environ.get("SIMPLETH_METRICS_PORT")
+    with _server_lock:
+        if port and _server is None:
+            _server = serve_metrics(int(port), host=os.environ.get("SIMPLETH_METRICS_HOST", "127.0.0.1"))
+    return _server
@@ -0,0 +1,327 @@
+"""Multi-endpoint JSON-RPC provider with latency-based routing.
+
+`PooledRPCProvider` is a drop-in web3 provider over several HTTP endpoints:
+
+- each endpoint keeps its own keep-alive `requests.Session` and connection pool;
+- every response updates the endpoint's EWMA latency and EWMA error rate, and
+  each request goes to the fastest endpoint that is currently healthy;
+- 429 and 5xx responses, timeouts and connection errors are retried on the next
+  endpoint with jittered exponential backoff (429 also honours `Retry-After`);
+- with `hedge=True`, a read that has not answered within the endpoint's p95
+  latency is sent again to the runner-up and whichever answers first wins.
+  Writes (`eth_sendRawTransaction` and friends) are never hedged.
+
+web3's validation middleware asks for `eth_chainId` around every call; both
+providers keep the answer for their lifetime, so an eth_call is one round trip
+(`answers_locally` tells `rpc_metrics` not to count the lookups).
+
+`AsyncPooledRPCProvider` is the AsyncWeb3 counterpart, for `AsyncReadEngine`:
+the same routing and retries over one aiohttp session, without hedging (the
+engine already bounds and overlaps its own requests).
+
+Endpoints come from `SIMPLETH_RPC_URLS` (comma separated) when it is set,
+otherwise from the URL the app is configured with; see `rpc_urls`.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3._utils.batching import sort_batch_response_by_response_ids
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.providers.base import JSONBaseProvider
+
+# Idempotent methods that are safe to send twice
+HEDGEABLE_METHODS = {
+    "eth_call",
+    "eth_blockNumber",
+    "eth_chainId",
+    "eth_getBalance",
+    "eth_getBlockByNumber",
+    "eth_getCode",
+    "eth_getLogs",
+    "eth_getTransactionCount",
+    "eth_getTransactionReceipt",
+    "eth_estimateGas",
+    "eth_feeHistory",
+    "eth_gasPrice",
+}
+
+# Answers that are fixed for the chain every endpoint serves; fetched once per provider.
+# web3's own request cache is keyed per thread, and each Streamlit rerun gets a new one.
+CHAIN_CONSTANT_METHODS = {"eth_chainId", "net_version"}
+
+
+def rpc_urls(default_url):
+    urls = [url.strip() for url in os.environ.get("SIMPLETH_RPC_URLS", "").split(",") if url.strip()]
+    return urls or [default_url]
+
+
+class RetryableRPCError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Endpoint:
+    def __init__(self, url, pool_size=20, alpha=0.2):
+        self.url = url
+        self.alpha = alpha
+        self.session = requests.Session()
+        self.session.mount(url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.latency = None
+        self.error_rate = 0.0
+        self.samples = deque(maxlen=200)
+        self.cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok, cooldown=0.0):
+        with self._lock:
+            self.error_rate = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * self.error_rate
+            if ok:
+                self.latency = latency if self.latency is None else self.alpha * latency + (1 - self.alpha) * self.latency
+                self.samples.append(latency)
+            if cooldown:
+                self.cooldown_until = max(self.cooldown_until, time.monotonic() + cooldown)
+
+    def healthy(self):
+        return self.error_rate < 0.5 and time.monotonic() >= self.cooldown_until
+
+    def score(self):
+        # Untried endpoints get a neutral guess so they are explored early on
+        latency = self.latency if self.latency is not None else 0.1
+        return latency * (1 + 4 * self.error_rate)
+
+    def p95(self):
+        with self._lock:
+            if len(self.samples) < 20:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class PooledRPCProvider(JSONBaseProvider):
+    def __init__(self, urls, timeout=10, retries=3, backoff=0.25, hedge=False, hedge_after=1.0, pool_size=20, **kwargs):
+        super().__init__(**kwargs)
+        if isinstance(urls, str):
+            urls = [urls]
+        self.endpoints = [Endpoint(url, pool_size=pool_size) for url in urls]
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        # Hedge deadline used until an endpoint has enough samples for a p95
+        self.hedge_after = hedge_after
+        self._hedge_pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="rpc-hedge") if hedge else None
+        self._constants = {}
+
+    def __str__(self):
+        return f"PooledRPCProvider({', '.join(endpoint.url for endpoint in self.endpoints)})"
+
+    def is_connected(self, show_traceback=False):
+        try:
+            self.make_request("web3_clientVersion", [])
+            return True
+        except Exception:
+            if show_traceback:
+                raise
+            return False
+
+    def ranked_endpoints(self):
+        return _ranked(self.endpoints)
+
+    def _post(self, endpoint, data):
+        start = time.monotonic()
+        try:
+            response = endpoint.session.post(
+                endpoint.url, data=data, headers={"Content-Type": "application/json"}, timeout=self.timeout
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            endpoint.record(time.monotonic() - start, ok=False)
+            raise RetryableRPCError(f"{endpoint.url}: {e}") from e
+        latency = time.monotonic() - start
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = _retry_after(response)
+            endpoint.record(latency, ok=False, cooldown=retry_after or 0.0)
+            raise RetryableRPCError(f"{endpoint.url}: HTTP {response.status_code}", retry_after)
+        response.raise_for_status()
+        endpoint.record(latency, ok=True)
+        return response.content
+
+    def _post_hedged(self, primary, secondary, data):
+        deadline = primary.p95() or self.hedge_after
+        first = self._hedge_pool.submit(self._post, primary, data)
+        done, _ = wait([first], timeout=deadline)
+        if done:
+            return first.result()
+        pending = {first, self._hedge_pool.submit(self._post, secondary, data)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except RetryableRPCError as e:
+                    error = e
+        raise error
+
+    def _send(self, data, hedgeable):
+        error = None
+        failed = set()
+        for attempt in range(self.retries + 1):
+            ranked = self.ranked_endpoints()
+            primary = _next_endpoint(ranked, failed)
+            try:
+                if hedgeable and self.hedge and len(ranked) > 1:
+                    secondary = _next_endpoint(ranked, failed | {primary})
+                    return self._post_hedged(primary, secondary, data)
+                return self._post(primary, data)
+            except RetryableRPCError as e:
+                error = e
+                failed.add(primary)
+                if attempt < self.retries:
+                    time.sleep(_retry_delay(self.backoff, attempt, e, len(ranked)))
+        raise error
+
+    def answers_locally(self, method):
+        """True if `method` is answered from memory, without a round trip."""
+        return method in self._constants
+
+    def make_request(self, method, params):
+        cached = self._constants.get(method)
+        if cached is not None:
+            return cached
+        data = self.encode_rpc_request(method, params)
+        response = self.decode_rpc_response(self._send(data, method in HEDGEABLE_METHODS))
+        if method in CHAIN_CONSTANT_METHODS and "result" in response:
+            self._constants[method] = response
+        return response
+
+    def make_batch_request(self, batch_requests):
+        data = self.encode_batch_rpc_request(batch_requests)
+        hedgeable = all(method in HEDGEABLE_METHODS for method, _ in batch_requests)
+        response = self.decode_rpc_response(self._send(data, hedgeable))
+        if not isinstance(response, list):
+            # RPC errors return only one response with the error object
+            return response
+        return sort_batch_response_by_response_ids(response)
+
+
+class AsyncPooledRPCProvider(AsyncJSONBaseProvider):
+    def __init__(self, urls, timeout=10, retries=3, backoff=0.25, pool_size=20, **kwargs):
+        super().__init__(**kwargs)
+        if isinstance(urls, str):
+            urls = [urls]
+        self.endpoints = [Endpoint(url, pool_size=pool_size) for url in urls]
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._session = None
+        self._constants = {}
+
+    def __str__(self):
+        return f"AsyncPooledRPCProvider({', '.join(endpoint.url for endpoint in self.endpoints)})"
+
+    async def cache_async_session(self, session):
+        """Use `session` (created on the caller's event loop) for every endpoint."""
+        self._session = session
+        return session
+
+    async def disconnect(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def ranked_endpoints(self):
+        return _ranked(self.endpoints)
+
+    async def _post(self, endpoint, data):
+        # Imported here so the sync provider doesn't load aiohttp
+        import aiohttp
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size))
+        start = time.monotonic()
+        try:
+            async with self._session.post(
+                endpoint.url, data=data, headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            ) as response:
+                content = await response.read()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            endpoint.record(time.monotonic() - start, ok=False)
+            raise RetryableRPCError(f"{endpoint.url}: {e}") from e
+        latency = time.monotonic() - start
+        if response.status == 429 or response.status >= 500:
+            retry_after = _retry_after(response)
+            endpoint.record(latency, ok=False, cooldown=retry_after or 0.0)
+            raise RetryableRPCError(f"{endpoint.url}: HTTP {response.status}", retry_after)
+        response.raise_for_status()
+        endpoint.record(latency, ok=True)
+        return content
+
+    async def _send(self, data):
+        error = None
+        failed = set()
+        for attempt in range(self.retries + 1):
+            ranked = self.ranked_endpoints()
+            endpoint = _next_endpoint(ranked, failed)
+            try:
+                return await self._post(endpoint, data)
+            except RetryableRPCError as e:
+                error = e
+                failed.add(endpoint)
+                if attempt < self.retries:
+                    await asyncio.sleep(_retry_delay(self.backoff, attempt, e, len(ranked)))
+        raise error
+
+    def answers_locally(self, method):
+        """True if `method` is answered from memory, without a round trip."""
+        return method in self._constants
+
+    async def make_request(self, method, params):
+        cached = self._constants.get(method)
+        if cached is not None:
+            return cached
+        response = self.decode_rpc_response(await self._send(self.encode_rpc_request(method, params)))
+        if method in CHAIN_CONSTANT_METHODS and "result" in response:
+            self._constants[method] = response
+        return response
+
+    async def make_batch_request(self, batch_requests):
+        response = self.decode_rpc_response(await self._send(self.encode_batch_rpc_request(batch_requests)))
+        if not isinstance(response, list):
+            return response
+        return sort_batch_response_by_response_ids(response)
+
+
+def _ranked(endpoints):
+    healthy = [endpoint for endpoint in endpoints if endpoint.healthy()]
+    return sorted(healthy or endpoints, key=lambda endpoint: endpoint.score())
+
+
+def _next_endpoint(ranked, failed):
+    # On retries, move on to endpoints this request hasn't failed on, rather than hammering one
+    for endpoint in ranked:
+        if endpoint not in failed:
+            return endpoint
+    return ranked[0]
+
+
+def _retry_delay(backoff, attempt, error, endpoint_count):
+    delay = backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+    # With a single endpoint there is nowhere else to go, so its Retry-After is honoured
+    return max(delay, error.retry_after or 0.0) if endpoint_count == 1 else delay
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
@@ -1,80 +1,58 @@
 import streamlit as st
-from eth_account import Account
-from web3 import Web3
+from contracts import STETH_ABI, SIMPLETH_ABI, BATCH_TRANSFER_ABI, get_contract
+from provisioning import provision_wallets
+from simpleth_core import SIMPLETH_CONTRACT_ADDRESS, STETH_CONTRACT_ADDRESS, create_wallet, verify_login, wallet_balances
+from app_resources import (
+    get_balance_cache, get_fee_oracle, get_read_engine, get_unlocked_keys, get_wallet_index, get_wallet_store, get_web3,
+    show_rpc_debug_panel,
+)
+from keystore import is_encrypted
+from balance_report import BalanceReport
+from airdrop import Airdrop
+from decimal import Decimal
+import time
+import io
 import secrets
-import os
-import json
+import rpc_metrics
 
 # --- CONFIGURATION ---
-INFURA_URL = "https://sepolia.infura.io/v3/e0fcce634506410b87fc31064eed915a"
-SIMPLETH_CONTRACT_ADDRESS = "0xe0271f5571AB60dD89EF11F1743866a213406542"
-STETH_CONTRACT_ADDRESS = "0xFD5d07334591C3eE2699639Bb670de279ea45f65"  # <-- Replace with your mock stETH address
-WALLET_DB_FILE = "wallet_db.json"
-
-# Use the correct ABI for stETH/mockStETH
-STETH_ABI = [
-    {
-        "inputs": [
-            {"internalType": "address", "name": "account", "type": "address"}
-        ],
-        "name": "balanceOf",
-        "outputs": [
-            {"internalType": "uint256", "name": "", "type": "uint256"}
-        ],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [
-            {"internalType": "address", "name": "recipient", "type": "address"},
-            {"internalType": "uint256", "name": "amount", "type": "uint256"}
-        ],
-        "name": "transfer",
-        "outputs": [
-            {"internalType": "bool", "name": "", "type": "bool"}
-        ],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "inputs": [
-            {"internalType": "address", "name": "sender", "type": "address"},
-            {"internalType": "address", "name": "recipient", "type": "address"},
-            {"internalType": "uint256", "name": "amount", "type": "uint256"}
-        ],
-        "name": "transferFrom",
-        "outputs": [
-            {"internalType": "bool", "name": "", "type": "bool"}
-        ],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    }
-]
-
-# Use the same ABI for Simpleth if it matches
-SIMPLETH_ABI = STETH_ABI
+# The RPC endpoint and contract addresses are set in simpleth_core.py
+BATCH_TRANSFER_ADDRESS = None  # <-- Set to a Disperse-style batch transfer contract to pay many wallets per transaction
+AIRDROP_TIME_LIMIT = 120  # <-- Seconds one click of Bulk Pre-Deposit runs before handing back; click again to continue
+BULK_CREATE_LIMIT = 10000  # <-- Most wallets Bulk Create makes in the browser; larger cohorts use `python provisioning.py N out.csv`
 
-# --- WALLET DB PERSISTENCE ---
-def load_wallet_db():
-    if os.path.exists(WALLET_DB_FILE):
-        with open(WALLET_DB_FILE, "r") as f:
-            return json.load(f)
-    return {}
+# RPC calls made from here on are listed in this rerun's debug panel
+rpc_metrics.start_rerun()
 
-def save_wallet_db(db):
-    with open(WALLET_DB_FILE, "w") as f:
-        json.dump(db, f)
+# --- WALLET DB PERSISTENCE ---
+wallet_store = get_wallet_store()
 
-# --- WEB3 SETUP ---
-w3 = Web3(Web3.HTTPProvider(INFURA_URL))
+def show_balances(wallet_address):
+    # Cache misses for both balances go out as a single Multicall3 eth_call
+    w3 = get_web3()
+    steth_contract = get_contract(w3, STETH_CONTRACT_ADDRESS, STETH_ABI)
+    simpleth_contract = get_contract(w3, SIMPLETH_CONTRACT_ADDRESS, SIMPLETH_ABI)
+    try:
+        steth_balance, balance = wallet_balances(get_balance_cache(), steth_contract, simpleth_contract, wallet_address)
+    except Exception as e:
+        st.error(f"Error fetching balances: {e}")
+        return
+    if isinstance(steth_balance, Exception):
+        st.error(f"Error fetching stETH wallet balance: {steth_balance}")
+    else:
+        st.write(f"**stETH balance in wallet:** {steth_balance / 1e18} stETH")
+    if isinstance(balance, Exception):
+        st.error(f"Error fetching Simpleth balance: {balance}")
+    else:
+        st.write(f"**stETH balance in Simpleth:** {balance / 1e18} stETH")
 
 # --- SESSION STATE ---
-if "wallet_db" not in st.session_state:
-    st.session_state["wallet_db"] = load_wallet_db()
 if "last_created_wallet" not in st.session_state:
     st.session_state["last_created_wallet"] = None
 if "last_logged_in_wallet" not in st.session_state:
     st.session_state["last_logged_in_wallet"] = None
+if "session_key" not in st.session_state:
+    st.session_state["session_key"] = secrets.token_hex(8)
 
 # --- APP UI ---
 st.set_page_config(page_title="Simpleth Wallet Admin", page_icon="🦊")
@@ -88,43 +66,104 @@ Generate wallets and access codes for your users, or log in to view wallet balan
 # --- WALLET CREATION ---
 with st.expander("Create a New Simpleth Wallet"):
     if st.button("Create Wallet"):
-        acct = Account.create()
-        wallet_address = Web3.to_checksum_address(acct.address)  # Always store as checksum!
-        private_key = acct.key.hex()
-        access_code = secrets.token_urlsafe(8)
-        # Store in wallet_db
-        st.session_state["wallet_db"][wallet_address] = {
-            "private_key": private_key,
-            "access_code": access_code
-        }
-        save_wallet_db(st.session_state["wallet_db"])
+        # Stored encrypted with the access code; the plaintext is only shown here
+        wallet_address, wallet_info = create_wallet(wallet_store)  # Address is always a checksum address
+        access_code = wallet_info["access_code"]
+        get_unlocked_keys().put(st.session_state["session_key"], wallet_address, wallet_info["private_key"])
         st.session_state["last_created_wallet"] = wallet_address
+        get_wallet_index().invalidate()
         st.success("Wallet created!")
         st.write(f"**Wallet Address:** `{wallet_address}`")
         st.write(f"**Access Code:** `{access_code}`")
         st.info("Share this wallet address and access code with the user. They will need them to access their wallet.")
 
         # Show balances after creation
-        try:
-            steth_contract = w3.eth.contract(address=Web3.to_checksum_address(STETH_CONTRACT_ADDRESS), abi=STETH_ABI)
-            steth_balance = steth_contract.functions.balanceOf(wallet_address).call()
-            st.write(f"**stETH balance in wallet:** {steth_balance / 1e18} stETH")
-        except Exception as e:
-            st.error(f"Error fetching stETH wallet balance: {e}")
-        try:
-            simpleth_contract = w3.eth.contract(address=Web3.to_checksum_address(SIMPLETH_CONTRACT_ADDRESS), abi=SIMPLETH_ABI)
-            balance = simpleth_contract.functions.balanceOf(wallet_address).call()
-            st.write(f"**stETH balance in Simpleth:** {balance / 1e18} stETH")
-        except Exception as e:
-            st.error(f"Error fetching Simpleth balance: {e}")
+        show_balances(wallet_address)
+
+# --- BULK WALLET CREATION ---
+with st.expander("Bulk Create Wallets"):
+    bulk_count = st.number_input("Number of wallets", min_value=1, max_value=BULK_CREATE_LIMIT, value=100, step=100)
+    st.caption(
+        f"Up to {BULK_CREATE_LIMIT:,} wallets at a time here. For a larger cohort, run "
+        "`python provisioning.py N wallets.csv` on the server, which streams the CSV to that file."
+    )
+    if st.button("Create Wallets"):
+        # Keys are generated across a process pool and stored in batches; the
+        # access codes are held in memory for the download (BULK_CREATE_LIMIT
+        # rows at most), never written to disk here
+        csv_file = io.StringIO(newline="")
+        progress_bar = st.progress(0.0)
+        created = provision_wallets(
+            wallet_store, int(bulk_count), csv_file=csv_file,
+            progress=lambda done, total: progress_bar.progress(done / total, text=f"{done}/{total} wallets")
+        )
+        get_wallet_index().invalidate()
+        st.success(f"Created {created} wallets.")
+        st.download_button(
+            "Download addresses and access codes (CSV)", csv_file.getvalue(),
+            file_name=f"wallets_{int(time.time())}.csv", mime="text/csv", on_click="ignore",
+        )
+
+# --- WALLET BROWSER ---
+with st.expander("Browse Wallets"):
+    query = st.text_input("Search wallets", key="wallet_query", on_change=lambda: st.session_state.update(wallet_page=1), placeholder="0x… matches the start of an address; anything else, any part of it")
+    try:
+        wallet_index = get_wallet_index()
+        started = time.perf_counter()
+        matches = wallet_index.search(query)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        st.caption(f"{len(matches)} of {wallet_index.count()} wallets ({elapsed_ms:.1f} ms)")
+        # Back to the first page whenever the query changes
+        results_page = st.number_input("Results page", min_value=1, max_value=matches.page_count(), key="wallet_page")
+        # Only this page's rows are ever rendered
+        rows = [
+            {"Wallet Address": address, "Encrypted": is_encrypted(wallet_store.get(address) or {})}
+            for address in matches.page(int(results_page) - 1)
+        ]
+        if rows:
+            st.dataframe(rows)
+    except Exception as e:
+        st.error(f"Error searching wallets: {e}")
+
+# --- ALL WALLETS BALANCE REPORT ---
+with st.expander("All Wallets Balance Report"):
+    report = st.session_state.get("balance_report")
+    if st.button("New Report"):
+        report = BalanceReport(wallet_store.addresses())
+        st.session_state["balance_report"] = report
+    if report is not None:
+        # A stopped report keeps its cursor and resumes from the next unfetched wallet
+        if not report.done and st.button("Fetch Balances" if report.cursor == 0 else "Resume Report"):
+            engine = get_read_engine()
+            steth_contract = engine.contract(STETH_CONTRACT_ADDRESS, STETH_ABI)
+            simpleth_contract = engine.contract(SIMPLETH_CONTRACT_ADDRESS, SIMPLETH_ABI)
+            progress_bar = st.progress(report.cursor / max(report.total, 1))
+            try:
+                report.run(
+                    engine, steth_contract, simpleth_contract,
+                    progress=lambda done, total: progress_bar.progress(done / total, text=f"{done}/{total} wallets")
+                )
+            except Exception as e:
+                st.error(f"Report stopped after {report.cursor} of {report.total} wallets: {e}")
+        st.caption(f"{report.cursor}/{report.total} wallets fetched at block {report.block}")
+        if report.rows:
+            page = st.number_input("Page", min_value=1, max_value=report.page_count(), value=1, key="report_page")
+            st.dataframe([
+                {
+                    "Wallet Address": row["address"],
+                    "stETH in wallet": None if row["steth_wallet"] is None else row["steth_wallet"] / 1e18,
+                    "stETH in Simpleth": None if row["steth_simpleth"] is None else row["steth_simpleth"] / 1e18,
+                }
+                for row in report.page(int(page) - 1)
+            ])
 
 # --- SHOW PRIVATE KEY FOR LAST CREATED WALLET ---
 if st.session_state.get("last_created_wallet"):
     wallet_address = st.session_state["last_created_wallet"]
-    wallet_info = st.session_state["wallet_db"].get(wallet_address)
-    if wallet_info:
+    private_key = get_unlocked_keys().get(st.session_state["session_key"], wallet_address)
+    if private_key is not None:
         with st.expander("Show Private Key for Last Created Wallet (for testing only)"):
-            st.code(wallet_info["private_key"], language="text")
+            st.code("0x" + private_key.hex(), language="text")
 
 # --- LOGIN FORM ---
 st.markdown("---")
@@ -133,44 +172,89 @@ input_address = st.text_input("Wallet Address")
 input_code = st.text_input("Access Code", type="password")
 
 if st.button("Login"):
-    wallet_db = load_wallet_db()  # Always load the latest db from disk
     try:
-        input_address_checksum = Web3.to_checksum_address(input_address)
+        input_address_checksum = get_web3().to_checksum_address(input_address)
     except Exception:
         st.error("Invalid wallet address format.")
         st.stop()
-    wallet_info = wallet_db.get(input_address_checksum)
-    if wallet_info and input_code == wallet_info["access_code"]:
+    # Decrypting the keystore checks the access code; the key is kept for this session
+    private_key = verify_login(wallet_store, input_address_checksum, input_code)  # Always reads the latest store
+    if private_key is not None:
+        get_unlocked_keys().put(st.session_state["session_key"], input_address_checksum, private_key)
         st.success("Access granted!")
         st.session_state["last_logged_in_wallet"] = input_address_checksum
         # Show balances after login
-        try:
-            steth_contract = w3.eth.contract(address=Web3.to_checksum_address(STETH_CONTRACT_ADDRESS), abi=STETH_ABI)
-            steth_balance = steth_contract.functions.balanceOf(input_address_checksum).call()
-            st.write(f"**stETH balance in wallet:** {steth_balance / 1e18} stETH")
-        except Exception as e:
-            st.error(f"Error fetching stETH wallet balance: {e}")
-        try:
-            simpleth_contract = w3.eth.contract(address=Web3.to_checksum_address(SIMPLETH_CONTRACT_ADDRESS), abi=SIMPLETH_ABI)
-            balance = simpleth_contract.functions.balanceOf(input_address_checksum).call()
-            st.write(f"**stETH balance in Simpleth:** {balance / 1e18} stETH")
-            st.info("If you have received a pre-deposit, it will show above.")
-        except Exception as e:
-            st.error(f"Error fetching Simpleth balance: {e}")
+        show_balances(input_address_checksum)
+        st.info("If you have received a pre-deposit, it will show above.")
     else:
         st.error("Invalid wallet address or access code.")
 
 # --- SHOW PRIVATE KEY FOR LAST LOGGED IN WALLET ---
 if st.session_state.get("last_logged_in_wallet"):
     wallet_address = st.session_state["last_logged_in_wallet"]
-    wallet_info = st.session_state["wallet_db"].get(wallet_address)
-    if wallet_info:
+    private_key = get_unlocked_keys().get(st.session_state["session_key"], wallet_address)
+    if private_key is not None:
         with st.expander("Show Private Key for Last Logged In Wallet (for testing only)"):
-            st.code(wallet_info["private_key"], language="text")
+            st.code("0x" + private_key.hex(), language="text")
+
+# --- BULK PRE-DEPOSIT ---
+with st.expander("Bulk Pre-Deposit stETH (Airdrop)"):
+    st.caption(
+        "Pays every wallet in the DB from the admin key. Progress is checkpointed under the run name: "
+        "starting the same run again resumes it without paying any wallet twice. A run name keeps the wallets "
+        "and amount it was first started with; use a new name for a new pre-deposit."
+    )
+    airdrop_run = st.text_input("Run name", value="predeposit-1")
+    airdrop_amount = st.number_input("Amount per wallet (stETH)", min_value=0.0, step=0.01, key="airdrop_amount")
+    admin_key = st.text_input("Admin private key", type="password")
+    if st.button("Start / Resume Pre-Deposit"):
+        try:
+            if airdrop_amount <= 0:
+                raise ValueError("enter an amount above zero")
+            w3 = get_web3()
+            batch_contract = None
+            if BATCH_TRANSFER_ADDRESS:
+                batch_contract = get_contract(w3, BATCH_TRANSFER_ADDRESS, BATCH_TRANSFER_ABI)
+            airdrop = Airdrop(
+                w3, get_contract(w3, STETH_CONTRACT_ADDRESS, STETH_ABI), admin_key, airdrop_run,
+                batch_contract=batch_contract, fee_oracle=get_fee_oracle(),
+            )
+            amount_wei = int(Decimal(str(airdrop_amount)) * 10**18)
+            # Refused if this run name was already planned for other wallets or another amount
+            airdrop.plan((address, amount_wei) for address in wallet_store.addresses())
+        except Exception as e:
+            airdrop = None
+            st.error(f"Pre-deposit not started: {e}")
+        if airdrop is not None:
+            try:
+                progress_bar = st.progress(0.0)
+                result = airdrop.run(
+                    progress=lambda done, total: progress_bar.progress(done / max(total, 1), text=f"{done}/{total} wallets paid"),
+                    time_limit=AIRDROP_TIME_LIMIT,
+                )
+                if result["stopped"]:
+                    st.info(
+                        f"Paid {result['paid']} of {result['recipients']} wallets; stopped after {AIRDROP_TIME_LIMIT} s "
+                        f"with {result['outstanding']} still to go. Start the same run again to continue."
+                    )
+                else:
+                    st.success(f"Paid {result['paid']} of {result['recipients']} wallets in {result['transactions']} transactions.")
+                st.caption(
+                    f"{result['sent_this_run']} transactions sent in {result['elapsed_s']} s: "
+                    f"{result['sent_tx_per_s']} tx/s sent, {result['confirmed_tx_per_s']} tx/s confirmed, "
+                    f"{result['recipients_per_s']} wallets/s"
+                )
+                if result["failed"]:
+                    st.warning(f"{result['failed']} payments reverted; they were not paid.")
+            except Exception as e:
+                st.error(f"Pre-deposit stopped: {e}. Start the same run again to resume it.")
 
 # --- INSTRUCTIONS FOR ADMIN PRE-DEPOSIT ---
 st.markdown("---")
 st.markdown("""
 **Admin Instructions:**  
-To pre-deposit stETH (or mock stETH) for a user, send tokens to their wallet address, then have the user approve and deposit into Simpleth using your contract's functions.
-""")
\ No newline at end of file
+To pre-deposit stETH (or mock stETH) for a user, send tokens to their wallet address, then have the user approve and deposit into Simpleth using your contract's functions. To fund every wallet in the DB at once, use **Bulk Pre-Deposit stETH** above.
+""")
+
+# --- RPC DEBUG PANEL ---
+show_rpc_debug_panel()
\ No newline at end of file
@@ -1,67 +1,118 @@
 import streamlit as st
-from eth_account import Account
-from web3 import Web3
+from contracts import STETH_ABI, SIMPLETH_ABI, BATCH_TRANSFER_ABI, get_contract
+from provisioning import provision_wallets
+from simpleth_core import SIMPLETH_CONTRACT_ADDRESS, STETH_CONTRACT_ADDRESS, create_wallet, verify_login, wallet_balances
+from app_resources import (
+    get_balance_cache, get_balance_history, get_block_watcher, get_event_indexer, get_fee_oracle, get_read_engine,
+    get_transfer_service, get_unlocked_keys, get_wallet_index, get_wallet_store, get_web3, show_rpc_debug_panel,
+)
+from keystore import is_encrypted
+from balance_report import BalanceReport
+from airdrop import Airdrop
 import secrets
-import os
-import json
+from decimal import Decimal
+import time
+import io
+import rpc_metrics
 
 # --- CONFIGURATION ---
-INFURA_URL = "https://sepolia.infura.io/v3/e0fcce634506410b87fc31064eed915a"
-SIMPLETH_CONTRACT_ADDRESS = "0xe0271f5571AB60dD89EF11F1743866a213406542"
-STETH_CONTRACT_ADDRESS = "0xFD5d07334591C3eE2699639Bb670de279ea45f65"
-WALLET_DB_FILE = "wallet_db.json"
-
-STETH_ABI = [
-    {
-        "inputs": [{"internalType": "address", "name": "account", "type": "address"}],
-        "name": "balanceOf",
-        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [
-            {"internalType": "address", "name": "recipient", "type": "address"},
-            {"internalType": "uint256", "name": "amount", "type": "uint256"}
-        ],
-        "name": "transfer",
-        "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "inputs": [
-            {"internalType": "address", "name": "sender", "type": "address"},
-            {"internalType": "address", "name": "recipient", "type": "address"},
-            {"internalType": "uint256", "name": "amount", "type": "uint256"}
-        ],
-        "name": "transferFrom",
-        "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    }
-]
-
-SIMPLETH_ABI = STETH_ABI
-
-def load_wallet_db():
-    if os.path.exists(WALLET_DB_FILE):
-        with open(WALLET_DB_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_wallet_db(db):
-    with open(WALLET_DB_FILE, "w") as f:
-        json.dump(db, f)
-
-w3 = Web3(Web3.HTTPProvider(INFURA_URL))
-
-if "wallet_db" not in st.session_state:
-    st.session_state["wallet_db"] = load_wallet_db()
+# The RPC endpoint and contract addresses are set in simpleth_core.py
+LIVE_REFRESH_SECONDS = 3
+BATCH_TRANSFER_ADDRESS = None  # <-- Set to a Disperse-style batch transfer contract to pay many wallets per transaction
+AIRDROP_TIME_LIMIT = 120  # <-- Seconds one click of Bulk Pre-Deposit runs before handing back; click again to continue
+BULK_CREATE_LIMIT = 10000  # <-- Most wallets Bulk Create makes in the browser; larger cohorts use `python provisioning.py N out.csv`
+HISTORY_RANGES = {"24 hours": 86400, "7 days": 7 * 86400, "30 days": 30 * 86400, "All": None}
+
+# RPC calls made from here on are listed in this rerun's debug panel
+rpc_metrics.start_rerun()
+
+wallet_store = get_wallet_store()
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def show_live_balance(wallet_address):
+    # Reruns on a timer but only reads session state: the block watcher does the RPC,
+    # once per new block, for every logged-in wallet together
+    live = st.session_state["live_balance"]
+    try:
+        steth_contract = get_contract(get_web3(), STETH_CONTRACT_ADDRESS, STETH_ABI)
+        get_block_watcher().watch(st.session_state["session_key"], wallet_address, [steth_contract], live)
+        if live.get("holder") != wallet_address:
+            # Nothing pushed for this wallet yet: read it once now
+            live.update(holder=wallet_address, balances=get_balance_cache().get_balances([steth_contract], wallet_address), block=None)
+        [steth_balance] = live["balances"]
+        if isinstance(steth_balance, Exception):
+            raise steth_balance
+        st.write(f"**stETH balance:** {steth_balance / 1e18} stETH")
+    except Exception as e:
+        st.error(f"Error fetching stETH balance: {e}")
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def show_withdrawals(wallet_address):
+    # Receipts are polled by the transfer service's workers; this only renders their records
+    transfers = get_transfer_service().for_address(wallet_address)
+    if transfers:
+        st.dataframe([
+            {
+                "Nonce": t["nonce"],
+                "To": t["to"],
+                "Amount (stETH)": t["amount"] / 1e18,
+                "Status": t["status"],
+                "Block": t["block"],
+                "Transaction": t["tx_hash"],
+            }
+            for t in transfers
+        ])
+
+def show_balance_history(wallet_address):
+    history_range = st.selectbox("Range", list(HISTORY_RANGES), index=1)
+    try:
+        from balance_history import LEVEL_NAMES
+        balance_history = get_balance_history()
+        balance_history.track(wallet_address)
+        seconds = HISTORY_RANGES[history_range]
+        level, rows = balance_history.chart(wallet_address, since=None if seconds is None else int(time.time()) - seconds)
+        if rows:
+            st.line_chart(rows, x="Time", y="Balance", color="Token")
+            st.caption(f"Balances {LEVEL_NAMES[level]}, in stETH")
+        else:
+            st.info("Collecting this wallet's balance history; it appears here within a few minutes.")
+    except Exception as e:
+        st.error(f"Error reading balance history: {e}")
+
+def show_balances(wallet_address):
+    # Cache misses for both balances go out as a single Multicall3 eth_call
+    w3 = get_web3()
+    steth_contract = get_contract(w3, STETH_CONTRACT_ADDRESS, STETH_ABI)
+    simpleth_contract = get_contract(w3, SIMPLETH_CONTRACT_ADDRESS, SIMPLETH_ABI)
+    try:
+        steth_balance, balance = wallet_balances(get_balance_cache(), steth_contract, simpleth_contract, wallet_address)
+    except Exception as e:
+        st.error(f"Error fetching balances: {e}")
+        return
+    if isinstance(steth_balance, Exception):
+        st.error(f"Error fetching stETH wallet balance: {steth_balance}")
+    else:
+        st.write(f"**stETH balance in wallet:** {steth_balance / 1e18} stETH")
+    if isinstance(balance, Exception):
+        st.error(f"Error fetching Simpleth balance: {balance}")
+    else:
+        st.write(f"**stETH balance in Simpleth:** {balance / 1e18} stETH")
+
 if "last_created_wallet" not in st.session_state:
     st.session_state["last_created_wallet"] = None
 if "logged_in_wallet" not in st.session_state:
     st.session_state["logged_in_wallet"] = None
+if "session_key" not in st.session_state:
+    st.session_state["session_key"] = secrets.token_hex(8)
+if "live_balance" not in st.session_state:
+    st.session_state["live_balance"] = {}
+
+# The unlocked key expires after a while unused: the access code is needed again
+if st.session_state.get("logged_in_wallet") and get_unlocked_keys().get(st.session_state["session_key"], st.session_state["logged_in_wallet"]) is None:
+    get_block_watcher().unwatch(st.session_state["session_key"])
+    st.session_state["live_balance"].clear()
+    st.session_state["logged_in_wallet"] = None
+    st.warning("Your session has expired. Please log in again.")
 
 st.set_page_config(page_title="Simpleth Wallet", page_icon="🦊")
 st.title("🦊 Simpleth Wallet")
@@ -75,41 +126,100 @@ if mode == "Admin":
 
     with st.expander("Create a New Simpleth Wallet"):
         if st.button("Create Wallet"):
-            acct = Account.create()
-            wallet_address = Web3.to_checksum_address(acct.address)
-            private_key = acct.key.hex()
-            access_code = secrets.token_urlsafe(8)
-            st.session_state["wallet_db"][wallet_address] = {
-                "private_key": private_key,
-                "access_code": access_code
-            }
-            save_wallet_db(st.session_state["wallet_db"])
+            # Stored encrypted with the access code; the plaintext is only shown here
+            wallet_address, wallet_info = create_wallet(wallet_store)
+            access_code = wallet_info["access_code"]
+            get_unlocked_keys().put(st.session_state["session_key"], wallet_address, wallet_info["private_key"])
             st.session_state["last_created_wallet"] = wallet_address
+            get_wallet_index().invalidate()
             st.success("Wallet created!")
             st.write(f"**Wallet Address:** `{wallet_address}`")
             st.write(f"**Access Code:** `{access_code}`")
             st.info("Share this wallet address and access code with the user.")
 
             # Show balances after creation
-            try:
-                steth_contract = w3.eth.contract(address=Web3.to_checksum_address(STETH_CONTRACT_ADDRESS), abi=STETH_ABI)
-                steth_balance = steth_contract.functions.balanceOf(wallet_address).call()
-                st.write(f"**stETH balance in wallet:** {steth_balance / 1e18} stETH")
-            except Exception as e:
-                st.error(f"Error fetching stETH wallet balance: {e}")
-            try:
-                simpleth_contract = w3.eth.contract(address=Web3.to_checksum_address(SIMPLETH_CONTRACT_ADDRESS), abi=SIMPLETH_ABI)
-                balance = simpleth_contract.functions.balanceOf(wallet_address).call()
-                st.write(f"**stETH balance in Simpleth:** {balance / 1e18} stETH")
-            except Exception as e:
-                st.error(f"Error fetching Simpleth balance: {e}")
+            show_balances(wallet_address)
+
+    with st.expander("Bulk Create Wallets"):
+        bulk_count = st.number_input("Number of wallets", min_value=1, max_value=BULK_CREATE_LIMIT, value=100, step=100)
+        st.caption(
+            f"Up to {BULK_CREATE_LIMIT:,} wallets at a time here. For a larger cohort, run "
+            "`python provisioning.py N wallets.csv` on the server, which streams the CSV to that file."
+        )
+        if st.button("Create Wallets"):
+            # Keys are generated across a process pool and stored in batches; the
+            # access codes are held in memory for the download (BULK_CREATE_LIMIT
+            # rows at most), never written to disk here
+            csv_file = io.StringIO(newline="")
+            progress_bar = st.progress(0.0)
+            created = provision_wallets(
+                wallet_store, int(bulk_count), csv_file=csv_file,
+                progress=lambda done, total: progress_bar.progress(done / total, text=f"{done}/{total} wallets")
+            )
+            get_wallet_index().invalidate()
+            st.success(f"Created {created} wallets.")
+            st.download_button(
+                "Download addresses and access codes (CSV)", csv_file.getvalue(),
+                file_name=f"wallets_{int(time.time())}.csv", mime="text/csv", on_click="ignore",
+            )
+
+    with st.expander("Browse Wallets"):
+        query = st.text_input("Search wallets", key="wallet_query", on_change=lambda: st.session_state.update(wallet_page=1), placeholder="0x… matches the start of an address; anything else, any part of it")
+        try:
+            wallet_index = get_wallet_index()
+            started = time.perf_counter()
+            matches = wallet_index.search(query)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            st.caption(f"{len(matches)} of {wallet_index.count()} wallets ({elapsed_ms:.1f} ms)")
+            # Back to the first page whenever the query changes
+            results_page = st.number_input("Results page", min_value=1, max_value=matches.page_count(), key="wallet_page")
+            # Only this page's rows are ever rendered
+            rows = [
+                {"Wallet Address": address, "Encrypted": is_encrypted(wallet_store.get(address) or {})}
+                for address in matches.page(int(results_page) - 1)
+            ]
+            if rows:
+                st.dataframe(rows)
+        except Exception as e:
+            st.error(f"Error searching wallets: {e}")
+
+    with st.expander("All Wallets Balance Report"):
+        report = st.session_state.get("balance_report")
+        if st.button("New Report"):
+            report = BalanceReport(wallet_store.addresses())
+            st.session_state["balance_report"] = report
+        if report is not None:
+            # A stopped report keeps its cursor and resumes from the next unfetched wallet
+            if not report.done and st.button("Fetch Balances" if report.cursor == 0 else "Resume Report"):
+                engine = get_read_engine()
+                steth_contract = engine.contract(STETH_CONTRACT_ADDRESS, STETH_ABI)
+                simpleth_contract = engine.contract(SIMPLETH_CONTRACT_ADDRESS, SIMPLETH_ABI)
+                progress_bar = st.progress(report.cursor / max(report.total, 1))
+                try:
+                    report.run(
+                        engine, steth_contract, simpleth_contract,
+                        progress=lambda done, total: progress_bar.progress(done / total, text=f"{done}/{total} wallets")
+                    )
+                except Exception as e:
+                    st.error(f"Report stopped after {report.cursor} of {report.total} wallets: {e}")
+            st.caption(f"{report.cursor}/{report.total} wallets fetched at block {report.block}")
+            if report.rows:
+                page = st.number_input("Page", min_value=1, max_value=report.page_count(), value=1, key="report_page")
+                st.dataframe([
+                    {
+                        "Wallet Address": row["address"],
+                        "stETH in wallet": None if row["steth_wallet"] is None else row["steth_wallet"] / 1e18,
+                        "stETH in Simpleth": None if row["steth_simpleth"] is None else row["steth_simpleth"] / 1e18,
+                    }
+                    for row in report.page(int(page) - 1)
+                ])
 
     if st.session_state.get("last_created_wallet"):
         wallet_address = st.session_state["last_created_wallet"]
-        wallet_info = st.session_state["wallet_db"].get(wallet_address)
-        if wallet_info:
+        private_key = get_unlocked_keys().get(st.session_state["session_key"], wallet_address)
+        if private_key is not None:
             with st.expander("Show Private Key for Last Created Wallet (for testing only)"):
-                st.code(wallet_info["private_key"], language="text")
+                st.code("0x" + private_key.hex(), language="text")
 
     st.markdown("---")
     st.subheader("Access Any Simpleth Wallet")
@@ -117,46 +227,89 @@ if mode == "Admin":
     input_code = st.text_input("Access Code (Admin)", type="password", key="admin_login_code")
 
     if st.button("Admin Login"):
-        wallet_db = load_wallet_db()
         try:
-            input_address_checksum = Web3.to_checksum_address(input_address)
+            input_address_checksum = get_web3().to_checksum_address(input_address)
         except Exception:
             st.error("Invalid wallet address format.")
             st.stop()
-        wallet_info = wallet_db.get(input_address_checksum)
-        if wallet_info and input_code == wallet_info["access_code"]:
+        # Decrypting the keystore checks the access code; the key is kept for this session
+        private_key = verify_login(wallet_store, input_address_checksum, input_code)
+        if private_key is not None:
+            get_unlocked_keys().put(st.session_state["session_key"], input_address_checksum, private_key)
             st.success("Access granted!")
             st.session_state["logged_in_wallet"] = input_address_checksum
             # Show balances after login
-            try:
-                steth_contract = w3.eth.contract(address=Web3.to_checksum_address(STETH_CONTRACT_ADDRESS), abi=STETH_ABI)
-                steth_balance = steth_contract.functions.balanceOf(input_address_checksum).call()
-                st.write(f"**stETH balance in wallet:** {steth_balance / 1e18} stETH")
-            except Exception as e:
-                st.error(f"Error fetching stETH wallet balance: {e}")
-            try:
-                simpleth_contract = w3.eth.contract(address=Web3.to_checksum_address(SIMPLETH_CONTRACT_ADDRESS), abi=SIMPLETH_ABI)
-                balance = simpleth_contract.functions.balanceOf(input_address_checksum).call()
-                st.write(f"**stETH balance in Simpleth:** {balance / 1e18} stETH")
-            except Exception as e:
-                st.error(f"Error fetching Simpleth balance: {e}")
+            show_balances(input_address_checksum)
         else:
             st.error("Invalid wallet address or access code.")
 
     if st.session_state.get("logged_in_wallet"):
         wallet_address = st.session_state["logged_in_wallet"]
-        wallet_info = st.session_state["wallet_db"].get(wallet_address)
-        if wallet_info:
-            with st.expander("Show Private Key for Last Logged In Wallet (for testing only)"):
-                st.code(wallet_info["private_key"], language="text")
+        private_key = get_unlocked_keys().get(st.session_state["session_key"], wallet_address)
+        with st.expander("Show Private Key for Last Logged In Wallet (for testing only)"):
+            st.code("0x" + private_key.hex(), language="text")
         if st.button("Logout (Admin)"):
+            get_unlocked_keys().lock(st.session_state["session_key"])
+            get_block_watcher().unwatch(st.session_state["session_key"])
+            st.session_state["live_balance"].clear()
             st.session_state["logged_in_wallet"] = None
             st.success("Logged out.")
 
+    with st.expander("Bulk Pre-Deposit stETH (Airdrop)"):
+        st.caption(
+            "Pays every wallet in the DB from the admin key. Progress is checkpointed under the run name: "
+            "starting the same run again resumes it without paying any wallet twice. A run name keeps the wallets "
+            "and amount it was first started with; use a new name for a new pre-deposit."
+        )
+        airdrop_run = st.text_input("Run name", value="predeposit-1")
+        airdrop_amount = st.number_input("Amount per wallet (stETH)", min_value=0.0, step=0.01, key="airdrop_amount")
+        admin_key = st.text_input("Admin private key", type="password")
+        if st.button("Start / Resume Pre-Deposit"):
+            try:
+                if airdrop_amount <= 0:
+                    raise ValueError("enter an amount above zero")
+                w3 = get_web3()
+                batch_contract = None
+                if BATCH_TRANSFER_ADDRESS:
+                    batch_contract = get_contract(w3, BATCH_TRANSFER_ADDRESS, BATCH_TRANSFER_ABI)
+                airdrop = Airdrop(
+                    w3, get_contract(w3, STETH_CONTRACT_ADDRESS, STETH_ABI), admin_key, airdrop_run,
+                    batch_contract=batch_contract, fee_oracle=get_fee_oracle(),
+                )
+                amount_wei = int(Decimal(str(airdrop_amount)) * 10**18)
+                # Refused if this run name was already planned for other wallets or another amount
+                airdrop.plan((address, amount_wei) for address in wallet_store.addresses())
+            except Exception as e:
+                airdrop = None
+                st.error(f"Pre-deposit not started: {e}")
+            if airdrop is not None:
+                try:
+                    progress_bar = st.progress(0.0)
+                    result = airdrop.run(
+                        progress=lambda done, total: progress_bar.progress(done / max(total, 1), text=f"{done}/{total} wallets paid"),
+                        time_limit=AIRDROP_TIME_LIMIT,
+                    )
+                    if result["stopped"]:
+                        st.info(
+                            f"Paid {result['paid']} of {result['recipients']} wallets; stopped after {AIRDROP_TIME_LIMIT} s "
+                            f"with {result['outstanding']} still to go. Start the same run again to continue."
+                        )
+                    else:
+                        st.success(f"Paid {result['paid']} of {result['recipients']} wallets in {result['transactions']} transactions.")
+                    st.caption(
+                        f"{result['sent_this_run']} transactions sent in {result['elapsed_s']} s: "
+                        f"{result['sent_tx_per_s']} tx/s sent, {result['confirmed_tx_per_s']} tx/s confirmed, "
+                        f"{result['recipients_per_s']} wallets/s"
+                    )
+                    if result["failed"]:
+                        st.warning(f"{result['failed']} payments reverted; they were not paid.")
+                except Exception as e:
+                    st.error(f"Pre-deposit stopped: {e}. Start the same run again to resume it.")
+
     st.markdown("---")
     st.markdown("""
     **Admin Instructions:**  
-    To pre-deposit stETH (or mock stETH) for a user, send tokens to their wallet address, then have the user approve and deposit into Simpleth using your contract's functions.
+    To pre-deposit stETH (or mock stETH) for a user, send tokens to their wallet address, then have the user approve and deposit into Simpleth using your contract's functions. To fund every wallet in the DB at once, use **Bulk Pre-Deposit stETH** above.
     """)
 
 # --- USER MODE ---
@@ -168,14 +321,15 @@ if mode == "User":
     input_code = st.text_input("Access Code", type="password", key="user_login_code")
 
     if st.button("User Login"):
-        wallet_db = load_wallet_db()
         try:
-            input_address_checksum = Web3.to_checksum_address(input_address)
+            input_address_checksum = get_web3().to_checksum_address(input_address)
         except Exception:
             st.error("Invalid wallet address format.")
             st.stop()
-        wallet_info = wallet_db.get(input_address_checksum)
-        if wallet_info and input_code == wallet_info["access_code"]:
+        # Decrypting the keystore checks the access code; the key is kept for this session
+        private_key = verify_login(wallet_store, input_address_checksum, input_code)
+        if private_key is not None:
+            get_unlocked_keys().put(st.session_state["session_key"], input_address_checksum, private_key)
             st.success("Access granted!")
             st.session_state["logged_in_wallet"] = input_address_checksum
         else:
@@ -183,42 +337,80 @@ if mode == "User":
 
     if st.session_state.get("logged_in_wallet"):
         wallet_address = st.session_state["logged_in_wallet"]
-        wallet_db = load_wallet_db()
-        wallet_info = wallet_db.get(wallet_address)
+        private_key = get_unlocked_keys().get(st.session_state["session_key"], wallet_address)
         st.markdown(f"### Wallet: `{wallet_address}`")
 
-        # Show stETH balance
+        # Show stETH balance (pushed once per block while logged in)
+        show_live_balance(wallet_address)
+
+        # --- Balance History ---
+        st.markdown("#### Balance History")
+        show_balance_history(wallet_address)
+
+        # --- Transfer History ---
+        st.markdown("#### Transfer History")
         try:
-            steth_contract = w3.eth.contract(address=Web3.to_checksum_address(STETH_CONTRACT_ADDRESS), abi=STETH_ABI)
-            steth_balance = steth_contract.functions.balanceOf(wallet_address).call()
-            st.write(f"**stETH balance:** {steth_balance / 1e18} stETH")
+            indexer = get_event_indexer()
+            history = indexer.history(wallet_address, events=["Transfer"], limit=50)
+            if history:
+                st.dataframe([
+                    {
+                        "Block": row["block_number"],
+                        "Token": "Simpleth" if row["contract"].lower() == SIMPLETH_CONTRACT_ADDRESS.lower() else "stETH",
+                        "Direction": "out" if row["account"] == wallet_address else "in",
+                        "Amount (stETH)": row["amount"] / 1e18,
+                        "Transaction": row["tx_hash"],
+                    }
+                    for row in history
+                ])
+            else:
+                st.info("No transfers found yet.")
+            st.caption(f"Indexed up to block {indexer.checkpoint()[0]}")
         except Exception as e:
-            st.error(f"Error fetching stETH balance: {e}")
+            st.error(f"Error reading transfer history: {e}")
 
         # --- Deposit (Simulation) ---
         st.markdown("#### Deposit stETH (Simulation)")
         st.info("To deposit real stETH, send tokens to your wallet address using your preferred wallet (e.g., MetaMask).")
         st.code(wallet_address, language="text")
 
-        # --- Withdraw (Simulation) ---
-        st.markdown("#### Withdraw stETH (Simulation)")
+        # --- Withdraw ---
+        st.markdown("#### Withdraw stETH")
         withdraw_to = st.text_input("Recipient address", key="user_withdraw_to")
         withdraw_amount = st.number_input("Amount to withdraw (stETH)", min_value=0.0, step=0.01, key="user_withdraw_amount")
-        if st.button("Simulate Withdraw"):
-            st.info("In a real app, withdrawal would require a blockchain transaction signed by your wallet's private key.")
-            st.success(f"Simulated withdrawal of {withdraw_amount} stETH to {withdraw_to}.")
+        if st.button("Withdraw"):
+            try:
+                if withdraw_amount <= 0:
+                    raise ValueError("enter an amount above zero")
+                steth_contract = get_contract(get_web3(), STETH_CONTRACT_ADDRESS, STETH_ABI)
+                # Returns once the node has the transaction; the receipt is tracked below
+                transfer = get_transfer_service().submit(
+                    private_key, steth_contract, withdraw_to, int(Decimal(str(withdraw_amount)) * 10**18)
+                )
+                st.success(f"Sent {withdraw_amount} stETH to {transfer['to']} (nonce {transfer['nonce']}): {transfer['tx_hash']}")
+            except Exception as e:
+                st.error(f"Withdrawal failed: {e}")
+        show_withdrawals(wallet_address)
 
         # --- Show Private Key (Optional, for testing only) ---
         with st.expander("Show Private Key (for testing only)"):
-            st.code(wallet_info["private_key"], language="text")
+            st.code("0x" + private_key.hex(), language="text")
 
         if st.button("Logout (User)"):
+            get_unlocked_keys().lock(st.session_state["session_key"])
+            get_block_watcher().unwatch(st.session_state["session_key"])
+            st.session_state["live_balance"].clear()
             st.session_state["logged_in_wallet"] = None
             st.success("Logged out.")
 
     st.markdown("---")
     st.markdown("""
     **Note:**  
-    - Deposits and withdrawals here are simulated for demo purposes.  
-    - Real transfers require blockchain transactions signed by your wallet's private key.
-    """)
\ No newline at end of file
+    - Deposits here are simulated for demo purposes.  
+    - Withdrawals send a real stETH transfer signed with your wallet's private key; the wallet needs ETH for gas.
+    """)
+
+# --- RPC DEBUG PANEL ---
+# Admin mode only: per-function RPC counts and latencies are not for end users
+if mode == "Admin":
+    show_rpc_debug_panel()
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""Wallet, login, balance and vault operations, without Streamlit.
+
+The Streamlit apps and the JSON API (`api_server.py`) call these same
+functions. Each one takes the shared components it needs (wallet store,
+`BalanceCache`, `VaultStats`, contracts), so every caller keeps using its own
+process-wide instances and nothing here holds state.
+
+Amounts are exact wei ints. Addresses must already be checksummed; `checksum`
+turns user input into one or raises ValueError.
+
+The configuration below (RPC endpoint, contract addresses) is the one the apps,
+their shared resources (`app_resources.py`) and the API all read.
+"""
+from keystore import encrypt_record, unlock
+from rpc_batch import RPCBatch
+
+# --- CONFIGURATION ---
+INFURA_URL = "https://sepolia.infura.io/v3/e0fcce634506410b87fc31064eed915a"
+INFURA_WS_URL = "wss://sepolia.infura.io/ws/v3/e0fcce634506410b87fc31064eed915a"
+SIMPLETH_CONTRACT_ADDRESS = "0xe0271f5571AB60dD89EF11F1743866a213406542"
+STETH_CONTRACT_ADDRESS = "0xFD5d07334591C3eE2699639Bb670de279ea45f65"  # <-- Replace with your mock stETH address
+INDEX_FROM_BLOCK = 0  # <-- Replace with the block your first contract (Simpleth, stETH or KinetixVault) was deployed at
+VAULT_ADDRESS = "0xa947017dbf5f7e7e7Aed55eA16886639DD04872A"  # <-- Replace with your deployed KinetixVault address, or None
+VAULT_STETH_ADDRESS = "0x68502E9ca41eB2a854382d68C07526D6a5a72262"  # <-- Replace with the stETH/mockstETH your vault holds
+
+
+def checksum(address):
+    # Imported here so the apps can import this module without loading eth_utils
+    from eth_utils import is_address, to_checksum_address
+
+    if not isinstance(address, str) or not is_address(address):
+        raise ValueError(f"Invalid wallet address: {address!r}")
+    return to_checksum_address(address)
+
+
+def create_wallet(store):
+    """Create a wallet and store it encrypted; returns `(address, {"private_key", "access_code"})`.
+
+    The plaintext record is only returned here, to be handed to the user once.
+    """
+    # provisioning pulls in multiprocessing, which the read-only apps don't need
+    from provisioning import create_wallet as new_wallet
+
+    wallet_address, wallet_info = new_wallet()
+    store.put(wallet_address, encrypt_record(wallet_info))
+    return wallet_address, wallet_info
+
+
+def verify_login(store, address, access_code):
+    """The wallet's private key as bytes if `access_code` opens it, otherwise None.
+
+    Costs one keystore KDF run for an encrypted record.
+    """
+    record = store.get(address)
+    if record is None:
+        return None
+    return unlock(record, access_code)
+
+
+def wallet_balances(balance_cache, steth, simpleth, address):
+    """`(stETH in the wallet, stETH in Simpleth)` in wei, one read per wallet per block.
+
+    Either value may be the exception its read raised.
+    """
+    steth_balance, simpleth_balance = balance_cache.get_balances([steth, simpleth], address)
+    return steth_balance, simpleth_balance
+
+
+def vault_info(vault_stats, w3, vault, steth, donor=None):
+    """Vault-wide stats (`VaultStats.get`), plus the donor's balances when `donor` is given.
+
+    The donor's stETH balance, receipt-token balance and principal go out in
+    one JSON-RPC batch.
+    """
+    info = dict(vault_stats.get())
+    if donor is not None:
+        with RPCBatch(w3) as batch:
+            batch.add(steth.functions.balanceOf(donor))
+            batch.add(vault.functions.balanceOf(donor))
+            batch.add(vault.functions.principalOf(donor))
+        info["steth_balance"], info["receipts"], info["principal"] = batch.results
+    return info
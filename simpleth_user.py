@@ -1,43 +1,85 @@
 import streamlit as st
-from web3 import Web3
-import os
-import json
+from contracts import STETH_ABI, get_contract
+from simpleth_core import SIMPLETH_CONTRACT_ADDRESS, STETH_CONTRACT_ADDRESS, verify_login
+from app_resources import (
+    get_balance_cache, get_balance_history, get_block_watcher, get_event_indexer, get_transfer_service,
+    get_unlocked_keys, get_wallet_store, get_web3,
+)
+import secrets
+import time
+from decimal import Decimal
 
 # --- CONFIGURATION ---
-INFURA_URL = "https://sepolia.infura.io/v3/e0fcce634506410b87fc31064eed915a"
-STETH_CONTRACT_ADDRESS = "0xFD5d07334591C3eE2699639Bb670de279ea45f65"  # Same as admin app
-WALLET_DB_FILE = "wallet_db.json"
-
-STETH_ABI = [
-    {
-        "inputs": [{"internalType": "address", "name": "account", "type": "address"}],
-        "name": "balanceOf",
-        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [
-            {"internalType": "address", "name": "recipient", "type": "address"},
-            {"internalType": "uint256", "name": "amount", "type": "uint256"}
-        ],
-        "name": "transfer",
-        "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    }
-]
-
-def load_wallet_db():
-    if os.path.exists(WALLET_DB_FILE):
-        with open(WALLET_DB_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-w3 = Web3(Web3.HTTPProvider(INFURA_URL))
+# The RPC endpoint and contract addresses are set in simpleth_core.py (shared with the admin app)
+LIVE_REFRESH_SECONDS = 3
+HISTORY_RANGES = {"24 hours": 86400, "7 days": 7 * 86400, "30 days": 30 * 86400, "All": None}
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def show_live_balance(wallet_address):
+    # Reruns on a timer but only reads session state: the block watcher does the RPC,
+    # once per new block, for every logged-in wallet together
+    live = st.session_state["live_balance"]
+    try:
+        steth_contract = get_contract(get_web3(), STETH_CONTRACT_ADDRESS, STETH_ABI)
+        get_block_watcher().watch(st.session_state["session_key"], wallet_address, [steth_contract], live)
+        if live.get("holder") != wallet_address:
+            # Nothing pushed for this wallet yet: read it once now
+            live.update(holder=wallet_address, balances=get_balance_cache().get_balances([steth_contract], wallet_address), block=None)
+        [steth_balance] = live["balances"]
+        if isinstance(steth_balance, Exception):
+            raise steth_balance
+        st.write(f"**stETH balance:** {steth_balance / 1e18} stETH")
+    except Exception as e:
+        st.error(f"Error fetching stETH balance: {e}")
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def show_withdrawals(wallet_address):
+    # Receipts are polled by the transfer service's workers; this only renders their records
+    transfers = get_transfer_service().for_address(wallet_address)
+    if transfers:
+        st.dataframe([
+            {
+                "Nonce": t["nonce"],
+                "To": t["to"],
+                "Amount (stETH)": t["amount"] / 1e18,
+                "Status": t["status"],
+                "Block": t["block"],
+                "Transaction": t["tx_hash"],
+            }
+            for t in transfers
+        ])
+
+def show_balance_history(wallet_address):
+    history_range = st.selectbox("Range", list(HISTORY_RANGES), index=1)
+    try:
+        from balance_history import LEVEL_NAMES
+        balance_history = get_balance_history()
+        balance_history.track(wallet_address)
+        seconds = HISTORY_RANGES[history_range]
+        level, rows = balance_history.chart(wallet_address, since=None if seconds is None else int(time.time()) - seconds)
+        if rows:
+            st.line_chart(rows, x="Time", y="Balance", color="Token")
+            st.caption(f"Balances {LEVEL_NAMES[level]}, in stETH")
+        else:
+            st.info("Collecting this wallet's balance history; it appears here within a few minutes.")
+    except Exception as e:
+        st.error(f"Error reading balance history: {e}")
+
+wallet_store = get_wallet_store()
 
 if "logged_in_wallet" not in st.session_state:
     st.session_state["logged_in_wallet"] = None
+if "session_key" not in st.session_state:
+    st.session_state["session_key"] = secrets.token_hex(8)
+if "live_balance" not in st.session_state:
+    st.session_state["live_balance"] = {}
+
+# The unlocked key expires after a while unused: the access code is needed again
+if st.session_state.get("logged_in_wallet") and get_unlocked_keys().get(st.session_state["session_key"], st.session_state["logged_in_wallet"]) is None:
+    get_block_watcher().unwatch(st.session_state["session_key"])
+    st.session_state["live_balance"].clear()
+    st.session_state["logged_in_wallet"] = None
+    st.warning("Your session has expired. Please log in again.")
 
 st.set_page_config(page_title="Simpleth User Wallet", page_icon="🦊")
 st.title("🦊 Simpleth User Wallet")
@@ -52,14 +94,15 @@ input_address = st.text_input("Wallet Address")
 input_code = st.text_input("Access Code", type="password")
 
 if st.button("Login"):
-    wallet_db = load_wallet_db()
     try:
-        input_address_checksum = Web3.to_checksum_address(input_address)
+        input_address_checksum = get_web3().to_checksum_address(input_address)
     except Exception:
         st.error("Invalid wallet address format.")
         st.stop()
-    wallet_info = wallet_db.get(input_address_checksum)
-    if wallet_info and input_code == wallet_info["access_code"]:
+    # Decrypting the keystore checks the access code; the key is kept for this session
+    private_key = verify_login(wallet_store, input_address_checksum, input_code)
+    if private_key is not None:
+        get_unlocked_keys().put(st.session_state["session_key"], input_address_checksum, private_key)
         st.success("Access granted!")
         st.session_state["logged_in_wallet"] = input_address_checksum
     else:
@@ -68,42 +111,75 @@ if st.button("Login"):
 # --- WALLET DASHBOARD ---
 if st.session_state.get("logged_in_wallet"):
     wallet_address = st.session_state["logged_in_wallet"]
-    wallet_db = load_wallet_db()
-    wallet_info = wallet_db.get(wallet_address)
+    private_key = get_unlocked_keys().get(st.session_state["session_key"], wallet_address)
     st.markdown(f"### Wallet: `{wallet_address}`")
 
-    # Show stETH balance
+    # Show stETH balance (pushed once per block while logged in)
+    show_live_balance(wallet_address)
+
+    # --- Balance History ---
+    st.markdown("#### Balance History")
+    show_balance_history(wallet_address)
+
+    # --- Transfer History ---
+    st.markdown("#### Transfer History")
     try:
-        steth_contract = w3.eth.contract(address=Web3.to_checksum_address(STETH_CONTRACT_ADDRESS), abi=STETH_ABI)
-        steth_balance = steth_contract.functions.balanceOf(wallet_address).call()
-        st.write(f"**stETH balance:** {steth_balance / 1e18} stETH")
+        indexer = get_event_indexer()
+        history = indexer.history(wallet_address, events=["Transfer"], limit=50)
+        if history:
+            st.dataframe([
+                {
+                    "Block": row["block_number"],
+                    "Token": "Simpleth" if row["contract"].lower() == SIMPLETH_CONTRACT_ADDRESS.lower() else "stETH",
+                    "Direction": "out" if row["account"] == wallet_address else "in",
+                    "Amount (stETH)": row["amount"] / 1e18,
+                    "Transaction": row["tx_hash"],
+                }
+                for row in history
+            ])
+        else:
+            st.info("No transfers found yet.")
+        st.caption(f"Indexed up to block {indexer.checkpoint()[0]}")
     except Exception as e:
-        st.error(f"Error fetching stETH balance: {e}")
+        st.error(f"Error reading transfer history: {e}")
 
     # --- Deposit (Simulation) ---
     st.markdown("#### Deposit stETH (Simulation)")
     st.info("To deposit real stETH, send tokens to your wallet address using your preferred wallet (e.g., MetaMask).")
     st.code(wallet_address, language="text")
 
-    # --- Withdraw (Simulation) ---
-    st.markdown("#### Withdraw stETH (Simulation)")
+    # --- Withdraw ---
+    st.markdown("#### Withdraw stETH")
     withdraw_to = st.text_input("Recipient address")
     withdraw_amount = st.number_input("Amount to withdraw (stETH)", min_value=0.0, step=0.01)
-    if st.button("Simulate Withdraw"):
-        st.info("In a real app, withdrawal would require a blockchain transaction signed by your wallet's private key.")
-        st.success(f"Simulated withdrawal of {withdraw_amount} stETH to {withdraw_to}.")
+    if st.button("Withdraw"):
+        try:
+            if withdraw_amount <= 0:
+                raise ValueError("enter an amount above zero")
+            steth_contract = get_contract(get_web3(), STETH_CONTRACT_ADDRESS, STETH_ABI)
+            # Returns once the node has the transaction; the receipt is tracked below
+            transfer = get_transfer_service().submit(
+                private_key, steth_contract, withdraw_to, int(Decimal(str(withdraw_amount)) * 10**18)
+            )
+            st.success(f"Sent {withdraw_amount} stETH to {transfer['to']} (nonce {transfer['nonce']}): {transfer['tx_hash']}")
+        except Exception as e:
+            st.error(f"Withdrawal failed: {e}")
+    show_withdrawals(wallet_address)
 
     # --- Show Private Key (Optional, for testing only) ---
     with st.expander("Show Private Key (for testing only)"):
-        st.code(wallet_info["private_key"], language="text")
+        st.code("0x" + private_key.hex(), language="text")
 
     if st.button("Logout"):
+        get_unlocked_keys().lock(st.session_state["session_key"])
+        get_block_watcher().unwatch(st.session_state["session_key"])
+        st.session_state["live_balance"].clear()
         st.session_state["logged_in_wallet"] = None
         st.success("Logged out.")
 
 st.markdown("---")
 st.markdown("""
 **Note:**  
-- Deposits and withdrawals here are simulated for demo purposes.  
-- Real transfers require blockchain transactions signed by your wallet's private key.
-""")
\ No newline at end of file
+- Deposits here are simulated for demo purposes.  
+- Withdrawals send a real stETH transfer signed with your wallet's private key; the wallet needs ETH for gas.
+""")
@@ -0,0 +1,39 @@
+"""Component micro-benchmarks (pytest-benchmark), against the shared `LocalChain`.
+
+They time the pieces every page is built from: the wallet stores and the
+admin wallet browser's index, wallet creation and login, balance reads, the
+Kinetix dashboard fetch, the vault analytics and the balance history charts.
+Chain benchmarks record the JSON-RPC round trips of one call in the report's
+`extra_info` and assert them, so a change that adds a round trip fails the
+run whatever the timings.
+
+They are skipped by a plain test run; run them, and keep or check a baseline, with:
+
+    python -m pytest tests/benchmarks --benchmark-only --benchmark-save=baseline
+    python -m pytest tests/benchmarks --benchmark-only --benchmark-compare --benchmark-compare-fail=min:30%
+
+(`-k "not 100000"` leaves out the 100k-wallet stores.) Compared on the best
+round rather than the median, because it is the least noisy on a shared
+machine. Requires `pytest-benchmark`.
+"""
+import pytest
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("benchmark_only", default=False):
+        return
+    skip = pytest.mark.skip(reason="benchmark: run with --benchmark-only")
+    for item in items:
+        if "benchmark" in getattr(item, "fixturenames", ()):
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def round_trips(chain, benchmark):
+    """`round_trips(fn)`: call `fn` once more and record (and return) the JSON-RPC round trips it made."""
+    def count(fn):
+        before = chain.round_trips
+        fn()
+        benchmark.extra_info["rpc_round_trips"] = chain.round_trips - before
+        return benchmark.extra_info["rpc_round_trips"]
+    return count
@@ -0,0 +1,25 @@
+from keystore import UnlockedKeys, encrypt_record
+from provisioning import create_wallet
+
+WALLETS_PER_ROUND = 100
+
+
+def test_create_wallet(benchmark):
+    create_wallet()  # the first call pays for the eth_account import
+    benchmark.pedantic(lambda: [create_wallet() for _ in range(WALLETS_PER_ROUND)], rounds=5)
+    benchmark.extra_info["wallets_per_s"] = round(WALLETS_PER_ROUND / benchmark.stats.stats.median, 1)
+
+
+def test_unlock_interactive_wallet(benchmark):
+    # The keystore KDF at its production cost, as a wallet created one at a time pays it at login
+    address, wallet_info = create_wallet()
+    record = encrypt_record(wallet_info)
+    keys = UnlockedKeys()
+    benchmark.pedantic(keys.unlock, ("session", address, record, wallet_info["access_code"]), rounds=3)
+
+
+def test_unlocked_key_from_the_session_cache(benchmark):
+    address, wallet_info = create_wallet()
+    keys = UnlockedKeys()
+    keys.put("session", address, wallet_info["private_key"])
+    assert benchmark(keys.get, "session", address) is not None
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from balance_history import BLOCK_TIME, RAW_STEP, BalanceHistory
+from donor_analytics import DonorSnapshot
+
+ANALYTICS_DONORS = 20000
+HISTORY_DAYS = 365
+HOLDER = "0x%040x" % 1
+
+
+def test_donor_analytics_views(benchmark):
+    rng = random.Random(0)
+    donors = ["0x%040x" % (i + 1) for i in range(ANALYTICS_DONORS)]
+    principal = [rng.randrange(10**15, 10**21) for _ in donors]
+
+    def views():
+        # A fresh snapshot each round, so the word and float conversions are timed too
+        snapshot = DonorSnapshot(0, donors, principal, principal, 10**19, sum(principal), 18)
+        snapshot.leaderboard("principal", 100)
+        snapshot.attribute(snapshot.rewards)
+        snapshot.histogram("principal")
+        snapshot.project(0.03, 365)
+
+    benchmark(views)
+
+
+@pytest.fixture(scope="module")
+def history(tmp_path_factory):
+    """A year of samples for one wallet and two tokens, as the sampler would have stored them."""
+    rng = random.Random(0)
+    history = BalanceHistory(None, {"stETH": None, "Simpleth": None},
+                             db_path=str(tmp_path_factory.mktemp("history") / "history.sqlite3"))
+    blocks = [i * RAW_STEP for i in range(HISTORY_DAYS * 86400 // (RAW_STEP * BLOCK_TIME))]
+    amounts = [rng.randrange(10**15, 10**21) for _ in blocks]
+    samples = (blocks, [block * BLOCK_TIME for block in blocks], amounts)
+    history._store({(HOLDER, label): samples for label in history.tokens}, [HOLDER], blocks[-1])
+    history.last_block = blocks[-1]
+    return history
+
+
+@pytest.mark.parametrize("days", [1, 30, None], ids=["24h", "30d", "all"])
+def test_balance_history_chart(benchmark, history, days):
+    now = history.last_block * BLOCK_TIME
+    benchmark(history.chart, HOLDER, since=now - days * 86400 if days else None)
+
+
+def test_balance_history_append(benchmark, history):
+    def append():
+        history.last_block += RAW_STEP
+        block = history.last_block
+        history._store({(HOLDER, label): ([block], [block * BLOCK_TIME], [10**18]) for label in history.tokens},
+                       [HOLDER], block)
+
+    benchmark(append)
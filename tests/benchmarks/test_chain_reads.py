@@ -0,0 +1,80 @@
+import pytest
+from web3 import Web3
+
+from balance_cache import BalanceCache
+from balance_reader import read_many
+from contracts import ERC20_ABI, KINETIX_VAULT_ABI, SIMPLETH_ABI, STETH_ABI, get_contract
+from rpc_pool import PooledRPCProvider
+from simpleth_core import vault_info
+from vault_stats import VaultStats
+
+BATCH_HOLDERS = 250
+HOLDERS = [Web3.to_checksum_address("0x%040x" % (i + 1)) for i in range(BATCH_HOLDERS)]
+DONOR = HOLDERS[0]
+
+
+@pytest.fixture(scope="module")
+def w3(chain):
+    w3 = Web3(PooledRPCProvider([chain.url]))
+    w3.eth.chain_id  # warm the provider's connection pool
+    return w3
+
+
+@pytest.fixture(scope="module")
+def contracts(chain, w3):
+    steth = get_contract(w3, chain.steth, STETH_ABI)
+    simpleth = get_contract(w3, chain.simpleth, SIMPLETH_ABI)
+    vault = get_contract(w3, chain.vault, KINETIX_VAULT_ABI)
+    erc20 = get_contract(w3, chain.steth, ERC20_ABI)
+    # Every other read returns 0, which costs the same
+    chain.set_many([
+        (steth.functions.balanceOf(DONOR), 5 * 10**18),
+        (erc20.functions.decimals(), 18),
+        (vault.functions.balanceOf(DONOR), 3 * 10**18),
+        (vault.functions.principalOf(DONOR), 3 * 10**18),
+        (vault.functions.vaultBalance(), 100 * 10**18),
+        (vault.functions.stakingRewards(), 10**17),
+        (vault.functions.beneficiary(), HOLDERS[1]),
+    ])
+    return steth, simpleth, vault, erc20
+
+
+def test_single_balance(benchmark, round_trips, contracts):
+    steth = contracts[0]
+    call = steth.functions.balanceOf(DONOR).call
+    assert benchmark(call) == 5 * 10**18
+    assert round_trips(call) == 1
+
+
+def test_multicall_balances(benchmark, round_trips, w3, contracts):
+    steth, simpleth = contracts[:2]
+    calls = [(contract, "balanceOf", [holder]) for holder in HOLDERS for contract in (steth, simpleth)]
+    benchmark(read_many, w3, calls)
+    assert round_trips(lambda: read_many(w3, calls)) == 1
+
+
+def test_balance_cache_cold(benchmark, round_trips, w3, contracts):
+    steth, simpleth = contracts[:2]
+    # Head already known, so only the cache misses' read is counted
+    cache = BalanceCache(w3, head_check_interval=3600)
+    cache.latest_block()
+
+    def cold():
+        cache.clear()
+        return cache.get_many([steth, simpleth], HOLDERS)
+
+    benchmark(cold)
+    assert round_trips(cold) == 1
+
+
+def test_kinetix_dashboard(benchmark, round_trips, w3, contracts):
+    steth, _, vault, erc20 = contracts
+    # Warmed up for the current block, as it is for every rerun after the first one in a block
+    vault_stats = VaultStats(w3, vault, erc20, head_check_interval=3600)
+    vault_stats.get()
+
+    info = benchmark(vault_info, vault_stats, w3, vault, steth, DONOR)
+
+    assert info["principal"] == 3 * 10**18
+    # The donor's three reads, in one batch
+    assert round_trips(lambda: vault_info(vault_stats, w3, vault, steth, DONOR)) == 1
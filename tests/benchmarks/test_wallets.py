@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+import simpleth_core
+from keystore import BULK_KEYSTORE_ITERATIONS, encrypt_record
+from provisioning import create_wallet
+from wallet_index import WalletIndex
+from wallet_store import JSONWalletStore, SQLiteWalletStore
+
+WALLET_COUNTS = (1000, 10000, 100000)
+INDEX_WALLETS = 100000
+BACKENDS = {"json": (JSONWalletStore, "wallets.json"), "sqlite": (SQLiteWalletStore, "wallets.sqlite3")}
+
+
+@pytest.fixture(scope="module")
+def login():
+    """A provisioned wallet: its address, access code and stored (encrypted) record."""
+    address, wallet_info = create_wallet()
+    return address, wallet_info["access_code"], encrypt_record(wallet_info, iterations=BULK_KEYSTORE_ITERATIONS)
+
+
+@pytest.fixture(scope="module", params=[(backend, count) for count in WALLET_COUNTS for backend in BACKENDS],
+                ids=lambda param: f"{param[0]}-{param[1]}")
+def store(request, tmp_path_factory, login):
+    """A store of `count` wallets; every record has the provisioned wallet's shape and size."""
+    backend, count = request.param
+    cls, filename = BACKENDS[backend]
+    address, _, record = login
+    path = str(tmp_path_factory.mktemp(backend) / filename)
+    store = cls(path)
+    store.put_many([(address, record)] + [("0x%040x" % (i + 1), record) for i in range(count - 1)])
+    return store
+
+
+def test_load_all(benchmark, store):
+    # A fresh store object each round: what a new process or another writer's change costs
+    benchmark(lambda: type(store)(store.path).load_all())
+
+
+def test_put(benchmark, store, login):
+    address, _, record = login
+    benchmark(store.put, address, record)
+
+
+def test_verify_login(benchmark, store, login):
+    address, access_code, _ = login
+    assert benchmark(simpleth_core.verify_login, store, address, access_code) is not None
+
+
+@pytest.fixture(scope="module")
+def index_store(tmp_path_factory):
+    # Random addresses: sequential ones would all share a long prefix of zeros
+    rng = random.Random(0)
+    store = SQLiteWalletStore(str(tmp_path_factory.mktemp("index") / "wallets.sqlite3"))
+    store.put_many(("0x%040x" % rng.getrandbits(160), {}) for _ in range(INDEX_WALLETS))
+    return store
+
+
+@pytest.fixture(scope="module")
+def index(index_store):
+    index = WalletIndex(index_store)
+    index.count()
+    return index
+
+
+def test_index_build(benchmark, index_store):
+    benchmark(lambda: WalletIndex(index_store).count())
+
+
+@pytest.mark.parametrize("query", ["prefix", "substring-1", "substring-6"])
+def test_index_search(benchmark, index_store, index, query):
+    address = index_store.addresses()[INDEX_WALLETS // 2]
+    text = {"prefix": address[:8], "substring-1": "a", "substring-6": address[20:26]}[query]
+    benchmark(index.search, text)
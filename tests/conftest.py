@@ -0,0 +1,36 @@
+"""Shared fixtures: an in-process `LocalChain` and a count of the JSON-RPC methods it is sent.
+
+The app modules are flat files at the repo root, so it goes on `sys.path` here.
+Requires `eth-tester[py-evm]`.
+"""
+import os
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="module")
+def chain():
+    from local_chain import LocalChain
+
+    chain = LocalChain()
+    yield chain
+    chain.close()
+
+
+@pytest.fixture
+def rpc_methods(chain, monkeypatch):
+    """Counter of the JSON-RPC methods `chain` answers during the test, batch items included."""
+    methods = Counter()
+    handle = chain.handle
+
+    def counting_handle(message):
+        if not isinstance(message, list):
+            methods[message["method"]] += 1
+        return handle(message)
+
+    monkeypatch.setattr(chain, "handle", counting_handle)
+    return methods
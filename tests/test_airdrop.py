@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+
+import pytest
+from eth_account import Account
+from web3 import Web3
+
+import airdrop
+from airdrop import Airdrop
+from contracts import STETH_ABI
+from rpc_pool import PooledRPCProvider
+
+RECIPIENTS = [Web3.to_checksum_address("0x%040x" % (0xB0B + i)) for i in range(3)]
+
+
+@pytest.fixture
+def drop(chain, tmp_path, monkeypatch):
+    monkeypatch.setattr(airdrop, "POLL_INTERVAL", 0.01)
+    w3 = Web3(PooledRPCProvider([chain.url]))
+    admin = Account.create()
+    chain.fund([admin.address], 10**20)
+
+    def make(run="run-1", **kwargs):
+        return Airdrop(w3, w3.eth.contract(chain.steth, abi=STETH_ABI), admin.key, run,
+                       db_path=str(tmp_path / "airdrop.sqlite3"), **kwargs)
+    return make
+
+
+def _transactions(run):
+    return run._conn().execute(
+        "SELECT nonce, status FROM transactions WHERE run = ? ORDER BY rowid", (run.run_name,)
+    ).fetchall()
+
+
+def test_pays_every_recipient_once_in_nonce_order(drop):
+    run = drop()
+    run.plan((recipient, 5) for recipient in RECIPIENTS)
+
+    report = run.run()
+
+    assert (report["paid"], report["outstanding"], report["transactions"]) == (3, 0, 3)
+    assert _transactions(run) == [(0, "confirmed"), (1, "confirmed"), (2, "confirmed")]
+    # Nothing left to send, nothing sent again
+    assert drop().run()["sent_this_run"] == 0
+
+
+def test_plan_differing_from_the_stored_run_is_refused(drop):
+    run = drop()
+    run.plan((recipient, 5) for recipient in RECIPIENTS)
+    run.plan((recipient, 5) for recipient in RECIPIENTS)
+
+    with pytest.raises(ValueError, match="adds 0, drops 0 and changes the amount for 3"):
+        run.plan((recipient, 6) for recipient in RECIPIENTS)
+    with pytest.raises(ValueError, match="adds 0, drops 1"):
+        run.plan((recipient, 5) for recipient in RECIPIENTS[:2])
+    assert run.counts() == {"planned": 3}
+
+
+def test_stuck_transaction_is_replaced_with_higher_fees_until_the_time_limit(chain, drop):
+    run = drop(replace_after=0.05)
+    run.plan([(RECIPIENTS[0], 5)])
+    chain.tester.disable_auto_mine_transactions()
+    try:
+        report = run.run(time_limit=0.5)
+    finally:
+        chain.tester.enable_auto_mine_transactions()
+
+    assert report["stopped"] and report["outstanding"] == 1
+    transactions = _transactions(run)
+    assert len(transactions) > 1 and {nonce for nonce, _ in transactions} == {0}
+    fees = [json.loads(params)["maxFeePerGas"] for (params,) in run._conn().execute(
+        "SELECT params FROM transactions ORDER BY rowid"
+    )]
+    assert all(later >= earlier * airdrop.FEE_BUMP for earlier, later in zip(fees, fees[1:]))
+
+    chain.mine()
+    report = drop(replace_after=0.05).run()
+    assert (report["paid"], report["transactions"]) == (1, 1)
+    assert [status for _, status in _transactions(run)].count("confirmed") == 1
+
+
+def test_refused_nonce_is_signed_again_before_higher_ones_are_resent(drop):
+    run = drop()
+    run.plan((recipient, 5) for recipient in RECIPIENTS)
+    planned = run._conn().execute("SELECT recipient, amount FROM payments ORDER BY recipient").fetchall()
+    fees = run.fee_oracle.fees()
+    # Signed by a run that stopped before sending; the middle one has too little gas to be accepted
+    for nonce, group in enumerate(planned):
+        run._sign_and_record([group], nonce, fees, gas=1 if nonce == 1 else None)
+
+    report = drop().run()
+
+    assert (report["paid"], report["outstanding"]) == (3, 0)
+    assert _transactions(run) == [(0, "confirmed"), (1, "rejected"), (2, "confirmed"), (1, "confirmed")]
+
+
+def test_second_engine_on_the_same_run_is_refused_while_the_first_sends(chain, drop):
+    first, second = drop(), drop()
+    first.plan([(RECIPIENTS[0], 5)])
+    chain.tester.disable_auto_mine_transactions()
+    try:
+        sender = threading.Thread(target=first.run, kwargs={"time_limit": 1.0})
+        sender.start()
+        while "signed" not in first.counts():
+            time.sleep(0.01)
+
+        with pytest.raises(RuntimeError, match="being sent by another session"):
+            second.run()
+        # Nor can the payments be signed again at another nonce behind the lease's back
+        planned = second._conn().execute("SELECT recipient, amount FROM payments WHERE run = ?", ("run-1",)).fetchall()
+        with pytest.raises(RuntimeError, match="already signed"):
+            second._sign_and_record(planned, 99, second.fee_oracle.fees())
+        sender.join()
+    finally:
+        chain.tester.enable_auto_mine_transactions()
+
+    chain.mine()
+    report = second.run()
+    assert (report["paid"], report["transactions"]) == (1, 1)
+    assert _transactions(second) == [(0, "confirmed")]
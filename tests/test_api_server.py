@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import api_server
+import simpleth_core
+from api_server import LoginLimiter, make_app
+
+ADDRESS = "0x000000000000000000000000000000000000A11c"
+# The old plaintext record form: no KDF run per login
+STORE = {simpleth_core.checksum(ADDRESS): {"private_key": "0x" + "11" * 32, "access_code": "open-sesame"}}
+
+
+def _requests(calls, limiter=None, backend=None):
+    """Run `calls(client)` against the app with a stub backend; returns its result."""
+    backend = backend or SimpleNamespace(store=STORE)
+
+    async def run():
+        async with TestClient(TestServer(make_app(backend, login_limiter=limiter))) as client:
+            return await calls(client)
+    return asyncio.run(run())
+
+
+async def _login(client, address=ADDRESS, access_code="open-sesame"):
+    response = await client.post("/login", json={"address": address, "access_code": access_code})
+    return response.status, await response.json(), response.headers.get("Retry-After")
+
+
+def test_login_checks_the_access_code():
+    async def calls(client):
+        return [await _login(client), await _login(client, access_code="wrong")]
+
+    assert [(status, body["valid"]) for status, body, _ in _requests(calls)] == [(200, True), (200, False)]
+
+
+def test_bad_input_is_400():
+    async def calls(client):
+        return [await _login(client, address="not-an-address"), await _login(client, access_code=None)]
+
+    statuses = [(status, body["error"]) for status, body, _ in _requests(calls)]
+    assert statuses == [(400, "Invalid wallet address: 'not-an-address'"), (400, "access_code is required")]
+
+
+def test_logins_over_the_per_ip_budget_get_429():
+    async def calls(client):
+        return [await _login(client) for _ in range(3)]
+
+    results = _requests(calls, LoginLimiter(attempts=2, period=60))
+    assert [status for status, _, _ in results] == [200, 200, 429]
+    assert results[2][2] == "30"
+
+
+def test_logins_over_the_queue_bound_get_429():
+    limiter = LoginLimiter(max_queued=0)
+
+    async def calls(client):
+        return await _login(client)
+
+    status, body, retry_after = _requests(calls, limiter)
+    assert (status, body["error"], retry_after) == (429, "Too many logins in progress", "1")
+    assert limiter.queued == 0
+
+
+def test_value_error_from_below_the_api_is_500_and_logged(monkeypatch, caplog):
+    def broken(*args):
+        raise ValueError("decoder blew up")
+
+    monkeypatch.setattr(api_server.simpleth_core, "verify_login", broken)
+
+    async def calls(client):
+        return await _login(client)
+
+    status, body, _ = _requests(calls)
+    assert (status, body["error"]) == (500, "Internal server error")
+    assert "decoder blew up" in caplog.text
+
+
+def test_failed_chain_read_is_502_without_the_provider_error(caplog):
+    error = ConnectionError("500 Server Error for url: https://mainnet.infura.io/v3/secret-key")
+    balance_cache = SimpleNamespace(get_balances=lambda contracts, address: [error, 0])
+    backend = SimpleNamespace(store=STORE, balance_cache=balance_cache, steth=None, simpleth=None)
+
+    async def calls(client):
+        response = await client.get(f"/balances/{ADDRESS}")
+        return response.status, await response.json()
+
+    assert _requests(calls, backend=backend) == (502, {"error": "Upstream read failed"})
+    assert "secret-key" in caplog.text
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+from web3 import Web3
+
+from balance_history import LEVELS, RAW_STEP, BalanceHistory, Series
+from contracts import STETH_ABI
+from rpc_pool import PooledRPCProvider
+
+HOLDERS = [Web3.to_checksum_address("0x%040x" % (0xA11CE + i)) for i in range(2)]
+# Around the word boundary and at the top of the range
+AMOUNTS = [0, 1, 2**64 - 1, 2**64, 2**64 + 1, 3 * 10**25, 2**128 - 1]
+
+
+@pytest.fixture
+def history(chain, tmp_path):
+    w3 = Web3(PooledRPCProvider([chain.url]))
+    return BalanceHistory(w3, {"stETH": w3.eth.contract(chain.steth, abi=STETH_ABI)},
+                          db_path=str(tmp_path / "history.sqlite3"), confirmations=0, expire_days=1)
+
+
+def _sampled_to(history):
+    return dict(history._conn().execute("SELECT holder, sampled_to FROM holders"))
+
+
+def test_untracked_and_expired_holders_are_not_sampled(chain, history):
+    active, idle = HOLDERS
+    history.track(active)
+    history.track(idle)
+    history.untrack(idle)
+
+    history.sync()
+    assert _sampled_to(history)[idle] is None
+    assert _sampled_to(history)[active] == chain.w3.eth.block_number
+
+    # Not seen for longer than expire_days
+    with history._conn() as conn:
+        conn.execute("UPDATE holders SET last_seen = last_seen - 2 * 86400 WHERE holder = ?", (active,))
+    history.track(idle)
+    before = _sampled_to(history)[active]
+    chain.mine()
+
+    history.sync()
+    assert _sampled_to(history)[active] == before
+    assert _sampled_to(history)[idle] == chain.w3.eth.block_number
+
+
+def test_sampled_amounts_from_2_64_up_are_stored_exactly(chain, history):
+    holder = HOLDERS[0]
+    chain.set(history.tokens["stETH"].functions.balanceOf(holder), 2**70 + 5)
+    # The next grid block is the newest sample
+    chain.mine(RAW_STEP - chain.w3.eth.block_number % RAW_STEP)
+    history.track(holder)
+
+    history.sync()
+
+    _, series = history.series(holder, "stETH")
+    assert series.wei()[-1] == 2**70 + 5
+    assert series.blocks[-1] == chain.w3.eth.block_number
+
+
+def test_series_bytes_round_trip_is_exact():
+    series = Series.from_samples(range(len(AMOUNTS)), range(1000, 1000 + len(AMOUNTS)), AMOUNTS)
+
+    loaded = Series.from_bytes(series.to_bytes())
+
+    assert loaded.wei().tolist() == AMOUNTS
+    assert loaded.blocks.tolist() == list(range(len(AMOUNTS)))
+    assert loaded.timestamps.tolist() == list(range(1000, 1000 + len(AMOUNTS)))
+    with pytest.raises(OverflowError):
+        Series.from_samples([0], [0], [2**128])
+
+
+def test_merge_keeps_block_order_and_the_newer_sample_at_a_block():
+    old = Series.from_samples([10, 20, 30], [100, 200, 300], [1, 2, 3])
+    new = Series.from_samples([5, 20], [50, 200], [0, 2**64 + 2])
+
+    merged = old.merge(new)
+
+    assert merged.blocks.tolist() == [5, 10, 20, 30]
+    assert merged.wei().tolist() == [0, 1, 2**64 + 2, 3]
+
+
+def test_rollup_keeps_the_last_sample_of_each_bucket():
+    series = Series.from_samples(range(6), [0, 1800, 3599, 3600, 7300, 7400], [1, 2, 3, 4, 5, 6])
+
+    hourly = series.rollup(3600)
+
+    assert hourly.timestamps.tolist() == [3599, 3600, 7400]
+    assert hourly.wei().tolist() == [3, 4, 6]
+    assert series.rollup(0) is series
+
+
+def _store_days(history, holder, days, start=0):
+    """`days` of samples every RAW_STEP blocks (10 minutes), amount = block."""
+    blocks = list(range(start, start + days * 144 * RAW_STEP, RAW_STEP))
+    timestamps = [block * 12 for block in blocks]
+    history._store({(holder, "stETH"): (blocks, timestamps, blocks)}, [holder], blocks[-1])
+    return timestamps[-1]
+
+
+def test_retention_trims_each_level_and_records_where(history):
+    holder = HOLDERS[0]
+    now = _store_days(history, holder, 3)
+
+    raw, raw_trimmed = history._load(holder, "stETH", 0)
+    hourly, hourly_trimmed = history._load(holder, "stETH", 3600)
+
+    cutoff = now - LEVELS[0][1]
+    assert raw_trimmed == cutoff and raw.timestamps[0] >= cutoff and len(raw) == 2 * 144 + 1
+    # Within 90 days: nothing trimmed from the hourly level
+    assert hourly_trimmed == 0 and hourly.timestamps[0] < 3600
+    assert np.all(np.diff(hourly.timestamps // 3600) == 1)
+
+
+def test_series_reads_the_finest_level_covering_the_range(history):
+    holder = HOLDERS[0]
+    now = _store_days(history, holder, 3)
+
+    # The last day: raw samples, unless that is more than max_points
+    assert history.series(holder, "stETH", since=now - 86400)[0] == 0
+    assert history.series(holder, "stETH", since=now - 86400, max_points=100)[0] == 3600
+    # Older than the raw level keeps: hourly, whatever the count
+    bucket, series = history.series(holder, "stETH", since=now - 2.5 * 86400)
+    assert bucket == 3600 and series.timestamps[0] >= now - 2.5 * 86400
+    assert history.series(holder, "stETH")[0] == 3600
+    # Too many hours: daily
+    assert history.series(holder, "stETH", max_points=10)[0] == 86400
@@ -0,0 +1,91 @@
+from web3 import Web3
+
+from balance_reader import read_many, read_many_at
+from contracts import STETH_ABI
+from local_chain import REVERT_CODE
+from rpc_pool import PooledRPCProvider
+
+HOLDERS = [Web3.to_checksum_address("0x%040x" % (0xA11CE + i)) for i in range(3)]
+NO_CODE_ADDRESS = "0x000000000000000000000000000000000000dEaD"
+
+
+def _contracts(chain):
+    w3 = Web3(PooledRPCProvider([chain.url]))
+    steth = w3.eth.contract(chain.steth, abi=STETH_ABI)
+    simpleth = w3.eth.contract(chain.simpleth, abi=STETH_ABI)
+    return w3, steth, simpleth
+
+
+def _seed(chain, steth, simpleth):
+    values = []
+    for i, holder in enumerate(HOLDERS):
+        values += [(steth.functions.balanceOf(holder), (i + 1) * 10**18), (simpleth.functions.balanceOf(holder), i + 7)]
+    chain.set_many(values)
+
+
+def test_read_many_is_one_aggregate3_call(chain, rpc_methods):
+    w3, steth, simpleth = _contracts(chain)
+    _seed(chain, steth, simpleth)
+    rpc_methods.clear()
+
+    calls = [(contract, "balanceOf", [holder]) for holder in HOLDERS for contract in (steth, simpleth)]
+    values = read_many(w3, calls)
+
+    assert values == [value for i in range(len(HOLDERS)) for value in ((i + 1) * 10**18, i + 7)]
+    assert rpc_methods["eth_call"] == 1
+
+
+def test_reverting_call_is_retried_alone_and_returned_as_exception(chain, rpc_methods):
+    w3, steth, simpleth = _contracts(chain)
+    _seed(chain, steth, simpleth)
+    reverter = w3.eth.contract(chain.deploy(REVERT_CODE), abi=STETH_ABI)
+    rpc_methods.clear()
+
+    values = read_many(w3, [(steth, "balanceOf", [HOLDERS[0]]), (reverter, "balanceOf", [HOLDERS[0]]), (simpleth, "balanceOf", [HOLDERS[1]])])
+
+    assert values[0] == 10**18
+    assert isinstance(values[1], Exception)
+    assert values[2] == 8
+    # The batch, then only the failed item on its own
+    assert rpc_methods["eth_call"] == 2
+
+
+def test_undecodable_result_is_returned_as_exception(chain):
+    w3, steth, _ = _contracts(chain)
+    # A call to an address without code succeeds with empty return data
+    empty = w3.eth.contract(Web3.to_checksum_address(NO_CODE_ADDRESS), abi=STETH_ABI)
+
+    values = read_many(w3, [(steth, "balanceOf", [HOLDERS[2]]), (empty, "balanceOf", [HOLDERS[2]])])
+
+    assert values[0] == 3 * 10**18
+    assert isinstance(values[1], Exception)
+
+
+def test_falls_back_to_single_calls_without_multicall3(chain, rpc_methods):
+    w3, steth, simpleth = _contracts(chain)
+    _seed(chain, steth, simpleth)
+    rpc_methods.clear()
+
+    calls = [(steth, "balanceOf", [HOLDERS[1]]), (simpleth, "balanceOf", [HOLDERS[1]])]
+    values = read_many(w3, calls, multicall_address=NO_CODE_ADDRESS)
+
+    assert values == [2 * 10**18, 8]
+    assert rpc_methods["eth_call"] == 1 + len(calls)
+
+
+def test_read_many_at_reads_each_block(chain):
+    w3, steth, _ = _contracts(chain)
+    holder = Web3.to_checksum_address("0x%040x" % 0xB0B)
+    chain.set(steth.functions.balanceOf(holder), 5)
+    before = w3.eth.block_number
+    chain.set(steth.functions.balanceOf(holder), 6)
+
+    calls = [(steth, "balanceOf", [holder])]
+    assert read_many_at(w3, [(before, calls), ("latest", calls)]) == [[5], [6]]
+
+
+def test_empty_calls_make_no_request(chain, rpc_methods):
+    w3, _, _ = _contracts(chain)
+    assert read_many(w3, []) == []
+    assert read_many_at(w3, []) == []
+    assert sum(rpc_methods.values()) == 0
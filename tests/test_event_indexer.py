@@ -0,0 +1,138 @@
+import pytest
+from eth_abi import encode
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+
+import event_indexer
+from contracts import TRANSFER_EVENT_ABI
+from event_indexer import EventIndexer
+from local_chain import EMITTER_CODE
+from rpc_pool import PooledRPCProvider
+
+SENDER = Web3.to_checksum_address("0x%040x" % 0x5E4D)
+RECIPIENT = Web3.to_checksum_address("0x%040x" % 0x4EC1)
+TRANSFER_TOPIC = event_abi_to_log_topic(TRANSFER_EVENT_ABI)
+
+
+@pytest.fixture
+def emitter(chain):
+    return chain.deploy(EMITTER_CODE)
+
+
+@pytest.fixture
+def make_indexer(chain, emitter, tmp_path):
+    start_block = chain.w3.eth.block_number + 1
+
+    def make_indexer(**kwargs):
+        # A new indexer on the same file is what a restarted process sees
+        w3 = Web3(PooledRPCProvider([chain.url]))
+        kwargs.setdefault("confirmations", 0)
+        return EventIndexer(w3, {emitter: [TRANSFER_EVENT_ABI]}, name="test", start_block=start_block,
+                            db_path=str(tmp_path / "events.sqlite3"), **kwargs)
+
+    return make_indexer
+
+
+def _transfer(chain, emitter, amount):
+    """Log `Transfer(SENDER, RECIPIENT, amount)` from `emitter`, in a block of its own."""
+    data = TRANSFER_TOPIC + encode(["address", "address", "uint256"], [SENDER, RECIPIENT, amount])
+    chain.tester.send_transaction({
+        "from": chain.tester.get_accounts()[0], "to": emitter, "gas": 100000, "data": "0x" + data.hex(),
+    })
+    return chain.w3.eth.block_number
+
+
+def _amounts(indexer):
+    return sorted(row["amount"] for row in indexer.history(RECIPIENT, limit=1000))
+
+
+def _ranges(indexer, monkeypatch, fail=lambda from_block, to_block: None):
+    """`(from_block, to_block)` of every `eth_getLogs` the indexer sends; `fail` may raise instead of answering."""
+    ranges = []
+    get_logs = indexer.w3.eth.get_logs
+
+    def recording_get_logs(params):
+        ranges.append((params["fromBlock"], params["toBlock"]))
+        fail(params["fromBlock"], params["toBlock"])
+        return get_logs(params)
+
+    monkeypatch.setattr(indexer.w3.eth, "get_logs", recording_get_logs)
+    return ranges
+
+
+def test_resumes_from_the_checkpoint(chain, emitter, make_indexer, monkeypatch):
+    blocks = [_transfer(chain, emitter, amount) for amount in range(1, 7)]
+    first = make_indexer(chunk_size=2)
+    assert first.sync(max_ranges=1) == blocks[1]
+    # Logs and checkpoint were committed together: nothing past it is stored
+    assert _amounts(first) == [1, 2]
+
+    restarted = make_indexer(chunk_size=2)
+    ranges = _ranges(restarted, monkeypatch)
+    assert restarted.sync() == blocks[-1]
+    assert ranges[0][0] == blocks[2]
+    assert _amounts(restarted) == [1, 2, 3, 4, 5, 6]
+    assert restarted.totals(SENDER, emitter, ["Transfer"]) == {"Transfer": 21}
+
+
+def test_halves_the_range_on_a_range_error(chain, emitter, make_indexer, monkeypatch):
+    blocks = [_transfer(chain, emitter, amount) for amount in range(1, 9)]
+    indexer = make_indexer(chunk_size=8)
+
+    def fail(from_block, to_block):
+        if to_block - from_block + 1 > 2:
+            raise ValueError({"code": -32005, "message": "query returned more than 10000 results"})
+
+    ranges = _ranges(indexer, monkeypatch, fail)
+    assert indexer.sync() == blocks[-1]
+    assert [to_block - from_block + 1 for from_block, to_block in ranges[:3]] == [8, 4, 2]
+    assert _amounts(indexer) == list(range(1, 9))
+
+
+def test_retries_a_rate_limited_range_after_a_growing_pause(chain, emitter, make_indexer, monkeypatch):
+    monkeypatch.setattr(event_indexer, "RATE_LIMIT_BACKOFF", 0.01)
+    blocks = [_transfer(chain, emitter, amount) for amount in range(1, 4)]
+    indexer = make_indexer(chunk_size=8)
+    pauses = []
+    monkeypatch.setattr(indexer._stop, "wait", pauses.append)
+    failures = iter([True, True])
+
+    def fail(from_block, to_block):
+        if next(failures, False):
+            raise ValueError({"code": 429, "message": "Too Many Requests"})
+
+    ranges = _ranges(indexer, monkeypatch, fail)
+    assert indexer.sync() == blocks[-1]
+    # The same range each time, not a smaller one
+    assert ranges == [(blocks[0], blocks[-1])] * 3
+    assert pauses == [0.01, 0.02]
+    assert _amounts(indexer) == [1, 2, 3]
+
+    # Past MAX_RATE_LIMIT_RETRIES the error is raised and nothing is stored
+    _transfer(chain, emitter, 4)
+    failures = iter([True] * (event_indexer.MAX_RATE_LIMIT_RETRIES + 1))
+    with pytest.raises(ValueError, match="Too Many Requests"):
+        indexer.sync()
+    assert indexer.checkpoint()[0] == blocks[-1]
+
+
+def test_rewinds_when_the_checkpoint_block_is_reorganised(chain, emitter, make_indexer):
+    _transfer(chain, emitter, 1)
+    fork = chain.tester.take_snapshot()
+    for amount in (2, 3):
+        _transfer(chain, emitter, amount)
+    chain.mine(2)
+    indexer = make_indexer(confirmations=2)
+    indexer.sync()
+    checkpoint, checkpoint_hash = indexer.checkpoint()
+    assert _amounts(indexer) == [1, 2, 3]
+
+    # The two blocks after the fork are replaced by ones with other logs, and the chain grows past them
+    chain.tester.revert_to_snapshot(fork)
+    for amount in (20, 30):
+        _transfer(chain, emitter, amount)
+    chain.mine(3)
+    assert Web3.to_hex(chain.w3.eth.get_block(checkpoint)["hash"]) != checkpoint_hash
+
+    assert indexer.sync() == chain.w3.eth.block_number - 2
+    assert _amounts(indexer) == [1, 20, 30]
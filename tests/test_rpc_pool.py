@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from web3 import Web3
+
+from contracts import STETH_ABI
+from rpc_pool import PooledRPCProvider, RetryableRPCError
+
+
+class StubRPC:
+    """JSON-RPC endpoint that answers every request with `result`.
+
+    `statuses` are HTTP status codes to answer the next requests with instead,
+    in order; `delay` is added to every response.
+    """
+
+    def __init__(self, delay=0.0, statuses=(), retry_after=None, result="0x1"):
+        self.delay = delay
+        self.statuses = list(statuses)
+        self.retry_after = retry_after
+        self.result = result
+        self.methods = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                message = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.methods.append(message["method"] if isinstance(message, dict) else "batch")
+                time.sleep(stub.delay)
+                if stub.statuses:
+                    self.send_response(stub.statuses.pop(0))
+                    if stub.retry_after is not None:
+                        self.send_header("Retry-After", str(stub.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = json.dumps({"jsonrpc": "2.0", "id": message["id"], "result": stub.result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stubs():
+    created = []
+
+    def make(**kwargs):
+        created.append(StubRPC(**kwargs))
+        return created[-1]
+
+    yield make
+    for stub in created:
+        stub.close()
+
+
+def test_requests_go_to_the_fastest_endpoint(stubs):
+    slow, fast = stubs(delay=0.2), stubs()
+    provider = PooledRPCProvider([slow.url, fast.url])
+
+    for _ in range(10):
+        assert provider.make_request("eth_blockNumber", [])["result"] == "0x1"
+
+    # The slow endpoint is tried once, then the fast one takes everything
+    assert len(slow.methods) == 1
+    assert len(fast.methods) == 9
+
+
+def test_server_errors_are_retried_on_the_next_endpoint(stubs):
+    failing, healthy = stubs(statuses=[503] * 10), stubs()
+    provider = PooledRPCProvider([failing.url, healthy.url], backoff=0)
+
+    assert provider.make_request("eth_blockNumber", [])["result"] == "0x1"
+    assert len(failing.methods) == 1
+    assert len(healthy.methods) == 1
+    assert provider.endpoints[0].error_rate > provider.endpoints[1].error_rate
+
+
+def test_rate_limit_honours_retry_after_on_a_single_endpoint(stubs):
+    stub = stubs(statuses=[429], retry_after=0.3)
+    provider = PooledRPCProvider([stub.url], backoff=0.001)
+
+    start = time.monotonic()
+    assert provider.make_request("eth_blockNumber", [])["result"] == "0x1"
+    assert time.monotonic() - start >= 0.3
+    assert len(stub.methods) == 2
+
+
+def test_gives_up_after_the_last_retry(stubs):
+    stub = stubs(statuses=[503] * 10)
+    provider = PooledRPCProvider([stub.url], retries=2, backoff=0)
+
+    with pytest.raises(RetryableRPCError):
+        provider.make_request("eth_blockNumber", [])
+    assert len(stub.methods) == 3
+
+
+def test_slow_read_is_hedged_to_the_runner_up(stubs):
+    slow, fast = stubs(delay=1.0, result="0x2"), stubs(result="0x3")
+    provider = PooledRPCProvider([slow.url, fast.url], hedge=True, hedge_after=0.05)
+
+    start = time.monotonic()
+    assert provider.make_request("eth_blockNumber", [])["result"] == "0x3"
+    assert time.monotonic() - start < 0.5
+    assert len(slow.methods) == 1
+    assert len(fast.methods) == 1
+
+
+def test_writes_are_never_hedged(stubs):
+    slow, fast = stubs(delay=0.3), stubs()
+    provider = PooledRPCProvider([slow.url, fast.url], hedge=True, hedge_after=0.05)
+
+    provider.make_request("eth_sendRawTransaction", ["0x00"])
+    assert slow.methods == ["eth_sendRawTransaction"]
+    assert fast.methods == []
+
+
+def test_eth_call_is_one_round_trip_from_any_thread(chain, rpc_methods):
+    w3 = Web3(PooledRPCProvider([chain.url]))
+    steth = w3.eth.contract(chain.steth, abi=STETH_ABI)
+    read = steth.functions.balanceOf(chain.steth).call
+
+    read()
+    rpc_methods.clear()
+    for _ in range(3):
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+    read()
+
+    assert dict(rpc_methods) == {"eth_call": 4}
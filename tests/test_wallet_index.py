@@ -0,0 +1,104 @@
+import random
+
+import pytest
+from web3 import Web3
+
+import wallet_index
+from wallet_index import KEY_LENGTH, WalletIndex
+from wallet_store import SQLiteWalletStore
+
+PAGE_SIZE = 7
+
+
+def _addresses(rng, count):
+    # Checksummed, so case matters; a few shared prefixes give long prefix runs and repeated trigrams
+    bases = ["%040x" % rng.getrandbits(160) for _ in range(4)] + ["0" * KEY_LENGTH]
+    addresses = []
+    for _ in range(count):
+        digits = "%040x" % rng.getrandbits(160)
+        if rng.random() < 0.3:
+            shared = rng.randrange(1, KEY_LENGTH)
+            digits = rng.choice(bases)[:shared] + digits[shared:]
+        addresses.append(Web3.to_checksum_address("0x" + digits))
+    return list(dict.fromkeys(addresses))
+
+
+def _scan(indexed, recent, query):
+    """What `search()` should return, by checking every address: indexed ones first, each part in address order."""
+    digits = query.strip().lower()
+    prefix = digits.startswith("0x")
+    if prefix:
+        digits = digits[2:]
+    if len(digits) > KEY_LENGTH or digits.strip("0123456789abcdef"):
+        return []
+
+    def matching(addresses):
+        keys = sorted((address[2:].lower(), address) for address in addresses)
+        return [address for key, address in keys if (key.startswith(digits) if prefix else digits in key)]
+
+    return matching(indexed) + matching(recent)
+
+
+def _queries(rng, addresses):
+    queries = ["", "   ", "0x", "0X", "a", "0", "00", "ff", "0x0", "0x00", "0xff", "abc", "000", "deadbeef"]
+    for address in rng.sample(addresses, min(len(addresses), 40)):
+        key = address[2:]
+        start = rng.randrange(KEY_LENGTH)
+        length = rng.randint(1, KEY_LENGTH - start)
+        queries += [key[start:start + length], key[start:start + length].upper(), address[:2 + length],
+                    " " + address.lower() + " ", key]
+    # Not hex digits, or longer than an address
+    queries += ["xyz", "0xg", "12 34", "0x0x", "-1", "é", "a" * (KEY_LENGTH + 1), "0x" + "0" * (KEY_LENGTH + 1)]
+    return queries
+
+
+def _check(index, indexed, recent, queries):
+    for query in queries:
+        expected = _scan(indexed, recent, query)
+        matches = index.search(query)
+        assert len(matches) == len(expected), query
+        assert matches.page_count(PAGE_SIZE) == max(1, -(-len(expected) // PAGE_SIZE)), query
+        for page in range(matches.page_count(PAGE_SIZE) + 1):
+            assert matches.page(page, PAGE_SIZE) == expected[page * PAGE_SIZE:(page + 1) * PAGE_SIZE], (query, page)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteWalletStore(str(tmp_path / "wallets.sqlite3"))
+
+
+def test_empty_store(store):
+    index = WalletIndex(store)
+    assert index.count() == 0
+    _check(index, [], [], _queries(random.Random(0), []))
+
+
+def test_search_matches_linear_scan(store):
+    rng = random.Random(1)
+    addresses = _addresses(rng, 3000)
+    store.put_many((address, {}) for address in addresses)
+    index = WalletIndex(store)
+    assert index.count() == len(addresses)
+    _check(index, addresses, [], _queries(rng, addresses))
+
+
+def test_recent_wallets_are_searched_until_the_index_is_rebuilt(store, monkeypatch):
+    monkeypatch.setattr(wallet_index, "RECENT_LIMIT", 100)
+    rng = random.Random(2)
+    addresses = _addresses(rng, 1200)
+    indexed, recent, rebuilt = addresses[:1000], addresses[1000:1050], addresses[1050:]
+    store.put_many((address, {}) for address in indexed)
+    index = WalletIndex(store, max_age=3600)
+    index.count()
+
+    # Unseen until the index checks the store again
+    store.put_many((address, {}) for address in recent)
+    assert index.count() == len(indexed)
+    index.invalidate()
+    assert index.count() == len(indexed) + len(recent)
+    _check(index, indexed, recent, _queries(rng, addresses[:1050]))
+
+    # Past RECENT_LIMIT new wallets, everything is indexed together
+    store.put_many((address, {}) for address in rebuilt)
+    index.invalidate()
+    _check(index, addresses, [], _queries(rng, addresses))
@@ -0,0 +1,149 @@
+import time
+
+import pytest
+from eth_account import Account
+from web3 import Web3
+
+from balance_cache import BalanceCache
+from contracts import STETH_ABI
+from fee_oracle import FeeOracle
+from local_chain import ERC20_CODE
+from rpc_pool import PooledRPCProvider
+from withdrawals import TransferService
+
+
+def _service(chain, **kwargs):
+    w3 = Web3(PooledRPCProvider([chain.url]))
+    return w3, w3.eth.contract(chain.steth, abi=STETH_ABI), TransferService(w3, poll_interval=0.01, **kwargs)
+
+
+def _settle(service, records, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while any(r["status"] == "pending" for r in records) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return [r["status"] for r in records]
+
+
+def test_transfers_from_one_wallet_take_consecutive_nonces(chain, rpc_methods):
+    w3, token, service = _service(chain)
+    account = Account.create()
+    chain.fund([account.address])
+    rpc_methods.clear()
+
+    records = [service.submit(account.key, token, chain.simpleth, i + 1) for i in range(3)]
+
+    assert [r["nonce"] for r in records] == [0, 1, 2]
+    # Read from the node once, then handed out locally
+    assert rpc_methods["eth_getTransactionCount"] == 1
+    assert _settle(service, records) == ["confirmed"] * 3
+    assert [r["block"] for r in records] == sorted(r["block"] for r in records)
+    assert service.for_address(account.address) == records[::-1]
+    service.close()
+
+
+def test_rejected_send_leaves_its_nonce_for_the_next_transfer(chain):
+    w3, token, service = _service(chain)
+    account = Account.create()
+
+    # No ETH for gas: the node rejects the transfer and nothing is recorded
+    with pytest.raises(Exception, match="cannot afford"):
+        service.submit(account.key, token, chain.simpleth, 1)
+    assert service.for_address(account.address) == []
+
+    chain.fund([account.address])
+    record = service.submit(account.key, token, chain.simpleth, 1)
+
+    assert record["nonce"] == 0
+    assert _settle(service, [record]) == ["confirmed"]
+    service.close()
+
+
+def test_nonce_used_elsewhere_is_resynced_and_retried(chain):
+    w3, token, service = _service(chain)
+    account = Account.create()
+    chain.fund([account.address])
+    first = service.submit(account.key, token, chain.simpleth, 1)
+
+    # Another sender takes nonce 1 behind the service's back
+    tx = token.functions.transfer(chain.simpleth, 2).build_transaction({"from": account.address, "chainId": w3.eth.chain_id})
+    w3.eth.send_raw_transaction(account.sign_transaction(dict(tx, nonce=1)).raw_transaction)
+    second = service.submit(account.key, token, chain.simpleth, 3)
+
+    assert (first["nonce"], second["nonce"]) == (0, 2)
+    assert _settle(service, [first, second]) == ["confirmed", "confirmed"]
+    service.close()
+
+
+def test_amount_over_the_balance_is_refused_before_signing(chain, rpc_methods):
+    w3 = Web3(PooledRPCProvider([chain.url]))
+    balances = BalanceCache(w3)
+    w3, token, service = _service(chain, fee_oracle=FeeOracle(w3, head=balances.latest_block), balance_cache=balances)
+    account = Account.create()
+    chain.fund([account.address])
+    chain.set(token.functions.balanceOf(account.address), 10)
+    # A warm gas estimate, as after any earlier withdrawal
+    service.submit(account.key, token, chain.simpleth, 10)
+    rpc_methods.clear()
+
+    with pytest.raises(ValueError, match="available balance"):
+        service.submit(account.key, token, chain.simpleth, 11)
+    assert rpc_methods["eth_sendRawTransaction"] == 0
+    service.close()
+
+
+def test_transfer_to_a_fresh_recipient_after_a_warm_estimate_is_mined(chain):
+    w3 = Web3(PooledRPCProvider([chain.url]))
+    token = w3.eth.contract(chain.deploy(ERC20_CODE), abi=STETH_ABI)
+    service = TransferService(w3, poll_interval=0.01, fee_oracle=FeeOracle(w3))
+    account = Account.create()
+    holder, fresh = (Web3.to_checksum_address("0x%040x" % n) for n in (0x401D, 0xF2E5))
+    chain.fund([account.address])
+    chain.set_many([(token.functions.balanceOf(account.address), 10), (token.functions.balanceOf(holder), 1)])
+
+    # The cheaper transfer first: a slot that is already set
+    records = [service.submit(account.key, token, holder, 1), service.submit(account.key, token, fresh, 1)]
+
+    assert _settle(service, records) == ["confirmed", "confirmed"]
+    assert token.functions.balanceOf(fresh).call() == 1
+    service.close()
+
+
+def test_timed_out_transfer_stays_reserved_and_its_dropped_nonce_is_reused(chain):
+    w3, token, service = _service(chain, timeout=0.2)
+    account = Account.create()
+    chain.fund([account.address])
+    chain.set(token.functions.balanceOf(account.address), 10)
+    chain.tester.disable_auto_mine_transactions()
+    try:
+        record = service.submit(account.key, token, chain.simpleth, 4)
+        assert _settle(service, [record]) == ["timeout"]
+        # It may still be mined
+        assert service._available(token, account.address) == 6
+        # The node drops it
+        chain.tester._pending_transactions.clear()
+    finally:
+        chain.tester.enable_auto_mine_transactions()
+
+    retry = service.submit(account.key, token, chain.simpleth, 4)
+
+    assert retry["nonce"] == record["nonce"]
+    assert _settle(service, [retry]) == ["confirmed"]
+    assert service._available(token, account.address) == 10
+    assert record["settled_at"] is not None
+    service.close()
+
+
+def test_settled_transfers_are_evicted_beyond_max_settled(chain):
+    w3, token, service = _service(chain, max_settled=2)
+    account = Account.create()
+    chain.fund([account.address])
+
+    records = []
+    for i in range(4):
+        records.append(service.submit(account.key, token, chain.simpleth, i + 1))
+        _settle(service, records)
+
+    # The newest is kept whatever its state, plus the two most recently settled before it
+    assert [r["nonce"] for r in service.for_address(account.address)] == [3, 2, 1]
+    assert service.status(records[0]["tx_hash"]) is None
+    service.close()
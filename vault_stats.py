@@ -0,0 +1,73 @@
+"""Vault-wide stats shared by every Kinetix session.
+
+`VaultStats.get()` returns the vault's `decimals`, `beneficiary`,
+`vaultBalance` and `stakingRewards` without each donor's rerun asking the node
+for them:
+
+- `decimals` and `beneficiary` are read once and kept for the process
+  lifetime;
+- `vaultBalance` and `stakingRewards` are re-read at most once per block. The
+  refresh is single-flight: the first caller to see a new block reads both in
+  one JSON-RPC batch, and callers arriving meanwhile wait for and share its
+  result instead of sending the same reads.
+
+The head is polled with `eth_blockNumber` at most every `head_check_interval`
+seconds, so N concurrent donors cost one head check per interval and one batch
+per block rather than four reads each per rerun.
+"""
+import threading
+import time
+
+from rpc_batch import RPCBatch
+
+
+class VaultStats:
+    def __init__(self, w3, vault, steth, head_check_interval=2.0):
+        self.w3 = w3
+        self.vault = vault
+        self.steth = steth
+        self.head_check_interval = head_check_interval
+        self._head = None
+        self._head_checked_at = 0.0
+        self._immutables = None
+        self._current = None  # (block, stats), replaced as one so readers never pair one block with another's stats
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def latest_block(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._head is not None and now - self._head_checked_at < self.head_check_interval:
+                return self._head
+        head = self.w3.eth.block_number
+        with self._lock:
+            # Only move forward, so an endpoint lagging a block behind doesn't trigger a refresh
+            self._head = max(head, self._head or 0)
+            self._head_checked_at = now
+            return self._head
+
+    def get(self):
+        """`{"decimals", "beneficiary", "vault_balance", "staking_rewards", "block"}` as of the latest block."""
+        block = self.latest_block()
+        current = self._current
+        if current is not None and current[0] == block:
+            return current[1]
+        with self._refresh_lock:
+            # Someone else may have refreshed this block while we waited
+            current = self._current
+            if current is not None and current[0] == block:
+                return current[1]
+            with RPCBatch(self.w3) as batch:
+                if self._immutables is None:
+                    batch.add(self.steth.functions.decimals())
+                    batch.add(self.vault.functions.beneficiary())
+                batch.add(self.vault.functions.vaultBalance())
+                batch.add(self.vault.functions.stakingRewards())
+            results = batch.results
+            if self._immutables is None:
+                self._immutables = {"decimals": results[0], "beneficiary": results[1]}
+                results = results[2:]
+            vault_balance, staking_rewards = results
+            stats = dict(self._immutables, vault_balance=vault_balance, staking_rewards=staking_rewards, block=block)
+            self._current = (block, stats)
+            return stats
@@ -0,0 +1,195 @@
+"""In-memory search index over the wallet DB's addresses, for the admin browser.
+
+`WalletIndex` keeps every address of a wallet store sorted by its lowercase
+hex digits, in NumPy arrays, and answers searches with the positions of the
+matching wallets:
+
+- `0x…` queries are prefix searches: a binary search over the sorted keys
+  gives the matching run as a `range`, whatever its size;
+- other queries match anywhere in the address. Three characters or more are
+  looked up in a trigram index (one ascending posting array of record numbers
+  per trigram): the rarest of the query's trigrams gives the candidates, the
+  others' postings narrow them, and the survivors are checked against the full
+  query. One or two characters are read from a bitset per hex digit and per
+  digit pair, over all records.
+
+`Matches` only turns positions into addresses for the page being shown, so
+the browser never holds a widget per wallet.
+
+The store's wallet count is checked at most every `max_age` seconds (or on the
+next search after `invalidate`). Wallets are only ever added, so a new count
+means new wallets: up to `RECENT_LIMIT` of them are kept in a short list that
+is scanned directly and listed after the indexed ones, and past that the index
+is rebuilt with them.
+"""
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_MAX_AGE = 5.0
+DEFAULT_PAGE_SIZE = 50
+RECENT_LIMIT = 2048
+VERIFY_DIRECTLY = 64  # candidates few enough to check against the query without narrowing further
+KEY_LENGTH = 40  # hex digits in an address
+HEX_DIGITS = "0123456789abcdef"
+
+# ASCII code -> nibble value, for lowercase hex digits
+_NIBBLES = np.zeros(256, dtype=np.uint8)
+_NIBBLES[np.frombuffer(HEX_DIGITS.encode(), dtype=np.uint8)] = np.arange(16, dtype=np.uint8)
+
+
+class Matches:
+    """Matching wallets: positions in the index, in address order, then recent matches."""
+
+    def __init__(self, addresses, positions, recent=()):
+        self._addresses = addresses
+        self.positions = positions
+        self.recent = list(recent)
+
+    def __len__(self):
+        return len(self.positions) + len(self.recent)
+
+    def page(self, page, page_size=DEFAULT_PAGE_SIZE):
+        start = page * page_size
+        stop = start + page_size
+        rows = [self._addresses[i] for i in self.positions[start:stop]]
+        indexed = len(self.positions)
+        if stop > indexed:
+            rows += self.recent[max(0, start - indexed):stop - indexed]
+        return rows
+
+    def page_count(self, page_size=DEFAULT_PAGE_SIZE):
+        return max(1, -(-len(self) // page_size))
+
+
+def _bitsets(codes, values, count):
+    """`(values, count)` bits, packed along records: bit r of row v is set if record r has code v."""
+    bits = np.zeros(values * count, dtype=bool)
+    records = np.repeat(np.arange(count), codes.shape[1])
+    bits[codes.ravel().astype(np.intp) * count + records] = True
+    return np.packbits(bits.reshape(values, count), axis=1)
+
+
+class _Snapshot:
+    def __init__(self, addresses):
+        keys = np.array([address[2:].lower() for address in addresses], dtype=f"S{KEY_LENGTH}")
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.addresses = [addresses[i] for i in order]
+        self.known = None
+        count = len(self.keys)
+        nibbles = _NIBBLES[np.frombuffer(self.keys.tobytes(), dtype=np.uint8)].reshape(count, KEY_LENGTH)
+        self.digits = _bitsets(nibbles, 16, count)
+        self.pairs = _bitsets((nibbles[:, :-1].astype(np.uint16) << 4) | nibbles[:, 1:], 256, count)
+
+        trigrams = ((nibbles[:, :-2].astype(np.uint16) << 8) | (nibbles[:, 1:-1].astype(np.uint16) << 4) | nibbles[:, 2:]).ravel()
+        records = np.repeat(np.arange(count, dtype=np.int32), KEY_LENGTH - 2)
+        # Stable, so record numbers stay ascending within each trigram
+        order = np.argsort(trigrams, kind="stable")
+        trigrams, records = trigrams[order], records[order]
+        # The same trigram twice in one address is posted once
+        keep = np.ones(len(records), dtype=bool)
+        keep[1:] = (trigrams[1:] != trigrams[:-1]) | (records[1:] != records[:-1])
+        trigrams, self.postings = trigrams[keep], records[keep]
+        self.offsets = np.zeros(4097, dtype=np.int64)
+        np.cumsum(np.bincount(trigrams, minlength=4096), out=self.offsets[1:])
+
+    def prefix(self, digits):
+        start = np.searchsorted(self.keys, digits.encode(), side="left")
+        if len(digits) == KEY_LENGTH:
+            stop = np.searchsorted(self.keys, digits.encode(), side="right")
+        else:
+            # Every key with this prefix sorts before the prefix followed by "g"
+            stop = np.searchsorted(self.keys, (digits + "g").encode(), side="left")
+        return range(int(start), int(stop))
+
+    def substring(self, digits):
+        nibbles = [HEX_DIGITS.index(c) for c in digits]
+        if len(nibbles) <= 2:
+            value = nibbles[0] if len(nibbles) == 1 else nibbles[0] << 4 | nibbles[1]
+            bits = self.digits if len(nibbles) == 1 else self.pairs
+            return np.flatnonzero(np.unpackbits(bits[value], count=len(self.keys)))
+        trigrams = sorted(
+            {nibbles[i] << 8 | nibbles[i + 1] << 4 | nibbles[i + 2] for i in range(len(nibbles) - 2)},
+            key=lambda t: self.offsets[t + 1] - self.offsets[t],
+        )
+        candidates = self._postings(trigrams[0])
+        for trigram in trigrams[1:]:
+            if len(candidates) <= VERIFY_DIRECTLY:
+                break
+            postings = self._postings(trigram)
+            if not len(postings):
+                return postings
+            found = postings[np.minimum(np.searchsorted(postings, candidates), len(postings) - 1)]
+            candidates = candidates[found == candidates]
+        if len(trigrams) == 1 and len(nibbles) == 3:
+            return candidates
+        # Having all the trigrams doesn't mean having them in this order
+        needle = digits.encode()
+        return candidates[[needle in key for key in self.keys[candidates].tolist()]]
+
+    def _postings(self, trigram):
+        return self.postings[self.offsets[trigram]:self.offsets[trigram + 1]]
+
+
+class WalletIndex:
+    def __init__(self, store, max_age=DEFAULT_MAX_AGE):
+        self.store = store
+        self.max_age = max_age
+        # (snapshot, [(lowercase digits, address) added since it, sorted]), swapped as one
+        self._state = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def count(self):
+        """Wallets in the index, after checking the store as a search would."""
+        snapshot, recent = self._current()
+        return len(snapshot.addresses) + len(recent)
+
+    def invalidate(self):
+        """Check the store again on the next search, e.g. after this process created wallets."""
+        self._checked_at = 0.0
+
+    def _current(self):
+        state = self._state
+        if state is not None and time.monotonic() - self._checked_at < self.max_age:
+            return state
+        # One session refreshes; the others wait and then use its result
+        with self._lock:
+            if self._state is not state:
+                return self._state
+            if state is None:
+                self._state = (_Snapshot(self.store.addresses()), [])
+            else:
+                snapshot, recent = state
+                if len(self.store) != len(snapshot.addresses) + len(recent):
+                    addresses = self.store.addresses()
+                    if snapshot.known is None:
+                        snapshot.known = set(snapshot.addresses)
+                    added = [address for address in addresses if address not in snapshot.known]
+                    if len(added) > RECENT_LIMIT:
+                        self._state = (_Snapshot(addresses), [])
+                    else:
+                        self._state = (snapshot, sorted((address[2:].lower(), address) for address in added))
+            self._checked_at = time.monotonic()
+            return self._state
+
+    def search(self, query):
+        """Wallets whose address starts with a `0x…` query, or contains any other query.
+
+        Case-insensitive; an empty query matches every wallet, and one with
+        anything other than hex digits matches none.
+        """
+        snapshot, recent = self._current()
+        digits = query.strip().lower()
+        prefix = digits.startswith("0x")
+        if prefix:
+            digits = digits[2:]
+        if not digits:
+            return Matches(snapshot.addresses, range(len(snapshot.addresses)), (address for _, address in recent))
+        if len(digits) > KEY_LENGTH or digits.strip(HEX_DIGITS):
+            return Matches(snapshot.addresses, range(0))
+        if prefix:
+            return Matches(snapshot.addresses, snapshot.prefix(digits), (a for key, a in recent if key.startswith(digits)))
+        return Matches(snapshot.addresses, snapshot.substring(digits), (a for key, a in recent if digits in key))
@@ -0,0 +1,184 @@
+"""Wallet DB backends.
+
+Both stores map a checksum address to its wallet record (`{"keystore": ...}`,
+or `{"private_key": ..., "access_code": ...}` for wallets created before
+records were encrypted; see `keystore`) and expose the same methods:
+`get`, `put`, `put_many`, `addresses`, `load_all` and `len()`.
+
+- `JSONWalletStore` keeps today's `wallet_db.json` format and is the default.
+  The parsed file is kept in memory and only re-read when its inode, mtime or
+  size changes, so reruns that just look a wallet up skip the JSON parse.
+- `SQLiteWalletStore` keeps one row per wallet in a WAL-mode SQLite file with
+  the address as primary key, so inserts and lookups do not touch the other
+  wallets and several processes can write at once.
+
+`migrate_json_to_sqlite` copies an existing JSON DB into a SQLite store.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within the process
+    fcntl = None
+
+WALLET_STORE_BACKEND = os.environ.get("SIMPLETH_WALLET_STORE", "json")
+WALLET_DB_FILE = "wallet_db.json"
+WALLET_SQLITE_FILE = "wallet_db.sqlite3"
+
+
+class JSONWalletStore:
+    def __init__(self, path=WALLET_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._cache = None
+        self._cache_signature = None
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _cached_db(self):
+        signature = self._signature()
+        with self._cache_lock:
+            if self._cache is not None and signature == self._cache_signature:
+                return self._cache
+        if signature is None:
+            db = {}
+        else:
+            with open(self.path, "r") as f:
+                db = json.load(f)
+        with self._cache_lock:
+            self._cache = db
+            self._cache_signature = signature
+        return db
+
+    def load_all(self):
+        return dict(self._cached_db())
+
+    def get(self, address):
+        return self._cached_db().get(address)
+
+    def addresses(self):
+        return list(self._cached_db())
+
+    def __len__(self):
+        return len(self._cached_db())
+
+    def put(self, address, info):
+        self.put_many([(address, info)])
+
+    def put_many(self, items):
+        with self._write_lock():
+            db = dict(self._cached_db())
+            db.update(items)
+            self._write(db)
+            # Update the cache in place rather than re-parsing what we just wrote
+            with self._cache_lock:
+                self._cache = db
+                self._cache_signature = self._signature()
+
+    def _write(self, db):
+        # Write to a temp file and rename so readers never see a half-written DB
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(db, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SQLiteWalletStore:
+    def __init__(self, path=WALLET_SQLITE_FILE, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS wallets ("
+            " address TEXT PRIMARY KEY,"
+            " record TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 connections must stay on the thread that opened them
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, address):
+        row = self._conn().execute("SELECT record FROM wallets WHERE address = ?", (address,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def addresses(self):
+        return [row[0] for row in self._conn().execute("SELECT address FROM wallets ORDER BY address")]
+
+    def load_all(self):
+        return {address: json.loads(record) for address, record in self._conn().execute("SELECT address, record FROM wallets")}
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM wallets").fetchone()[0]
+
+    def put(self, address, info):
+        self.put_many([(address, info)])
+
+    def put_many(self, items):
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO wallets (address, record) VALUES (?, ?)",
+                ((address, json.dumps(info)) for address, info in items),
+            )
+
+
+def open_wallet_store(backend=WALLET_STORE_BACKEND, path=None):
+    if backend == "json":
+        return JSONWalletStore(path or WALLET_DB_FILE)
+    if backend == "sqlite":
+        return SQLiteWalletStore(path or WALLET_SQLITE_FILE)
+    raise ValueError(f"Unknown wallet store backend: {backend}")
+
+
+def migrate_json_to_sqlite(json_path=WALLET_DB_FILE, sqlite_path=WALLET_SQLITE_FILE):
+    """Copy every wallet from the JSON DB into SQLite; returns the number copied."""
+    db = JSONWalletStore(json_path).load_all()
+    SQLiteWalletStore(sqlite_path).put_many(db.items())
+    return len(db)
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    count = migrate_json_to_sqlite(*args)
+    print(f"Migrated {count} wallets to {args[1] if len(args) > 1 else WALLET_SQLITE_FILE}")
@@ -0,0 +1,233 @@
+"""Signed token transfers with a pipelined nonce manager.
+
+`TransferService.submit` builds an ERC-20 `transfer`, signs it locally with the
+wallet's private key and sends the raw transaction, then returns straight away:
+a small worker pool polls for the receipt with backoff and updates the
+transfer's record (`pending` -> `confirmed` / `failed` / `timeout`).
+
+A `timeout` transfer may still be mined, or may have been dropped by the
+node. While its nonce is unused its amount stays reserved, and if the
+wallet's mined count has not reached it when it times out, the nonce manager
+resyncs from the node so that a dropped transfer's nonce is reused rather
+than leaving every later withdrawal waiting behind the gap.
+
+Nonces come from `NonceManager`, which reads the account's pending transaction
+count once and then hands out consecutive nonces locally, so several transfers
+from the same wallet go out back to back instead of each waiting for the
+previous one to be mined. Building the transaction (gas estimate, fees) happens
+before a nonce is reserved, and a failed send resyncs the nonce from the node,
+so a rejected transfer never leaves a gap.
+
+Fees come from `fee_oracle` (a `FeeOracle`) when one is given, so a burst of
+withdrawals shares one fee sample per block; gas is estimated for each
+transfer, as its cost depends on whether the recipient already holds the
+token. The estimate runs against the latest block, which does not include
+this wallet's transfers still pending here, so the amount is also checked
+against the wallet's token balance (from `balance_cache` when given) less
+those before anything is signed; a transfer that reverts anyway shows up as
+`failed`.
+
+Settled records are kept for `keep_settled` seconds, and at most
+`max_settled` of them, so the shared service does not grow with every
+withdrawal the server has ever sent; pending ones, and timed-out ones whose
+nonce is unused, are always kept.
+
+Works against any provider, eth-tester included.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+DEFAULT_WORKERS = 4
+POLL_INTERVAL = 0.5
+MAX_POLL_INTERVAL = 8.0
+RECEIPT_TIMEOUT = 600.0
+KEEP_SETTLED = 3600.0
+MAX_SETTLED = 1000
+
+
+class NonceManager:
+    def __init__(self, w3):
+        self.w3 = w3
+        self._next = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, address):
+        with self._locks_lock:
+            return self._locks.setdefault(address, threading.Lock())
+
+    @contextmanager
+    def reserve(self, address):
+        """Yield the next nonce for `address`; it is used up only if the block exits cleanly.
+
+        Holding the per-address lock across the send keeps nonces and
+        submission order in step.
+        """
+        with self._lock(address):
+            nonce = self._next.get(address)
+            if nonce is None:
+                nonce = self.w3.eth.get_transaction_count(address, "pending")
+            try:
+                yield nonce
+            except Exception:
+                # The node may or may not have taken it: ask again next time
+                self._next.pop(address, None)
+                raise
+            self._next[address] = nonce + 1
+
+    def resync(self, address):
+        with self._lock(address):
+            self._next.pop(address, None)
+
+
+class TransferService:
+    def __init__(self, w3, workers=DEFAULT_WORKERS, poll_interval=POLL_INTERVAL,
+                 max_poll_interval=MAX_POLL_INTERVAL, timeout=RECEIPT_TIMEOUT, fee_oracle=None,
+                 keep_settled=KEEP_SETTLED, max_settled=MAX_SETTLED, balance_cache=None):
+        self.w3 = w3
+        self.fee_oracle = fee_oracle
+        self.balance_cache = balance_cache
+        self.nonces = NonceManager(w3)
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self.keep_settled = keep_settled
+        self.max_settled = max_settled
+        self.transfers = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="receipts")
+        self._chain_id = None
+
+    @property
+    def chain_id(self):
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        return self._chain_id
+
+    def submit(self, private_key, token, to, amount):
+        """Sign and send `token.transfer(to, amount)` from the key's account; returns its record.
+
+        Raises if the amount is over the wallet's balance, the transfer cannot
+        be built (e.g. when it would revert) or the node rejects it; nothing is
+        recorded in that case.
+        """
+        from eth_account import Account
+
+        account = Account.from_key(private_key)
+        to = self.w3.to_checksum_address(to)
+        fn = token.functions.transfer(to, amount)
+        params = {"from": account.address, "chainId": self.chain_id}
+        if self.fee_oracle is not None:
+            # The gas estimate does not see this wallet's pending transfers
+            available = self._available(token, account.address)
+            if amount > available:
+                raise ValueError(f"amount is more than the wallet's available balance ({available} base units)")
+            params.update(self.fee_oracle.fees(), gas=self.fee_oracle.estimate_gas(fn, {"from": account.address}))
+        tx = fn.build_transaction(params)
+        for attempt in range(2):
+            try:
+                with self.nonces.reserve(account.address) as nonce:
+                    signed = account.sign_transaction(dict(tx, nonce=nonce))
+                    tx_hash = self.w3.eth.send_raw_transaction(signed.raw_transaction)
+                break
+            except Exception as e:
+                # Someone else used this wallet: the resynced nonce will be right
+                if attempt == 0 and "nonce" in str(e).lower():
+                    continue
+                raise
+        record = {
+            "tx_hash": self.w3.to_hex(tx_hash),
+            "from": account.address,
+            "to": to,
+            "token": token.address,
+            "amount": amount,
+            "nonce": nonce,
+            "status": "pending",
+            "block": None,
+            "error": None,
+            "submitted_at": time.time(),
+            "settled_at": None,
+        }
+        with self._lock:
+            self._evict_settled()
+            self.transfers[record["tx_hash"]] = record
+        self._pool.submit(self._track, record)
+        return record
+
+    def _available(self, token, address):
+        """`address`'s token balance less what its transfers that may still be mined will take."""
+        if self.balance_cache is not None:
+            (balance,) = self.balance_cache.get_balances([token], address)
+            if isinstance(balance, Exception):
+                raise balance
+        else:
+            balance = token.functions.balanceOf(address).call()
+        with self._lock:
+            outstanding = [r for r in self.transfers.values() if r["from"] == address and r["token"] == token.address
+                           and r["status"] in ("pending", "timeout") and r["settled_at"] is None]
+        if any(r["status"] == "timeout" for r in outstanding):
+            mined = self.w3.eth.get_transaction_count(address, "latest")
+            for record in outstanding:
+                if record["status"] == "timeout" and record["nonce"] < mined:
+                    # Its nonce is used, by it or by whatever replaced it: nothing left to reserve
+                    record["settled_at"] = time.time()
+            outstanding = [r for r in outstanding if r["settled_at"] is None]
+        return balance - sum(r["amount"] for r in outstanding)
+
+    def _track(self, record):
+        interval = self.poll_interval
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            try:
+                receipt = self.w3.eth.get_transaction_receipt(record["tx_hash"])
+            except Exception as e:
+                # TransactionNotFound until it is mined; anything else is retried the same way
+                if type(e).__name__ != "TransactionNotFound":
+                    record["error"] = str(e)
+            else:
+                record.update(
+                    status="confirmed" if receipt["status"] == 1 else "failed",
+                    block=receipt["blockNumber"],
+                    error=None if receipt["status"] == 1 else "reverted",
+                    settled_at=time.time(),
+                )
+                return
+            time.sleep(interval)
+            interval = min(self.max_poll_interval, interval * 1.5)
+        try:
+            mined = self.w3.eth.get_transaction_count(record["from"], "latest")
+        except Exception:
+            mined = None
+        if mined is None or mined <= record["nonce"]:
+            # Dropped or stuck: hand out the nonces from the node's count again, so a dropped
+            # nonce is reused instead of every later transfer waiting behind it. Not settled:
+            # it may still be mined, and _available keeps its amount until its nonce is used
+            self.nonces.resync(record["from"])
+            record["status"] = "timeout"
+        else:
+            record.update(status="timeout", settled_at=time.time())
+
+    def _evict_settled(self):
+        # Called with self._lock held
+        settled = sorted((r for r in self.transfers.values() if r["settled_at"] is not None),
+                         key=lambda r: r["settled_at"])
+        cutoff = time.time() - self.keep_settled
+        excess = len(settled) - self.max_settled
+        for i, record in enumerate(settled):
+            if i < excess or record["settled_at"] < cutoff:
+                del self.transfers[record["tx_hash"]]
+
+    def status(self, tx_hash):
+        with self._lock:
+            return self.transfers.get(tx_hash)
+
+    def for_address(self, address):
+        """Transfers sent from `address`, newest first."""
+        with self._lock:
+            records = [r for r in self.transfers.values() if r["from"] == address]
+        return sorted(records, key=lambda r: r["nonce"], reverse=True)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)